@@ -15,7 +15,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import heapq
 import os
+import time
 
 import eventlet
 import netaddr
@@ -35,6 +37,7 @@ from neutron.common import utils
 from neutron import context
 from neutron import manager
 from neutron.openstack.common import importutils
+from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common.rpc import common
@@ -60,6 +63,13 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.IntOpt('num_event_threads', default=8,
+                   help=_('Number of networks whose notification events '
+                          'are processed concurrently.')),
+        cfg.FloatOpt('event_coalesce_interval', default=0.5,
+                     help=_('Seconds to wait after the first notification '
+                            'event for a network so that further events for '
+                            'the same network can be coalesced.')),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
@@ -71,6 +81,8 @@ class DhcpAgent(manager.Manager):
         self.needs_resync = False
         self.conf = cfg.CONF
         self.cache = NetworkCache()
+        self.event_queue = NetworkEventQueue(self.conf.num_event_threads,
+                                             self.conf.event_coalesce_interval)
         self.root_helper = config.get_root_helper(self.conf)
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
@@ -155,7 +167,8 @@ class DhcpAgent(manager.Manager):
             active_network_ids = set(network.id for network in active_networks)
             for deleted_id in known_network_ids - active_network_ids:
                 try:
-                    self.disable_dhcp_helper(deleted_id)
+                    with network_lock(deleted_id):
+                        self.disable_dhcp_helper(deleted_id)
                 except Exception:
                     self.needs_resync = True
                     LOG.exception(_('Unable to sync network state on deleted '
@@ -200,7 +213,8 @@ class DhcpAgent(manager.Manager):
 
     def safe_configure_dhcp_for_network(self, network):
         try:
-            self.configure_dhcp_for_network(network)
+            with network_lock(network.id):
+                self.configure_dhcp_for_network(network)
         except (exceptions.NetworkNotFound, RuntimeError):
             LOG.warn(_('Network %s may have been deleted and its resources '
                        'may have already been disposed.'), network.id)
@@ -253,63 +267,68 @@ class DhcpAgent(manager.Manager):
         else:
             self.disable_dhcp_helper(network.id)
 
-    @utils.synchronized('dhcp-agent')
+    def reload_allocations_helper(self, network_id):
+        """Reload the allocations of a network known to the agent."""
+        network = self.cache.get_network_by_id(network_id)
+        if network:
+            self.call_driver('reload_allocations', network)
+
     def network_create_end(self, context, payload):
         """Handle the network.create.end notification event."""
         network_id = payload['network']['id']
-        self.enable_dhcp_helper(network_id)
+        self.event_queue.add(network_id, self.enable_dhcp_helper, network_id)
 
-    @utils.synchronized('dhcp-agent')
     def network_update_end(self, context, payload):
         """Handle the network.update.end notification event."""
         network_id = payload['network']['id']
         if payload['network']['admin_state_up']:
-            self.enable_dhcp_helper(network_id)
+            self.event_queue.add(network_id,
+                                 self.enable_dhcp_helper, network_id)
         else:
-            self.disable_dhcp_helper(network_id)
+            self.event_queue.add(network_id,
+                                 self.disable_dhcp_helper, network_id)
 
-    @utils.synchronized('dhcp-agent')
     def network_delete_end(self, context, payload):
         """Handle the network.delete.end notification event."""
-        self.disable_dhcp_helper(payload['network_id'])
+        network_id = payload['network_id']
+        self.event_queue.add(network_id, self.disable_dhcp_helper, network_id)
 
-    @utils.synchronized('dhcp-agent')
     def subnet_update_end(self, context, payload):
         """Handle the subnet.update.end notification event."""
         network_id = payload['subnet']['network_id']
-        self.refresh_dhcp_helper(network_id)
+        self.event_queue.add(network_id, self.refresh_dhcp_helper, network_id)
 
     # Use the update handler for the subnet create event.
     subnet_create_end = subnet_update_end
 
-    @utils.synchronized('dhcp-agent')
     def subnet_delete_end(self, context, payload):
         """Handle the subnet.delete.end notification event."""
         subnet_id = payload['subnet_id']
         network = self.cache.get_network_by_subnet_id(subnet_id)
         if network:
-            self.refresh_dhcp_helper(network.id)
+            self.event_queue.add(network.id,
+                                 self.refresh_dhcp_helper, network.id)
 
-    @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
         """Handle the port.update.end notification event."""
         updated_port = dhcp.DictModel(payload['port'])
         network = self.cache.get_network_by_id(updated_port.network_id)
         if network:
             self.cache.put_port(updated_port)
-            self.call_driver('reload_allocations', network)
+            self.event_queue.add(network.id,
+                                 self.reload_allocations_helper, network.id)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
 
-    @utils.synchronized('dhcp-agent')
     def port_delete_end(self, context, payload):
         """Handle the port.delete.end notification event."""
         port = self.cache.get_port_by_id(payload['port_id'])
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self.event_queue.add(network.id,
+                                 self.reload_allocations_helper, network.id)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -535,6 +554,104 @@ class NetworkCache(object):
                 'ports': num_ports}
 
 
+def network_lock(network_id):
+    """Return a lock serializing DHCP changes to a single network."""
+    return lockutils.lock('dhcp-agent-network-%s' % network_id)
+
+
+class NetworkEventQueue(object):
+    """Per-network queue of pending notification events.
+
+    Events for a network are run in order by a single worker, which starts
+    once the coalesce interval has elapsed after the first pending event.
+    An event identical to the last one still pending for the same network
+    is dropped, so a burst of port notifications results in a single
+    driver reload. Distinct networks are processed concurrently by a
+    bounded pool of workers.
+    """
+    # Number of networks whose latency is reported in the agent state
+    SLOWEST_NETWORKS = 3
+
+    def __init__(self, pool_size, coalesce_interval):
+        self.pool = eventlet.GreenPool(pool_size)
+        self.coalesce_interval = coalesce_interval
+        self.pending = {}
+        self.first_queued = {}
+        self._reset_latencies()
+        self.coalesced = 0
+
+    def _reset_latencies(self):
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        # heap of the (latency, network_id) of the slowest networks
+        self.slowest = []
+
+    def _record_latency(self, network_id, latency):
+        self.latency_count += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        if len(self.slowest) < self.SLOWEST_NETWORKS:
+            heapq.heappush(self.slowest, (latency, network_id))
+        else:
+            heapq.heappushpop(self.slowest, (latency, network_id))
+
+    def add(self, network_id, func, *args):
+        event = (func, args)
+        events = self.pending.get(network_id)
+        if events is None:
+            self.pending[network_id] = [event]
+            self.first_queued[network_id] = time.time()
+            self.pool.spawn_n(self._process, network_id)
+        elif events and events[-1] == event:
+            self.coalesced += 1
+        else:
+            events.append(event)
+
+    def _process(self, network_id):
+        eventlet.sleep(self.coalesce_interval)
+        events = self.pending[network_id]
+        try:
+            while events:
+                func, args = events.pop(0)
+                try:
+                    with network_lock(network_id):
+                        func(*args)
+                except Exception:
+                    LOG.exception(_('Unable to process event for network '
+                                    '%s.'), network_id)
+        finally:
+            del self.pending[network_id]
+            started = self.first_queued.pop(network_id)
+            self._record_latency(network_id, time.time() - started)
+
+    def waitall(self):
+        """Wait until all the pending events have been processed."""
+        self.pool.waitall()
+
+    def get_state(self):
+        """Return queue statistics, resetting the recorded latencies.
+
+        The statistics are merged into the agent configurations, so their
+        size must not depend on the number of networks.
+        """
+        count = self.latency_count
+        state = {'event_queue_depth': sum(len(events) for events
+                                          in self.pending.itervalues()),
+                 'event_queue_networks': len(self.pending),
+                 'event_coalesced': self.coalesced,
+                 'event_processed': count,
+                 'event_latency_avg': round(
+                     count and self.latency_total / count, 3),
+                 'event_latency_max': round(self.latency_max, 3),
+                 'event_slowest_networks': [
+                     [network_id, round(latency, 3)] for latency, network_id
+                     in sorted(self.slowest, reverse=True)]}
+        self._reset_latencies()
+        self.coalesced = 0
+        return state
+
+
 class DhcpAgentWithStateReport(DhcpAgent):
     def __init__(self, host=None):
         super(DhcpAgentWithStateReport, self).__init__(host=host)
@@ -560,6 +677,8 @@ class DhcpAgentWithStateReport(DhcpAgent):
         try:
             self.agent_state.get('configurations').update(
                 self.cache.get_state())
+            self.agent_state.get('configurations').update(
+                self.event_queue.get_state())
             ctx = context.get_admin_context_without_session()
             self.state_rpc.report_state(ctx, self.agent_state, self.use_call)
             self.use_call = False
@@ -372,6 +372,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         ri.iptables_manager.apply()
         if self.conf.enable_metadata_proxy:
             self._destroy_metadata_proxy(ri.router_id, ri.ns_name())
+        super(L3NATAgent, self).process_router_remove(ri)
         del self.router_info[router_id]
         self._destroy_router_namespace(ri.ns_name())
 
@@ -284,6 +284,9 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        # traffic counters read by the last get_bulk_traffic_counters call
+        # with zero=True, used as the base of the next one
+        self.traffic_counters_base = {}
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -640,3 +643,86 @@ class IptablesManager(object):
                 acc['bytes'] += int(data[1])
 
         return acc
+
+    def _get_table_traffic_counters(self, cmd, table):
+        """Return the traffic counters of all the chains of a table.
+
+        The counters of every rule are read with a single iptables-save -c
+        run and summed per chain.
+        """
+        args = ['%s-save' % cmd, '-t', table, '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        current_table = self.execute(args, root_helper=self.root_helper)
+
+        accs = {}
+        for line in current_table.split('\n'):
+            # rules are dumped as "[pkts:bytes] -A chain ..."
+            if not line.startswith('['):
+                continue
+            counters, _sep, rule = line[1:].partition(']')
+            data = rule.split()
+            if len(data) < 2 or data[0] != '-A':
+                continue
+            try:
+                pkts, bytes = [int(c) for c in counters.split(':')]
+            except ValueError:
+                continue
+            acc = accs.setdefault(data[1], {'pkts': 0, 'bytes': 0})
+            acc['pkts'] += pkts
+            acc['bytes'] += bytes
+
+        return accs
+
+    def get_bulk_traffic_counters(self, chains, wrap=True, zero=False):
+        """Return the traffic counters of several chains in a single pass.
+
+        One iptables-save is run per table holding at least one of the
+        chains, whatever the number of chains. The result maps each of the
+        existing chains to the sum of the traffic counters of its rules.
+
+        If zero is True, the counters accumulated since the previous call
+        are returned instead. The kernel counters are left untouched: the
+        values read are kept as the base of the next call, so that no
+        packet is lost between reading and resetting them.
+        """
+        names = {}
+        cmd_tables = {}
+        for chain in chains:
+            tables = self._get_traffic_counters_cmd_tables(chain, wrap)
+            if not tables:
+                LOG.warn(_('Attempted to get traffic counters of chain %s '
+                           'which does not exist'), chain)
+                continue
+            name = get_chain_name(chain, wrap)
+            if wrap:
+                name = '%s-%s' % (self.wrap_name, name)
+            names[name] = chain
+            for cmd_table in tables:
+                cmd_tables.setdefault(cmd_table, []).append(name)
+
+        accs = dict((chain, {'pkts': 0, 'bytes': 0})
+                    for chain in names.itervalues())
+        for (cmd, table), table_names in sorted(cmd_tables.iteritems()):
+            table_accs = self._get_table_traffic_counters(cmd, table)
+            if zero:
+                # forget the base of the chains that have been removed
+                for key in self.traffic_counters_base.keys():
+                    if key[:2] == (cmd, table) and key[2] not in table_accs:
+                        del self.traffic_counters_base[key]
+            for name in table_names:
+                current = table_accs.get(name, {'pkts': 0, 'bytes': 0})
+                pkts, bytes = current['pkts'], current['bytes']
+                if zero:
+                    key = (cmd, table, name)
+                    base = self.traffic_counters_base.get(key)
+                    # counters restart from zero when a chain is recreated
+                    if base and pkts >= base['pkts']:
+                        pkts -= base['pkts']
+                        bytes -= base['bytes']
+                    self.traffic_counters_base[key] = current
+                acc = accs[names[name]]
+                acc['pkts'] += pkts
+                acc['bytes'] += bytes
+
+        return accs
@@ -0,0 +1,165 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import socket
+import struct
+
+import eventlet
+from eventlet import queue
+
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 1
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+
+IFLA_IFNAME = 3
+AF_UNSPEC = 0
+
+NLMSGHDR = struct.Struct('=LHHLL')
+IFINFOMSG = struct.Struct('=BxHiII')
+RTATTR = struct.Struct('=HH')
+
+RECV_BUFSIZE = 65536
+
+# Queued in place of a link event when events may have been lost
+OVERFLOW = None
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def parse_link_messages(data):
+    """Parse a netlink datagram into a list of (msg_type, ifname) tuples.
+
+    Only RTM_NEWLINK and RTM_DELLINK messages of the AF_UNSPEC family are
+    returned; the AF_BRIDGE copies the kernel emits when a port joins or
+    leaves a bridge do not mean the link itself appeared or vanished.
+    """
+    links = []
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        msg_len, msg_type = NLMSGHDR.unpack_from(data, offset)[:2]
+        if msg_len < NLMSGHDR.size or msg_type == NLMSG_DONE:
+            break
+        if msg_type in (RTM_NEWLINK, RTM_DELLINK):
+            body = offset + NLMSGHDR.size
+            family = IFINFOMSG.unpack_from(data, body)[0]
+            if family == AF_UNSPEC:
+                name = _get_ifname(data, body + IFINFOMSG.size,
+                                   offset + msg_len)
+                if name:
+                    links.append((msg_type, name))
+        offset += _align(msg_len)
+    return links
+
+
+def _get_ifname(data, offset, end):
+    while offset + RTATTR.size <= end:
+        rta_len, rta_type = RTATTR.unpack_from(data, offset)
+        if rta_len < RTATTR.size:
+            break
+        if rta_type == IFLA_IFNAME:
+            value = data[offset + RTATTR.size:offset + rta_len]
+            return value.split('\0', 1)[0]
+        offset += _align(rta_len)
+
+
+class LinkMonitor(object):
+    """Listens to rtnetlink for links being created and deleted.
+
+    Events are collected by a green thread and handed out in batches by
+    get_events().  A None entry in a batch means the monitor lost events
+    (socket overflow or failure) and the caller must fall back to a full
+    scan of the devices.
+    """
+
+    def __init__(self, prefix=None):
+        self.prefix = prefix
+        self._sock = None
+        self._reader = None
+        self._events = queue.LightQueue()
+
+    @property
+    def is_active(self):
+        return self._reader is not None and not self._reader.dead
+
+    def start(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             NETLINK_ROUTE)
+        try:
+            sock.bind((0, RTMGRP_LINK))
+        except Exception:
+            sock.close()
+            raise
+        self._sock = sock
+        self._reader = eventlet.spawn(self._read)
+
+    def stop(self):
+        if self._reader:
+            self._reader.kill()
+            self._reader = None
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+
+    def _read(self):
+        while True:
+            try:
+                data = self._sock.recv(RECV_BUFSIZE)
+            except socket.error as e:
+                if e.errno == errno.ENOBUFS:
+                    LOG.warning(_("Netlink socket overflowed, link events "
+                                  "were lost"))
+                    self._events.put(OVERFLOW)
+                    continue
+                LOG.exception(_("Netlink link monitor failed"))
+                self._events.put(OVERFLOW)
+                return
+            self._handle(data)
+
+    def _handle(self, data):
+        for msg_type, name in parse_link_messages(data):
+            if self.prefix and not name.startswith(self.prefix):
+                continue
+            LOG.debug(_("Netlink event %(type)s for %(name)s"),
+                      {'type': msg_type, 'name': name})
+            self._events.put((msg_type == RTM_NEWLINK, name))
+
+    def get_events(self, timeout=None):
+        """Return the pending events, waiting up to timeout for the first.
+
+        Each event is a (present, name) tuple in arrival order.
+        """
+        events = []
+        try:
+            events.append(self._events.get(timeout=timeout))
+        except queue.Empty:
+            return events
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
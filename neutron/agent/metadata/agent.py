@@ -18,10 +18,13 @@
 
 import hashlib
 import hmac
+import itertools
 import os
 import socket
+import time
 
 import eventlet
+from eventlet import pools
 import httplib2
 from neutronclient.v2_0 import client
 from oslo.config import cfg
@@ -44,6 +47,48 @@ from neutron import wsgi
 LOG = logging.getLogger(__name__)
 
 
+class LookupCache(object):
+    """Least recently used cache whose entries expire after a TTL."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        # key -> (expiration time, last use, value)
+        self.entries = {}
+        self.uses = itertools.count()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.time():
+            self.hits += 1
+            self.entries[key] = (entry[0], next(self.uses), entry[2])
+            return entry[2]
+        self.entries.pop(key, None)
+        self.misses += 1
+
+    def set(self, key, value):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        now = time.time()
+        if key not in self.entries and len(self.entries) >= self.size:
+            for k, entry in self.entries.items():
+                if entry[0] <= now:
+                    del self.entries[k]
+            if len(self.entries) >= self.size:
+                lru = min(self.entries, key=lambda k: self.entries[k][1])
+                del self.entries[lru]
+        self.entries[key] = (now + self.ttl, next(self.uses), value)
+
+
+class HttpPool(pools.Pool):
+    """Pool of keep-alive HTTP connections."""
+
+    def create(self):
+        return httplib2.Http()
+
+
 class MetadataProxyHandler(object):
     OPTS = [
         cfg.StrOpt('admin_user',
@@ -79,12 +124,25 @@ class MetadataProxyHandler(object):
         cfg.StrOpt('metadata_proxy_shared_secret',
                    default='',
                    help=_('Shared secret to sign instance-id request'),
-                   secret=True)
+                   secret=True),
+        cfg.IntOpt('metadata_cache_ttl', default=5,
+                   help=_('Seconds during which the instance and tenant '
+                          'found for a requester IP address are cached. '
+                          '0 disables the cache.')),
+        cfg.IntOpt('metadata_cache_size', default=1000,
+                   help=_('Maximum number of requester IP addresses whose '
+                          'instance and tenant are cached.')),
+        cfg.IntOpt('nova_metadata_pool_size', default=64,
+                   help=_('Maximum number of keep-alive connections to the '
+                          'Nova metadata server.')),
     ]
 
     def __init__(self, conf):
         self.conf = conf
         self.auth_info = {}
+        self.cache = LookupCache(self.conf.metadata_cache_size,
+                                 self.conf.metadata_cache_ttl)
+        self.http_pool = HttpPool(max_size=self.conf.nova_metadata_pool_size)
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -120,12 +178,20 @@ class MetadataProxyHandler(object):
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
 
     def _get_instance_and_tenant_id(self, req):
-        qclient = self._get_neutron_client()
-
         remote_address = req.headers.get('X-Forwarded-For')
         network_id = req.headers.get('X-Neutron-Network-ID')
         router_id = req.headers.get('X-Neutron-Router-ID')
 
+        cache_key = (network_id, router_id, remote_address)
+        cached = self.cache.get(cache_key)
+        if cached:
+            return cached
+        LOG.debug(_("Instance lookup cache miss for %(key)s, hits: %(hits)d "
+                    "misses: %(misses)d"),
+                  {'key': cache_key, 'hits': self.cache.hits,
+                   'misses': self.cache.misses})
+
+        qclient = self._get_neutron_client()
         if network_id:
             networks = [network_id]
         else:
@@ -141,7 +207,9 @@ class MetadataProxyHandler(object):
 
         self.auth_info = qclient.get_auth_info()
         if len(ports) == 1:
-            return ports[0]['device_id'], ports[0]['tenant_id']
+            ids = ports[0]['device_id'], ports[0]['tenant_id']
+            self.cache.set(cache_key, ids)
+            return ids
         return None, None
 
     def _proxy_request(self, instance_id, tenant_id, req):
@@ -160,9 +228,9 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        with self.http_pool.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 import netaddr
 import webob.exc
@@ -27,6 +28,7 @@ from neutron.api.v2 import attributes
 from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import constants as const
 from neutron.common import exceptions
+from neutron.db import api as db_api
 from neutron.notifiers import nova
 from neutron.openstack.common import log as logging
 from neutron.openstack.common.notifier import api as notifier_api
@@ -281,10 +283,25 @@ class Controller(object):
             else:
                 self._dhcp_agent_notifier.notify(context, data, methodname)
 
+    @contextlib.contextmanager
+    def _reader(self, request, action):
+        """Serve a GET from the slave database if its handler never writes.
+
+        Handlers which may write, or whose result is used for a write, keep
+        reading the main database.
+        """
+        handler = getattr(self._plugin, self._plugin_handlers[action])
+        if getattr(handler, 'read_only', False):
+            with db_api.reader(request.context):
+                yield
+        else:
+            yield
+
     def index(self, request, **kwargs):
         """Returns a list of the requested entity."""
         parent_id = kwargs.get(self._parent_id_name)
-        return self._items(request, True, parent_id)
+        with self._reader(request, self.LIST):
+            return self._items(request, True, parent_id)
 
     def show(self, request, id, **kwargs):
         """Returns detailed information about the requested entity."""
@@ -295,14 +312,15 @@ class Controller(object):
             field_list, added_fields = self._do_field_list(
                 api_common.list_args(request, "fields"))
             parent_id = kwargs.get(self._parent_id_name)
-            return {self._resource:
-                    self._view(request.context,
-                               self._item(request,
-                                          id,
-                                          do_authz=True,
-                                          field_list=field_list,
-                                          parent_id=parent_id),
-                               fields_to_strip=added_fields)}
+            with self._reader(request, self.SHOW):
+                return {self._resource:
+                        self._view(request.context,
+                                   self._item(request,
+                                              id,
+                                              do_authz=True,
+                                              field_list=field_list,
+                                              parent_id=parent_id),
+                                   fields_to_strip=added_fields)}
         except exceptions.PolicyNotAuthorized:
             # To avoid giving away information, pretend that it
             # doesn't exist
@@ -106,6 +106,18 @@ core_opts = [
     cfg.IntOpt('send_events_interval', default=2,
                help=_('Number of seconds between sending events to nova if '
                       'there are any events to send.')),
+    cfg.IntOpt('send_events_batch_size', default=100,
+               help=_('Maximum number of events sent to nova in a single '
+                      'request.')),
+    cfg.IntOpt('max_pending_nova_events', default=10000,
+               help=_('Maximum number of events waiting to be sent to '
+                      'nova. The oldest events are dropped beyond it.')),
+    cfg.IntOpt('send_events_max_backoff', default=60,
+               help=_('Maximum number of seconds to wait before sending '
+                      'events again after nova failed to receive them.')),
+    cfg.IntOpt('send_events_max_retries', default=10,
+               help=_('Maximum number of times events are sent again after '
+                      'a transient nova failure before they are dropped.')),
 ]
 
 core_cli_opts = [
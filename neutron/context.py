@@ -17,10 +17,13 @@
 
 """Context: context for security/db session."""
 
+import contextlib
 import copy
 
 from datetime import datetime
 
+from sqlalchemy import event
+
 from neutron.db import api as db_api
 from neutron.openstack.common import context as common_context
 from neutron.openstack.common import local
@@ -65,6 +68,8 @@ class ContextBase(common_context.RequestContext):
             timestamp = datetime.utcnow()
         self.timestamp = timestamp
         self._session = None
+        self._reader_session = None
+        self._read_only = 0
         self.roles = roles or []
         if self.is_admin is None:
             self.is_admin = policy.check_is_admin(self)
@@ -118,6 +123,15 @@ class ContextBase(common_context.RequestContext):
     read_deleted = property(_get_read_deleted, _set_read_deleted,
                             _del_read_deleted)
 
+    @contextlib.contextmanager
+    def reader(self):
+        """Route the reads made within the block to the slave database."""
+        self._read_only += 1
+        try:
+            yield
+        finally:
+            self._read_only -= 1
+
     def to_dict(self):
         return {'user_id': self.user_id,
                 'tenant_id': self.tenant_id,
@@ -152,11 +166,31 @@ class ContextBase(common_context.RequestContext):
         return context
 
 
+def _mark_written(session, flush_context):
+    session.info['written'] = True
+
+
 class Context(ContextBase):
+    def _use_reader(self):
+        if not self._read_only or not db_api.has_slave_connection():
+            return False
+        if self._session is None:
+            return True
+        # Reads following a write of the same request must see it, and the
+        # slave may lag behind the main database.
+        return (self._session.transaction is None and
+                not self._session.info.get('written'))
+
     @property
     def session(self):
+        if self._use_reader():
+            if self._reader_session is None:
+                self._reader_session = db_api.get_session(slave_session=True)
+            return self._reader_session
         if self._session is None:
             self._session = db_api.get_session()
+            if db_api.has_slave_connection():
+                event.listen(self._session, 'after_flush', _mark_written)
         return self._session
 
 
@@ -15,12 +15,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+
 from eventlet import greenthread
 
 from oslo.config import cfg
 import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
+from neutron import context as n_context
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import agent as ext_agent
@@ -29,14 +32,22 @@ from neutron.openstack.common.db import exception as db_exc
 from neutron.openstack.common import excutils
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
 from neutron.openstack.common import timeutils
 
 LOG = logging.getLogger(__name__)
-cfg.CONF.register_opt(
+AGENT_OPTS = [
     cfg.IntOpt('agent_down_time', default=75,
                help=_("Seconds to regard the agent is down; should be at "
                       "least twice report_interval, to be sure the "
-                      "agent is down for good.")))
+                      "agent is down for good.")),
+    cfg.IntOpt('agent_heartbeat_flush_interval', default=0,
+               help=_("Seconds between batched writes of the states "
+                      "reported by agents. Only the latest report of each "
+                      "agent is written, and its configurations only when "
+                      "they changed. 0 writes every report immediately.")),
+]
+cfg.CONF.register_opts(AGENT_OPTS)
 
 
 class Agent(model_base.BASEV2, models_v2.HasId):
@@ -84,8 +95,10 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
 
     @classmethod
     def is_agent_down(cls, heart_beat_time):
-        return timeutils.is_older_than(heart_beat_time,
-                                       cfg.CONF.agent_down_time)
+        # heartbeats written in batches can lag behind by a flush interval
+        return timeutils.is_older_than(
+            heart_beat_time,
+            cfg.CONF.agent_down_time + cfg.CONF.agent_heartbeat_flush_interval)
 
     def get_configuration_dict(self, agent_db):
         try:
@@ -197,6 +210,116 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                     return self._create_or_update_agent(context, agent)
 
 
+class AgentHeartbeatAggregator(object):
+    """Write-behind cache of the states reported by agents.
+
+    Reports of agents not written yet by this server, and of agents which
+    have just been (re)started, are written immediately. For the other
+    ones only the latest report is kept in memory, and flushed every
+    interval: heartbeat timestamps are updated with a single batched
+    UPDATE, and the configurations of an agent are only rewritten when
+    their content has changed since they were last written, or when the
+    row no longer holds them because another server wrote it meanwhile.
+    """
+
+    def __init__(self, plugin, interval):
+        self.plugin = plugin
+        self.interval = interval
+        # (agent_type, host) -> hash of the configurations last written
+        self.written_hashes = {}
+        # (agent_type, host) -> configurations last written, as stored
+        self.written_configurations = {}
+        # (agent_type, host) -> (heartbeat time, agent state, hash)
+        self.pending = {}
+        self.flusher = None
+
+    @staticmethod
+    def _hash_configurations(configurations):
+        return hashlib.md5(jsonutils.dumps(configurations,
+                                           sort_keys=True)).hexdigest()
+
+    def report(self, context, agent_state):
+        key = (agent_state['agent_type'], agent_state['host'])
+        conf_hash = self._hash_configurations(
+            agent_state.get('configurations', {}))
+        if agent_state.get('start_flag') or key not in self.written_hashes:
+            self.pending.pop(key, None)
+            self.plugin.create_or_update_agent(context, agent_state)
+            self.written_hashes[key] = conf_hash
+            self.written_configurations[key] = jsonutils.dumps(
+                agent_state.get('configurations', {}))
+            return
+        self.pending[key] = (timeutils.utcnow(), agent_state, conf_hash)
+        if not self.flusher:
+            self.flusher = loopingcall.FixedIntervalLoopingCall(self.flush)
+            self.flusher.start(interval=self.interval)
+
+    def flush(self):
+        """Write the pending heartbeats to the database."""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        heartbeats = []
+        configurations = []
+        for key, (timestamp, agent_state, conf_hash) in pending.iteritems():
+            params = {'_agent_type': key[0], '_host': key[1],
+                      '_timestamp': timestamp,
+                      '_configurations': jsonutils.dumps(
+                          agent_state.get('configurations', {}))}
+            if conf_hash == self.written_hashes.get(key):
+                params['_written'] = self.written_configurations[key]
+                heartbeats.append(params)
+            else:
+                configurations.append(params)
+
+        table = Agent.__table__
+        query = table.update().where(
+            sa.and_(table.c.agent_type == sa.bindparam('_agent_type'),
+                    table.c.host == sa.bindparam('_host')))
+        session = n_context.get_admin_context().session
+        try:
+            updated = 0
+            with session.begin(subtransactions=True):
+                if heartbeats:
+                    # the row is shared with the other servers, which may
+                    # have written other configurations since this one did
+                    matched = session.execute(
+                        query.where(
+                            table.c.configurations == sa.bindparam('_written')
+                        ).values(
+                            heartbeat_timestamp=sa.bindparam('_timestamp')),
+                        heartbeats).rowcount
+                    if matched < len(heartbeats):
+                        configurations.extend(heartbeats)
+                        heartbeats = []
+                    else:
+                        updated += matched
+                if configurations:
+                    updated += session.execute(
+                        query.values(
+                            heartbeat_timestamp=sa.bindparam('_timestamp'),
+                            configurations=sa.bindparam('_configurations')),
+                        configurations).rowcount
+        except Exception:
+            LOG.exception(_("Failed to write agent heartbeats"))
+            # keep the reports received meanwhile, they are more recent
+            for key, value in pending.iteritems():
+                self.pending.setdefault(key, value)
+            return
+
+        for params in configurations + heartbeats:
+            key = (params['_agent_type'], params['_host'])
+            self.written_hashes[key] = pending[key][2]
+            self.written_configurations[key] = params['_configurations']
+        if updated < len(pending):
+            # some agents have been deleted; write their next report
+            # immediately so that they are created again
+            LOG.debug(_("Agents missing while writing heartbeats"))
+            for key in pending:
+                self.written_hashes.pop(key, None)
+                self.written_configurations.pop(key, None)
+
+
 class AgentExtRpcCallback(object):
     """Processes the rpc report in plugin implementations."""
 
@@ -205,6 +328,7 @@ class AgentExtRpcCallback(object):
 
     def __init__(self, plugin=None):
         self.plugin = plugin
+        self.heartbeats = None
 
     def report_state(self, context, **kwargs):
         """Report state from agent to server."""
@@ -216,4 +340,11 @@ class AgentExtRpcCallback(object):
         agent_state = kwargs['agent_state']['agent_state']
         if not self.plugin:
             self.plugin = manager.NeutronManager.get_plugin()
-        self.plugin.create_or_update_agent(context, agent_state)
+        interval = cfg.CONF.agent_heartbeat_flush_interval
+        if interval > 0:
+            if not self.heartbeats:
+                self.heartbeats = AgentHeartbeatAggregator(self.plugin,
+                                                           interval)
+            self.heartbeats.report(context, agent_state)
+        else:
+            self.plugin.create_or_update_agent(context, agent_state)
@@ -13,6 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import functools
+
+from oslo.config import cfg
 import sqlalchemy as sql
 
 from neutron.db import model_base
@@ -39,11 +43,62 @@ def clear_db(base=BASE):
     session.cleanup()
 
 
-def get_session(autocommit=True, expire_on_commit=False):
-    """Helper method to grab session."""
+def get_session(autocommit=True, expire_on_commit=False,
+                slave_session=False):
+    """Helper method to grab session.
+
+    A slave session is only handed out if [database] slave_connection is
+    set, otherwise the session is for the main database.
+    """
     return session.get_session(autocommit=autocommit,
                                expire_on_commit=expire_on_commit,
-                               sqlite_fk=True)
+                               sqlite_fk=True,
+                               slave_session=(slave_session and
+                                              has_slave_connection()))
+
+
+def has_slave_connection():
+    return bool(cfg.CONF.database.slave_connection)
+
+
+@contextlib.contextmanager
+def reader(context):
+    """Route the reads of context made within the block to the slave database.
+
+    context.session is a session for the slave database, unless the context
+    already wrote to the main database or is inside one of its
+    transactions.
+    """
+    if getattr(context, 'reader', None) is None:
+        yield
+    else:
+        with context.reader():
+            yield
+
+
+def read_only(f):
+    """Serve an RPC callback which never writes from the slave database.
+
+    Only use it for callbacks whose caller does not write based on the
+    result either.  The context must be the first argument after self.
+    """
+    @functools.wraps(f)
+    def wrapper(self, context, *args, **kwargs):
+        with reader(context):
+            return f(self, context, *args, **kwargs)
+    return wrapper
+
+
+def read_only_getter(f):
+    """Mark a plugin getter as never writing to the database.
+
+    This does not change the session used by the getter, which may be
+    called by write paths, but lets the API serve GET requests handled by
+    it from the slave database.  Overrides are not marked unless they are
+    decorated too.
+    """
+    f.read_only = True
+    return f
 
 
 def register_models(base=BASE):
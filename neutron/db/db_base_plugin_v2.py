@@ -62,6 +62,26 @@ class CommonDbMixin(object):
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # Loader options, such as subqueryload or joinedload of the relationships
+    # read when building the api dicts of a model, are registered here by
+    # the core plugin and the extension mixins and applied to every query
+    # listing the model, so that the dicts can be built without a further
+    # query per row.
+    _eager_load_options = {}
+
+    @classmethod
+    def register_eager_load_options(cls, model, name, options):
+        """Register the loader options a mixin needs for a model.
+
+        Registering again under the same name replaces the options.
+        """
+        cls._eager_load_options.setdefault(model, {})[name] = options
+
+    def _apply_eager_load_options(self, query, model):
+        for options in self._eager_load_options.get(model, {}).values():
+            query = query.options(*options)
+        return query
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -174,6 +194,7 @@ class CommonDbMixin(object):
                               sorts=None, limit=None, marker_obj=None,
                               page_reverse=False):
         collection = self._model_query(context, model)
+        collection = self._apply_eager_load_options(collection, model)
         collection = self._apply_filters_to_query(collection, model, filters)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
@@ -1012,10 +1033,12 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             subnets_qry.filter_by(network_id=id).delete()
             context.session.delete(network)
 
+    @db.read_only_getter
     def get_network(self, context, id, fields=None):
         network = self._get_network(context, id)
         return self._make_network_dict(network, fields)
 
+    @db.read_only_getter
     def get_networks(self, context, filters=None, fields=None,
                      sorts=None, limit=None, marker=None,
                      page_reverse=False):
@@ -1028,6 +1051,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     marker_obj=marker_obj,
                                     page_reverse=page_reverse)
 
+    @db.read_only_getter
     def get_networks_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Network,
                                           filters=filters)
@@ -1294,10 +1318,12 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
             context.session.delete(subnet)
 
+    @db.read_only_getter
     def get_subnet(self, context, id, fields=None):
         subnet = self._get_subnet(context, id)
         return self._make_subnet_dict(subnet, fields)
 
+    @db.read_only_getter
     def get_subnets(self, context, filters=None, fields=None,
                     sorts=None, limit=None, marker=None,
                     page_reverse=False):
@@ -1310,6 +1336,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     marker_obj=marker_obj,
                                     page_reverse=page_reverse)
 
+    @db.read_only_getter
     def get_subnets_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Subnet,
                                           filters=filters)
@@ -1439,6 +1466,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             query = query.filter_by(tenant_id=context.tenant_id)
         query.delete()
 
+    @db.read_only_getter
     def get_port(self, context, id, fields=None):
         port = self._get_port(context, id)
         return self._make_port_dict(port, fields)
@@ -1452,6 +1480,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             filters = {}
 
         query = self._model_query(context, Port)
+        query = self._apply_eager_load_options(query, Port)
 
         fixed_ips = filters.pop('fixed_ips', {})
         ip_addresses = fixed_ips.get('ip_address')
@@ -1470,6 +1499,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                sorts, marker_obj)
         return query
 
+    @db.read_only_getter
     def get_ports(self, context, filters=None, fields=None,
                   sorts=None, limit=None, marker=None,
                   page_reverse=False):
@@ -1483,5 +1513,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             items.reverse()
         return items
 
+    @db.read_only_getter
     def get_ports_count(self, context, filters=None):
         return self._get_ports_query(context, filters).count()
+
+
+NeutronDbPluginV2.register_eager_load_options(
+    models_v2.Network, 'core', [orm.subqueryload('subnets')])
+NeutronDbPluginV2.register_eager_load_options(
+    models_v2.Subnet, 'core',
+    [orm.subqueryload('dns_nameservers'), orm.subqueryload('routes')])
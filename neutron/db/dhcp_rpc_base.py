@@ -19,6 +19,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
 from neutron.common import utils
+from neutron.db import api as db_api
 from neutron.extensions import portbindings
 from neutron import manager
 from neutron.openstack.common.db import exception as db_exc
@@ -75,6 +76,7 @@ class DhcpRpcCallbackMixin(object):
                 LOG.warn(_("Port for network %(net_id)s could not be created: "
                            "%(reason)s") % {"net_id": network_id, 'reason': e})
 
+    @db_api.read_only
     def get_active_networks(self, context, **kwargs):
         """Retrieve and return a list of the active network ids."""
         # NOTE(arosen): This method is no longer used by the DHCP agent but is
@@ -85,6 +87,7 @@ class DhcpRpcCallbackMixin(object):
         nets = self._get_active_networks(context, **kwargs)
         return [net['id'] for net in nets]
 
+    @db_api.read_only
     def get_active_networks_info(self, context, **kwargs):
         """Returns all the networks/subnets/ports in system."""
         host = kwargs.get('host')
@@ -104,6 +107,7 @@ class DhcpRpcCallbackMixin(object):
 
         return networks
 
+    @db_api.read_only
     def get_network_info(self, context, **kwargs):
         """Retrieve and return a extended information about a network."""
         network_id = kwargs.get('network_id')
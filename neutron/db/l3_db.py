@@ -21,6 +21,8 @@ from neutron.api.rpc.agentnotifiers import l3_rpc_agent_api
 from neutron.api.v2 import attributes
 from neutron.common import constants as l3_constants
 from neutron.common import exceptions as n_exc
+from neutron.db import api as db_api
+from neutron.db import db_base_plugin_v2
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import l3
@@ -80,6 +82,10 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
 
     l3_rpc_notifier = l3_rpc_agent_api.L3AgentNotify
 
+    # The gateway port gives the external network of the router dict
+    db_base_plugin_v2.NeutronDbPluginV2.register_eager_load_options(
+        Router, 'router', [orm.joinedload('gw_port')])
+
     @property
     def _core_plugin(self):
         return manager.NeutronManager.get_plugin()
@@ -250,10 +256,12 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
 
         self.l3_rpc_notifier.router_deleted(context, id)
 
+    @db_api.read_only_getter
     def get_router(self, context, id, fields=None):
         router = self._get_router(context, id)
         return self._make_router_dict(router, fields)
 
+    @db_api.read_only_getter
     def get_routers(self, context, filters=None, fields=None,
                     sorts=None, limit=None, marker=None,
                     page_reverse=False):
@@ -696,10 +704,12 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 context, [router_id],
                 'delete_floatingip')
 
+    @db_api.read_only_getter
     def get_floatingip(self, context, id, fields=None):
         floatingip = self._get_floatingip(context, id)
         return self._make_floatingip_dict(floatingip, fields)
 
+    @db_api.read_only_getter
     def get_floatingips(self, context, filters=None, fields=None,
                         sorts=None, limit=None, marker=None,
                         page_reverse=False):
@@ -521,6 +521,65 @@ class LoadBalancerPluginDb(LoadBalancerPluginBase,
                 if stats_status:
                     self.update_status(context, Member, member, stats_status)
 
+    def update_pools_stats(self, context, pools_stats):
+        """Update the statistics of several pools in one transaction.
+
+        pools_stats maps pool ids to stats structures holding only the
+        values that changed; values missing from a structure are left as
+        they are. Pools that are gone or being deleted are skipped.
+        """
+        if not pools_stats:
+            return
+        columns = (lb_const.STATS_IN_BYTES, lb_const.STATS_OUT_BYTES,
+                   lb_const.STATS_ACTIVE_CONNECTIONS,
+                   lb_const.STATS_TOTAL_CONNECTIONS)
+        with context.session.begin(subtransactions=True):
+            qry = context.session.query(Pool.id)
+            qry = qry.filter(Pool.id.in_(pools_stats.keys()))
+            qry = qry.filter(Pool.status != constants.PENDING_DELETE)
+            pool_ids = set(pool_id for pool_id, in qry)
+            if not pool_ids:
+                return
+            qry = context.session.query(PoolStatistics.pool_id)
+            qry = qry.filter(PoolStatistics.pool_id.in_(pool_ids))
+            stored = set(pool_id for pool_id, in qry)
+
+            updates = {}
+            member_statuses = {}
+            for pool_id in pool_ids:
+                data = pools_stats[pool_id]
+                values = dict((column, data[column]) for column in columns
+                              if column in data)
+                if pool_id not in stored:
+                    context.session.add(
+                        self._create_pool_stats(context, pool_id, values))
+                elif values:
+                    # validate the values the same way the model does
+                    PoolStatistics(**values)
+                    params = dict(('_' + column, value)
+                                  for column, value in values.iteritems())
+                    params['_pool_id'] = pool_id
+                    updates.setdefault(tuple(sorted(values)),
+                                       []).append(params)
+                for member_id, stats in data.get('members', {}).items():
+                    stats_status = stats.get(lb_const.STATS_STATUS)
+                    if stats_status:
+                        member_statuses.setdefault(stats_status,
+                                                   []).append(member_id)
+
+            table = PoolStatistics.__table__
+            for changed, params in updates.iteritems():
+                stmt = table.update().where(
+                    table.c.pool_id == sa.bindparam('_pool_id')).values(
+                        dict((column, sa.bindparam('_' + column))
+                             for column in changed))
+                context.session.execute(stmt, params)
+            for status, member_ids in member_statuses.iteritems():
+                qry = context.session.query(Member)
+                qry = qry.filter(Member.id.in_(member_ids))
+                qry = qry.filter(Member.pool_id.in_(pool_ids))
+                qry.update({'status': status}, synchronize_session=False)
+
     def _create_pool_stats(self, context, pool_id, data=None):
         # This is internal method to add pool statistics. It won't
         # be exposed to API
@@ -454,6 +454,11 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
         attr.PORTS, ['_extend_port_dict_security_group'])
 
+    # The rules are part of the security group dict
+    db_base_plugin_v2.NeutronDbPluginV2.register_eager_load_options(
+        SecurityGroup, 'securitygroups',
+        [orm.subqueryload('rules')])
+
     def _process_port_create_security_group(self, context, port,
                                             security_group_ids):
         if attr.is_attr_set(security_group_ids):
@@ -19,6 +19,7 @@ import netaddr
 
 from neutron.common import constants as q_const
 from neutron.common import utils
+from neutron.db import api as db_api
 from neutron.db import models_v2
 from neutron.db import securitygroups_db as sg_db
 from neutron.extensions import securitygroup as ext_sg
@@ -128,6 +129,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
     implementations.
     """
 
+    @db_api.read_only
     def security_group_rules_for_devices(self, context, **kwargs):
         """Return security group rules for each port.
 
@@ -13,9 +13,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import heapq
+import itertools
+import time
+
+from novaclient import exceptions as nova_exceptions
 import novaclient.v1_1.client as nclient
 from novaclient.v1_1.contrib import server_external_events
 from oslo.config import cfg
+from requests import exceptions as requests_exceptions
 from sqlalchemy.orm import attributes as sql_attr
 
 from neutron.common import constants
@@ -32,6 +38,63 @@ VIF_PLUGGED = 'network-vif-plugged'
 NEUTRON_NOVA_EVENT_STATUS_MAP = {constants.PORT_STATUS_ACTIVE: 'completed',
                                  constants.PORT_STATUS_ERROR: 'failed',
                                  constants.PORT_STATUS_DOWN: 'completed'}
+# Errors after which sending the same events again may succeed
+TRANSIENT_ERRORS = (nova_exceptions.ConnectionRefused,
+                    nova_exceptions.OverLimit,
+                    requests_exceptions.ConnectionError,
+                    requests_exceptions.Timeout)
+
+
+class EventBuffer(object):
+    """Bounded buffer of the events waiting to be sent to nova.
+
+    Only the latest event of a given name for a server and port is kept: a
+    new one replaces the pending one, and takes its place at the end of the
+    buffer. When the buffer is full the oldest events are dropped.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        # (server_uuid, tag, name) -> (sequence number, event)
+        self.events = {}
+        self.sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.events)
+
+    @staticmethod
+    def _key(event):
+        return (event.get('server_uuid'), event.get('tag'), event.get('name'))
+
+    def _trim(self):
+        dropped = []
+        if len(self.events) > self.max_size:
+            ordered = sorted(self.events.iteritems(), key=lambda x: x[1][0])
+            for key, (seq, event) in ordered[:-self.max_size]:
+                del self.events[key]
+                dropped.append(event)
+        return dropped
+
+    def add(self, event):
+        """Add an event and return the events dropped to make room."""
+        self.events[self._key(event)] = (next(self.sequence), event)
+        return self._trim()
+
+    def pop(self, count):
+        """Remove and return the oldest events, at most count of them."""
+        oldest = heapq.nsmallest(count, self.events.itervalues())
+        for seq, event in oldest:
+            del self.events[self._key(event)]
+        return oldest
+
+    def requeue(self, events):
+        """Put back events returned by pop if they are not superseded.
+
+        Return the events dropped to make room.
+        """
+        for seq, event in events:
+            self.events.setdefault(self._key(event), (seq, event))
+        return self._trim()
 
 
 class Notifier(object):
@@ -50,7 +113,10 @@ class Notifier(object):
             bypass_url=bypass_url,
             region_name=cfg.CONF.nova_region_name,
             extensions=[server_external_events])
-        self.pending_events = []
+        self.pending_events = EventBuffer(cfg.CONF.max_pending_nova_events)
+        self.counters = {'queued': 0, 'sent': 0, 'dropped': 0}
+        self.send_failures = 0
+        self.retry_at = 0
         event_sender = loopingcall.FixedIntervalLoopingCall(self.send_events)
         event_sender.start(interval=cfg.CONF.send_events_interval)
 
@@ -91,7 +157,7 @@ class Notifier(object):
         event = self.create_port_changed_event(action, original_obj,
                                                returned_obj)
         if event:
-            self.pending_events.append(event)
+            self.queue_event(event)
 
     def create_port_changed_event(self, action, original_obj, returned_obj):
         port = None
@@ -169,29 +235,81 @@ class Notifier(object):
     def send_port_status(self, mapper, connection, port):
         event = getattr(port, "_notify_event", None)
         if event:
-            self.pending_events.append(event)
+            self.queue_event(event)
         port._notify_event = None
 
-    def send_events(self):
-        batched_events = []
-        for event in range(len(self.pending_events)):
-            batched_events.append(self.pending_events.pop())
+    def queue_event(self, event):
+        self.counters['queued'] += 1
+        self._drop_events(self.pending_events.add(event))
+
+    def _drop_events(self, events):
+        if events:
+            self.counters['dropped'] += len(events)
+            LOG.warning(_("Too many pending nova events, dropping: %s"),
+                        events)
 
-        if not batched_events:
+    def send_events(self):
+        if not self.pending_events or time.time() < self.retry_at:
             return
 
+        batch_size = max(cfg.CONF.send_events_batch_size, 1)
+        while self.pending_events:
+            batched_events = self.pending_events.pop(batch_size)
+            if not self._send_events([event for seq, event
+                                      in batched_events]):
+                self.send_failures += 1
+                if self.send_failures > cfg.CONF.send_events_max_retries:
+                    # give up so that the newer events are not held back
+                    LOG.error(_("Failed to send nova events %(count)d "
+                                "times, dropping: %(events)s"),
+                              {'count': self.send_failures,
+                               'events': batched_events})
+                    self.counters['dropped'] += len(batched_events)
+                    self.send_failures = 0
+                    break
+                # retry later with an exponential backoff
+                self._drop_events(
+                    self.pending_events.requeue(batched_events))
+                delay = min(cfg.CONF.send_events_interval *
+                            2 ** self.send_failures,
+                            cfg.CONF.send_events_max_backoff)
+                self.retry_at = time.time() + delay
+                break
+            self.counters['sent'] += len(batched_events)
+            self.send_failures = 0
+        LOG.debug(_("Nova events queued: %(queued)s, sent: %(sent)s, "
+                    "dropped: %(dropped)s"), self.counters)
+
+    @staticmethod
+    def _is_transient(error):
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        return (isinstance(error, nova_exceptions.ClientException) and
+                isinstance(error.code, int) and error.code >= 500)
+
+    def _send_events(self, batched_events):
+        """Send events to nova, return False if they should be resent."""
         LOG.debug(_("Sending events: %s"), batched_events)
         try:
             response = self.nclient.server_external_events.create(
                 batched_events)
-        except Exception:
-            LOG.exception(_("Failed to notify nova on events: %s"),
+        except nova_exceptions.NotFound:
+            LOG.warning(_("Nova returned NotFound for events: %s"),
+                        batched_events)
+            return True
+        except Exception as e:
+            if self._is_transient(e):
+                LOG.exception(_("Failed to notify nova on events: %s"),
+                              batched_events)
+                return False
+            LOG.exception(_("Nova rejected events, dropping: %s"),
                           batched_events)
+            return True
         else:
             if not isinstance(response, list):
                 LOG.error(_("Error response returned from nova: %s"),
                           response)
-                return
+                return True
             response_error = False
             for event in response:
                 try:
@@ -207,3 +325,4 @@ class Notifier(object):
             if response_error:
                 LOG.error(_("Error response returned from nova: %s"),
                           response)
+            return True
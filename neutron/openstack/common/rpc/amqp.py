@@ -23,9 +23,13 @@ AMQP. Specifically, this includes impl_kombu and impl_qpid. impl_carrot also
 uses AMQP, but is deprecated and predates this code.
 """
 
+import bisect
 import collections
 import inspect
+import os
 import sys
+import tempfile
+import time
 import uuid
 
 from eventlet import greenpool
@@ -38,8 +42,10 @@ import six
 
 from neutron.openstack.common import excutils
 from neutron.openstack.common.gettextutils import _
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import local
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
 from neutron.openstack.common.rpc import common as rpc_common
 
 
@@ -52,6 +58,19 @@ amqp_opts = [
     cfg.BoolOpt('amqp_auto_delete',
                 default=False,
                 help='Auto-delete queues in amqp.'),
+    cfg.IntOpt('rpc_conn_pool_max_overflow',
+               default=0,
+               help='Number of connections the RPC connection pool may open '
+                    'beyond rpc_conn_pool_size during a burst instead of '
+                    'blocking. Extra connections are closed when returned '
+                    'to the pool and nobody is waiting for one.'),
+    cfg.IntOpt('rpc_metrics_interval',
+               default=0,
+               help='Seconds between reports of RPC connection pool and '
+                    'call latency metrics. 0 disables reporting.'),
+    cfg.StrOpt('rpc_metrics_file',
+               help='If set, RPC metrics are also written as JSON to this '
+                    'file at every report, instead of only being logged.'),
 ]
 
 cfg.CONF.register_opts(amqp_opts)
@@ -60,21 +79,173 @@ UNIQUE_ID = '_unique_id'
 LOG = logging.getLogger(__name__)
 
 
+class _Histogram(object):
+    """Latency histogram with fixed bucket upper bounds, in seconds."""
+
+    BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        buckets = dict(('le_%s' % bound, count) for bound, count
+                       in zip(self.BUCKETS, self.counts))
+        buckets['le_inf'] = self.counts[-1]
+        return {'count': self.count,
+                'avg': self.total / self.count if self.count else 0.0,
+                'max': self.max,
+                'buckets': buckets}
+
+
+class RpcMetrics(object):
+    """Counters and latency histograms for the AMQP rpc drivers.
+
+    Pool gauges are read from the registered pools when a snapshot is
+    taken, so recording only has to deal with events and latencies.
+    """
+
+    def __init__(self):
+        self.pools = []
+        self.reset()
+
+    def reset(self):
+        self.acquires = 0
+        self.acquire_waits = 0
+        self.overflow_created = 0
+        self.acquire_wait = _Histogram()
+        self.calls = collections.defaultdict(_Histogram)
+        self.dispatches = collections.defaultdict(_Histogram)
+
+    def register_pool(self, pool):
+        self.pools.append(pool)
+
+    def unregister_pool(self, pool):
+        if pool in self.pools:
+            self.pools.remove(pool)
+
+    def record_acquire(self, wait, blocked=False):
+        self.acquires += 1
+        if blocked:
+            self.acquire_waits += 1
+        self.acquire_wait.add(wait)
+
+    def record_call(self, topic, method, latency):
+        self.calls['%s.%s' % (topic, method)].add(latency)
+
+    def record_dispatch(self, method, latency):
+        self.dispatches[method].add(latency)
+
+    def snapshot(self):
+        pools = []
+        in_flight = 0
+        for pool in self.pools:
+            pools.append({'size': pool.current_size,
+                          'in_use': pool.current_size - len(pool.free_items),
+                          'waiting': pool.waiting(),
+                          'max_size': pool.max_size})
+            if pool.reply_proxy:
+                in_flight += pool.reply_proxy.num_call_waiters
+        return {
+            'pools': pools,
+            'in_flight_calls': in_flight,
+            'acquires': self.acquires,
+            'acquire_waits': self.acquire_waits,
+            'overflow_created': self.overflow_created,
+            'acquire_wait': self.acquire_wait.to_dict(),
+            'calls': dict((key, histogram.to_dict())
+                          for key, histogram in six.iteritems(self.calls)),
+            'dispatches': dict((key, histogram.to_dict()) for key, histogram
+                               in six.iteritems(self.dispatches)),
+        }
+
+    def report(self, conf):
+        stats = jsonutils.dumps(self.snapshot(), sort_keys=True)
+        LOG.info(_('RPC metrics: %s'), stats)
+        if conf.rpc_metrics_file:
+            # Write to a temporary file first so readers never see a
+            # partially written report.
+            dirname = os.path.dirname(os.path.abspath(conf.rpc_metrics_file))
+            fd, tmp_path = tempfile.mkstemp(dir=dirname)
+            with os.fdopen(fd, 'w') as f:
+                f.write(stats)
+            os.rename(tmp_path, conf.rpc_metrics_file)
+
+
+METRICS = RpcMetrics()
+_metrics_reporter = None
+
+
+def _report_metrics(conf):
+    try:
+        METRICS.report(conf)
+    except Exception:
+        LOG.exception(_('Failed to report RPC metrics'))
+
+
+def _start_metrics_reporter(conf):
+    global _metrics_reporter
+    if _metrics_reporter or conf.rpc_metrics_interval <= 0:
+        return
+    _metrics_reporter = loopingcall.FixedIntervalLoopingCall(
+        _report_metrics, conf)
+    _metrics_reporter.start(interval=conf.rpc_metrics_interval,
+                            initial_delay=conf.rpc_metrics_interval)
+
+
 class Pool(pools.Pool):
-    """Class that implements a Pool of Connections."""
+    """Class that implements a Pool of Connections.
+
+    The pool keeps up to rpc_conn_pool_size connections and may open up to
+    rpc_conn_pool_max_overflow more while callers would otherwise block;
+    those are closed again as soon as they are returned with no waiters.
+    """
     def __init__(self, conf, connection_cls, *args, **kwargs):
         self.connection_cls = connection_cls
         self.conf = conf
         kwargs.setdefault("max_size", self.conf.rpc_conn_pool_size)
         kwargs.setdefault("order_as_stack", True)
+        self.base_size = kwargs['max_size']
+        kwargs['max_size'] += max(0, self.conf.rpc_conn_pool_max_overflow)
         super(Pool, self).__init__(*args, **kwargs)
         self.reply_proxy = None
+        METRICS.register_pool(self)
 
     # TODO(comstud): Timeout connections not used in a while
     def create(self):
         LOG.debug(_('Pool creating new connection'))
+        if self.current_size > self.base_size:
+            METRICS.overflow_created += 1
         return self.connection_cls(self.conf)
 
+    def get(self):
+        blocked = (not self.free_items and
+                   self.current_size >= self.max_size)
+        start = time.time()
+        item = super(Pool, self).get()
+        METRICS.record_acquire(time.time() - start, blocked)
+        return item
+
+    def put(self, item):
+        if self.current_size > self.base_size and not self.waiting():
+            # Shrink back once the burst is over
+            self.current_size -= 1
+            try:
+                item.close()
+            except Exception:
+                LOG.debug(_('Failed to close overflow connection'),
+                          exc_info=True)
+            return
+        super(Pool, self).put(item)
+
     def empty(self):
         while self.free_items:
             self.get().close()
@@ -88,6 +259,7 @@ class Pool(pools.Pool):
         # just before doing a sys.exit(), so cleanup() only happens once and
         # the leakage is not a problem.
         self.connection_cls.pool = None
+        METRICS.unregister_pool(self)
 
 
 _pool_create_sem = semaphore.Semaphore()
@@ -98,6 +270,7 @@ def get_connection_pool(conf, connection_cls):
         # Make sure only one thread tries to create the connection pool.
         if not connection_cls.pool:
             connection_cls.pool = Pool(conf, connection_cls)
+            _start_metrics_reporter(conf)
     return connection_cls.pool
 
 
@@ -219,6 +392,10 @@ class ReplyProxy(ConnectionContext):
         self._num_call_waiters -= 1
         del self._call_waiters[msg_id]
 
+    @property
+    def num_call_waiters(self):
+        return self._num_call_waiters
+
     def get_reply_q(self):
         return self._reply_q
 
@@ -457,6 +634,7 @@ class ProxyCallback(_ThreadPoolWithWait):
         proxy we have here.
         """
         ctxt.update_store()
+        start = time.time()
         try:
             rval = self.proxy.dispatch(ctxt, version, method, namespace,
                                        **args)
@@ -480,11 +658,17 @@ class ProxyCallback(_ThreadPoolWithWait):
             LOG.error(_('Exception during message handling'),
                       exc_info=exc_info)
             ctxt.reply(None, exc_info, connection_pool=self.connection_pool)
+        finally:
+            METRICS.record_dispatch(method, time.time() - start)
 
 
 class MulticallProxyWaiter(object):
-    def __init__(self, conf, msg_id, timeout, connection_pool):
+    def __init__(self, conf, msg_id, timeout, connection_pool, topic=None,
+                 method=None):
         self._msg_id = msg_id
+        self._topic = topic
+        self._method = method
+        self._start = time.time()
         self._timeout = timeout or conf.rpc_response_timeout
         self._reply_proxy = connection_pool.reply_proxy
         self._done = False
@@ -504,6 +688,8 @@ class MulticallProxyWaiter(object):
         self._done = True
         # Remove this caller from reply proxy's call_waiters
         self._reply_proxy.del_call_waiter(self._msg_id)
+        METRICS.record_call(self._topic, self._method,
+                            time.time() - self._start)
 
     def _process_data(self, data):
         result = None
@@ -562,7 +748,8 @@ def multicall(conf, context, topic, msg, timeout, connection_pool):
         if not connection_pool.reply_proxy:
             connection_pool.reply_proxy = ReplyProxy(conf, connection_pool)
     msg.update({'_reply_q': connection_pool.reply_proxy.get_reply_q()})
-    wait_msg = MulticallProxyWaiter(conf, msg_id, timeout, connection_pool)
+    wait_msg = MulticallProxyWaiter(conf, msg_id, timeout, connection_pool,
+                                    topic=topic, method=msg.get('method'))
     with ConnectionContext(conf, connection_pool) as conn:
         conn.topic_send(topic, rpc_common.serialize_msg(msg), timeout)
     return wait_msg
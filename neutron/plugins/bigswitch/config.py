@@ -50,6 +50,9 @@ restproxy_opts = [
                 help=_("Disables SSL certificate validation for controllers")),
     cfg.BoolOpt('cache_connections', default=True,
                 help=_("Re-use HTTP/HTTPS connections to the controller.")),
+    cfg.IntOpt('server_connection_pool_size', default=4,
+               help=_("Maximum number of concurrent connections to each "
+                      "controller.")),
     cfg.StrOpt('ssl_cert_directory',
                default='/etc/neutron/plugins/bigswitch/ssl',
                help=_("Directory containing ca_certs and host_certs "
@@ -67,6 +70,13 @@ restproxy_opts = [
     cfg.IntOpt('server_timeout', default=10,
                help=_("Maximum number of seconds to wait for proxy request "
                       "to connect and complete.")),
+    cfg.BoolOpt('sync_streaming', default=False,
+                help=_("Stream the topology sent to the controller to "
+                       "synchronize it with chunked transfer encoding, "
+                       "instead of building it whole in memory first.")),
+    cfg.IntOpt('sync_page_size', default=500,
+               help=_("Number of networks, ports or routers read from the "
+                      "database at a time for a streamed synchronization.")),
     cfg.IntOpt('thread_pool_size', default=4,
                help=_("Maximum number of threads to spawn to handle large "
                       "volumes of port creations.")),
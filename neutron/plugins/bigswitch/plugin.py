@@ -193,14 +193,8 @@ class NeutronRestProxyV2Base(db_base_plugin_v2.NeutronDbPluginV2,
                 net_ports = self.get_ports(admin_context,
                                            filters=net_filter) or []
                 for port in net_ports:
-                    mapped_port = self._map_state_and_status(port)
-                    mapped_port['attachment'] = {
-                        'id': port.get('device_id'),
-                        'mac': port.get('mac_address'),
-                    }
-                    mapped_port = self._extend_port_dict_binding(admin_context,
-                                                                 mapped_port)
-                    ports.append(mapped_port)
+                    ports.append(self._get_mapped_topology_port(
+                        admin_context, port))
                 flips_n_ports['ports'] = ports
 
             if flips_n_ports:
@@ -212,28 +206,110 @@ class NeutronRestProxyV2Base(db_base_plugin_v2.NeutronDbPluginV2,
             routers = []
             all_routers = self.get_routers(admin_context) or []
             for router in all_routers:
-                interfaces = []
-                mapped_router = self._map_state_and_status(router)
-                router_filter = {
-                    'device_owner': [const.DEVICE_OWNER_ROUTER_INTF],
-                    'device_id': [router.get('id')]
-                }
-                router_ports = self.get_ports(admin_context,
-                                              filters=router_filter) or []
-                for port in router_ports:
-                    net_id = port.get('network_id')
-                    subnet_id = port['fixed_ips'][0]['subnet_id']
-                    intf_details = self._get_router_intf_details(admin_context,
-                                                                 net_id,
-                                                                 subnet_id)
-                    interfaces.append(intf_details)
-                mapped_router['interfaces'] = interfaces
-
-                routers.append(mapped_router)
+                routers.append(self._get_mapped_topology_router(
+                    admin_context, router))
 
             data.update({'routers': routers})
         return data
 
+    def _get_mapped_topology_port(self, context, port):
+        mapped_port = self._map_state_and_status(port)
+        mapped_port['attachment'] = {
+            'id': port.get('device_id'),
+            'mac': port.get('mac_address'),
+        }
+        return self._extend_port_dict_binding(context, mapped_port)
+
+    def _get_mapped_topology_router(self, context, router):
+        interfaces = []
+        mapped_router = self._map_state_and_status(router)
+        router_filter = {
+            'device_owner': [const.DEVICE_OWNER_ROUTER_INTF],
+            'device_id': [router.get('id')]
+        }
+        router_ports = self.get_ports(context, filters=router_filter) or []
+        for port in router_ports:
+            net_id = port.get('network_id')
+            subnet_id = port['fixed_ips'][0]['subnet_id']
+            intf_details = self._get_router_intf_details(context,
+                                                         net_id,
+                                                         subnet_id)
+            interfaces.append(intf_details)
+        mapped_router['interfaces'] = interfaces
+        return mapped_router
+
+    def _get_all_data_stream(self, get_ports=True, get_floating_ips=True,
+                             get_routers=True, extra=None):
+        """Return the data of _get_all_data as a streamed request body.
+
+        Networks, their ports and routers are read from the database
+        sync_page_size at a time and serialized as they are read, so the
+        memory used does not grow with the size of the topology.
+        """
+        def network_items():
+            for context, net in self._iter_pages(self.get_networks):
+                mapped_network = self._get_mapped_network_with_subnets(
+                    net, context)
+                flips_n_ports = {}
+                if get_floating_ips:
+                    flips_n_ports = self._get_network_with_floatingips(
+                        mapped_network, context)
+                if get_ports:
+                    yield servermanager.stream_json(
+                        flips_n_ports, [('ports', port_items(net['id']))])
+                elif flips_n_ports:
+                    yield flips_n_ports
+
+        def port_items(net_id):
+            for context, port in self._iter_pages(
+                    self._get_ports_page, {'network_id': [net_id]}):
+                yield self._get_mapped_topology_port(context, port)
+
+        def router_items():
+            for context, router in self._iter_pages(self.get_routers):
+                yield self._get_mapped_topology_router(context, router)
+
+        def stream():
+            lists = [('networks', network_items())]
+            if get_routers:
+                lists.append(('routers', router_items()))
+            return servermanager.stream_json(extra or {}, lists)
+
+        return servermanager.ChunkedBody(stream)
+
+    def _get_ports_page(self, context, **kwargs):
+        # The port bindings are added when the port is mapped
+        return db_base_plugin_v2.NeutronDbPluginV2.get_ports(self, context,
+                                                             **kwargs)
+
+    def _iter_pages(self, getter, filters=None):
+        """Yield a context and each resource returned by getter.
+
+        Resources are read by pages of sync_page_size, each with a new
+        context so the objects loaded for a page do not accumulate.
+        """
+        page_size = cfg.CONF.RESTPROXY.sync_page_size
+        marker = None
+        while True:
+            context = qcontext.get_admin_context()
+            page = getter(context, filters=filters, sorts=[('id', True)],
+                          limit=page_size, marker=marker)
+            for resource in page:
+                yield context, resource
+            if len(page) < page_size:
+                return
+            marker = page[-1]['id']
+
+    def _get_topology(self, get_ports=True, get_floating_ips=True,
+                      get_routers=True, extra=None):
+        """Return the topology sent to the controller to synchronize it."""
+        if cfg.CONF.RESTPROXY.sync_streaming:
+            return self._get_all_data_stream(get_ports, get_floating_ips,
+                                             get_routers, extra)
+        data = self._get_all_data(get_ports, get_floating_ips, get_routers)
+        data.update(extra or {})
+        return data
+
     def _send_all_data(self, send_ports=True, send_floating_ips=True,
                        send_routers=True, timeout=None,
                        triggered_by_tenant=None):
@@ -242,8 +318,9 @@ class NeutronRestProxyV2Base(db_base_plugin_v2.NeutronDbPluginV2,
         This gives the controller an option to re-sync it's persistent store
         with neutron's current view of that data.
         """
-        data = self._get_all_data(send_ports, send_floating_ips, send_routers)
-        data['triggered_by_tenant'] = triggered_by_tenant
+        data = self._get_topology(
+            send_ports, send_floating_ips, send_routers,
+            extra={'triggered_by_tenant': triggered_by_tenant})
         errstr = _("Unable to update remote topology: %s")
         return self.servers.rest_action('PUT', servermanager.TOPOLOGY_PATH,
                                         data, errstr, timeout=timeout)
@@ -477,7 +554,7 @@ class NeutronRestProxyV2(NeutronRestProxyV2Base,
 
         # init network ctrl connections
         self.servers = servermanager.ServerPool(server_timeout)
-        self.servers.get_topo_function = self._get_all_data
+        self.servers.get_topo_function = self._get_topology
         self.servers.get_topo_function_args = {'get_ports': True,
                                                'get_floating_ips': True,
                                                'get_routers': True}
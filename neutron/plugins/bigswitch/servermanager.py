@@ -37,12 +37,13 @@ import json
 import os
 import socket
 import ssl
+import time
 
 import eventlet
+from eventlet import semaphore
 from oslo.config import cfg
 
 from neutron.common import exceptions
-from neutron.common import utils
 from neutron.openstack.common import excutils
 from neutron.openstack.common import log as logging
 from neutron.plugins.bigswitch.db import consistency_db as cdb
@@ -69,6 +70,8 @@ FAILURE_CODES = [0, 301, 302, 303, 400, 401, 403, 404, 500, 501, 502, 503,
 BASE_URI = '/networkService/v1.1'
 ORCHESTRATION_SERVICE_ID = 'Neutron v2.0'
 HASH_MATCH_HEADER = 'X-BSN-BVS-HASH-MATCH'
+# Size of the chunks of streamed request bodies
+CHUNK_SIZE = 65536
 # error messages
 NXNETWORK = 'NXVNS'
 
@@ -84,6 +87,119 @@ class RemoteRestError(exceptions.NeutronException):
         super(RemoteRestError, self).__init__(**kwargs)
 
 
+def stream_json(obj, lists):
+    """Yield the JSON text of a dict extended with lists of items.
+
+    lists is a list of (key, items) pairs, items an iterable of dicts or
+    of iterables of JSON text, such as those returned by this function,
+    that is only consumed as the text is.
+    """
+    text = json.dumps(obj)
+    yield text[:-1]
+    separator = ', ' if obj else ''
+    for key, items in lists:
+        yield '%s%s: [' % (separator, json.dumps(key))
+        separator = ', '
+        item_separator = ''
+        for item in items:
+            yield item_separator
+            item_separator = ', '
+            if isinstance(item, dict):
+                yield json.dumps(item)
+            else:
+                for text in item:
+                    yield text
+        yield ']'
+    yield '}'
+
+
+class ChunkedBody(object):
+    """Request body sent with the chunked transfer encoding.
+
+    factory returns an iterable of the text of the body. It is called
+    every time the body is sent, so requests can be retried.
+    """
+
+    def __init__(self, factory, chunk_size=CHUNK_SIZE):
+        self.factory = factory
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        chunk = []
+        size = 0
+        for text in self.factory():
+            chunk.append(text)
+            size += len(text)
+            if size >= self.chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+        if size:
+            yield ''.join(chunk)
+
+
+class ConnectionPool(object):
+    """Bounded pool of keep-alive connections to a controller.
+
+    Also keeps the statistics of the calls made through it: their number
+    and latency, and how many had to wait for a connection to be
+    released.
+    """
+
+    def __init__(self, size, factory):
+        self.size = size
+        # Called with a timeout to open a new connection
+        self.factory = factory
+        self.idle = []
+        self.in_use = 0
+        self._semaphore = semaphore.Semaphore(size)
+        self.stats = {'calls': 0, 'total_time': 0.0, 'max_time': 0.0,
+                      'waits': 0, 'wait_time': 0.0, 'max_in_use': 0}
+
+    def get(self, timeout, fresh=False):
+        """Return a connection and whether it was reused."""
+        start = time.time()
+        if not self._semaphore.acquire(blocking=False):
+            self.stats['waits'] += 1
+            self._semaphore.acquire()
+            self.stats['wait_time'] += time.time() - start
+        self.in_use += 1
+        self.stats['max_in_use'] = max(self.stats['max_in_use'], self.in_use)
+        if self.idle and not fresh:
+            return self.idle.pop(), True
+        if self.idle:
+            # Keep no more connections than the pool size
+            self.idle.pop(0).close()
+        try:
+            return self.factory(timeout), False
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._release()
+
+    def put(self, conn, keep=True):
+        """Return a connection, closing it unless it is to be kept."""
+        if keep:
+            self.idle.append(conn)
+        else:
+            conn.close()
+        self._release()
+
+    def _release(self):
+        self.in_use -= 1
+        self._semaphore.release()
+
+    def record_call(self, elapsed):
+        self.stats['calls'] += 1
+        self.stats['total_time'] += elapsed
+        self.stats['max_time'] = max(self.stats['max_time'], elapsed)
+
+    def get_stats(self):
+        stats = dict(self.stats, in_use=self.in_use, idle=len(self.idle),
+                     size=self.size)
+        stats['saturation'] = float(self.in_use) / self.size
+        return stats
+
+
 class ServerProxy(object):
     """REST server proxy to a network controller."""
 
@@ -102,8 +218,10 @@ class ServerProxy(object):
         self.capabilities = []
         # enable server to reference parent pool
         self.mypool = mypool
-        # cache connection here to avoid a SSL handshake for every connection
-        self.currentconn = None
+        # cache connections here to avoid a SSL handshake for every request
+        self.connections = ConnectionPool(
+            cfg.CONF.RESTPROXY.server_connection_pool_size,
+            self._connect)
         if auth:
             self.auth = 'Basic ' + base64.encodestring(auth).strip()
         self.combined_cert = combined_cert
@@ -123,7 +241,7 @@ class ServerProxy(object):
     def rest_call(self, action, resource, data='', headers={}, timeout=False,
                   reconnect=False):
         uri = self.base_uri + resource
-        body = json.dumps(data)
+        body = data if isinstance(data, ChunkedBody) else json.dumps(data)
         if not headers:
             headers = {}
         headers['Content-type'] = 'application/json'
@@ -156,28 +274,21 @@ class ServerProxy(object):
             # need a new connection if timeout has changed
             reconnect = True
 
-        if not self.currentconn or reconnect:
-            if self.currentconn:
-                self.currentconn.close()
-            if self.ssl:
-                self.currentconn = HTTPSConnectionWithValidation(
-                    self.server, self.port, timeout=timeout)
-                self.currentconn.combined_cert = self.combined_cert
-                if self.currentconn is None:
-                    LOG.error(_('ServerProxy: Could not establish HTTPS '
-                                'connection'))
-                    return 0, None, None, None
-            else:
-                self.currentconn = httplib.HTTPConnection(
-                    self.server, self.port, timeout=timeout)
-                if self.currentconn is None:
-                    LOG.error(_('ServerProxy: Could not establish HTTP '
-                                'connection'))
-                    return 0, None, None, None
-
+        start = time.time()
+        try:
+            conn, reused = self.connections.get(timeout, fresh=reconnect)
+        except Exception as e:
+            LOG.error(_('ServerProxy: Could not establish connection, %r'), e)
+            return 0, None, None, None
+        # Connections opened for another timeout are not reused
+        keep = ('keep-alive' in self.capabilities and
+                timeout == self.timeout)
         try:
-            self.currentconn.request(action, uri, body, headers)
-            response = self.currentconn.getresponse()
+            if isinstance(body, ChunkedBody):
+                self._send_chunked(conn, action, uri, body, headers)
+            else:
+                conn.request(action, uri, body, headers)
+            response = conn.getresponse()
             newhash = response.getheader(HASH_MATCH_HEADER)
             if newhash:
                 self._put_consistency_hash(newhash)
@@ -193,22 +304,25 @@ class ServerProxy(object):
         except httplib.HTTPException:
             # If we were using a cached connection, try again with a new one.
             with excutils.save_and_reraise_exception() as ctxt:
-                self.currentconn.close()
-                if reconnect:
-                    # if reconnect is true, this was on a fresh connection so
-                    # reraise since this server seems to be broken
-                    ctxt.reraise = True
-                else:
-                    # if reconnect is false, it was a cached connection so
-                    # try one more time before re-raising
-                    ctxt.reraise = False
+                self.connections.put(conn, keep=False)
+                # if the connection was not reused, this was on a fresh
+                # connection so reraise since this server seems to be broken
+                ctxt.reraise = not reused
             return self.rest_call(action, resource, data, headers,
                                   timeout=timeout, reconnect=True)
         except (socket.timeout, socket.error) as e:
-            self.currentconn.close()
+            self.connections.put(conn, keep=False)
             LOG.error(_('ServerProxy: %(action)s failure, %(e)r'),
                       {'action': action, 'e': e})
             ret = 0, None, None, None
+        except Exception:
+            # e.g. a streamed body failing to be produced or a database
+            # error storing the consistency hash
+            with excutils.save_and_reraise_exception():
+                self.connections.put(conn, keep=False)
+        else:
+            self.connections.put(conn, keep=keep)
+        self.connections.record_call(time.time() - start)
         LOG.debug(_("ServerProxy: status=%(status)d, reason=%(reason)r, "
                     "ret=%(ret)s, data=%(data)r"), {'status': ret[0],
                                                     'reason': ret[1],
@@ -216,7 +330,30 @@ class ServerProxy(object):
                                                     'data': ret[3]})
         return ret
 
+    def _send_chunked(self, conn, action, uri, body, headers):
+        conn.putrequest(action, uri)
+        for header, value in headers.items():
+            conn.putheader(header, value)
+        conn.putheader('Transfer-Encoding', 'chunked')
+        conn.endheaders()
+        for chunk in body:
+            conn.send('%x\r\n%s\r\n' % (len(chunk), chunk))
+        conn.send('0\r\n\r\n')
+
+    def _connect(self, timeout):
+        if self.ssl:
+            conn = HTTPSConnectionWithValidation(
+                self.server, self.port, timeout=timeout)
+            conn.combined_cert = self.combined_cert
+        else:
+            conn = httplib.HTTPConnection(
+                self.server, self.port, timeout=timeout)
+        return conn
+
     def _put_consistency_hash(self, newhash):
+        # Most responses carry the hash sent with the request
+        if newhash == self.mypool.consistency_hash:
+            return
         self.mypool.consistency_hash = newhash
         cdb.put_consistency_hash(newhash)
 
@@ -237,6 +374,7 @@ class ServerPool(object):
         self.name = name
         self.timeout = cfg.CONF.RESTPROXY.server_timeout
         self.always_reconnect = not cfg.CONF.RESTPROXY.cache_connections
+        self._rest_call_lock = semaphore.Semaphore()
         default_port = 8000
         if timeout is not False:
             self.timeout = timeout
@@ -391,9 +529,27 @@ class ServerPool(object):
         """
         return resp[0] in SUCCESS_CODES
 
-    @utils.synchronized('bsn-rest-call')
+    def get_stats(self):
+        """Return the connection pool statistics of each server."""
+        return dict(('%s:%d' % (server.server, server.port),
+                     server.connections.get_stats())
+                    for server in self.servers)
+
     def rest_call(self, action, resource, data, headers, ignore_codes,
                   timeout=False):
+        # Each call must carry the consistency hash returned by the
+        # previous one, so calls can only be made concurrently once the
+        # servers are known not to check it.
+        if 'consistency' not in getattr(self, 'capabilities',
+                                        ['consistency']):
+            return self._rest_call(action, resource, data, headers,
+                                   ignore_codes, timeout)
+        with self._rest_call_lock:
+            return self._rest_call(action, resource, data, headers,
+                                   ignore_codes, timeout)
+
+    def _rest_call(self, action, resource, data, headers, ignore_codes,
+                   timeout):
         good_first = sorted(self.servers, key=lambda x: x.failed)
         first_response = None
         for active_server in good_first:
@@ -31,6 +31,7 @@ from oslo.config import cfg
 
 from neutron.agent import l2population_rpc as l2pop_rpc
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import netlink_monitor
 from neutron.agent.linux import utils
 from neutron.agent import rpc as agent_rpc
 from neutron.agent import securitygroups_rpc as sg_rpc
@@ -85,6 +86,8 @@ class LinuxBridgeManager:
                               'must be provided'))
         # Store network mapping to segments
         self.network_map = {}
+        # (bridge_name, interface) pairs already set up by this agent
+        self.ensured_bridges = set()
 
     def device_exists(self, device):
         """Check if ethernet device exists."""
@@ -176,23 +179,49 @@ class LinuxBridgeManager:
                 DEVICE_NAME_PLACEHOLDER, device_name)
             return os.path.exists(bridge_port_path)
 
+    def bridge_is_ensured(self, bridge_name, interface=None):
+        """Check whether a bridge set up earlier is still in place.
+
+        Only sysfs is looked at, so a hit costs no process spawn.
+        """
+        if (bridge_name, interface) not in self.ensured_bridges:
+            return False
+        try:
+            if interface:
+                return self.interface_exists_on_bridge(bridge_name,
+                                                       interface)
+            return os.path.exists(BRIDGE_FS + bridge_name)
+        except OSError:
+            return False
+
+    def forget_bridge(self, bridge_name):
+        self.ensured_bridges = set(
+            (bridge, interface) for bridge, interface in self.ensured_bridges
+            if bridge != bridge_name)
+
     def ensure_vlan_bridge(self, network_id, physical_interface, vlan_id):
         """Create a vlan and bridge unless they already exist."""
-        interface = self.ensure_vlan(physical_interface, vlan_id)
         bridge_name = self.get_bridge_name(network_id)
+        interface = self.get_subinterface_name(physical_interface, vlan_id)
+        if self.bridge_is_ensured(bridge_name, interface):
+            return interface
+        interface = self.ensure_vlan(physical_interface, vlan_id)
         ips, gateway = self.get_interface_details(interface)
         if self.ensure_bridge(bridge_name, interface, ips, gateway):
             return interface
 
     def ensure_vxlan_bridge(self, network_id, segmentation_id):
         """Create a vxlan and bridge unless they already exist."""
+        bridge_name = self.get_bridge_name(network_id)
+        interface = self.get_vxlan_device_name(segmentation_id)
+        if self.bridge_is_ensured(bridge_name, interface):
+            return interface
         interface = self.ensure_vxlan(segmentation_id)
         if not interface:
             LOG.error(_("Failed creating vxlan interface for "
                         "%(segmentation_id)s"),
                       {segmentation_id: segmentation_id})
             return
-        bridge_name = self.get_bridge_name(network_id)
         self.ensure_bridge(bridge_name, interface)
         return interface
 
@@ -207,6 +236,8 @@ class LinuxBridgeManager:
     def ensure_flat_bridge(self, network_id, physical_interface):
         """Create a non-vlan bridge unless it already exists."""
         bridge_name = self.get_bridge_name(network_id)
+        if self.bridge_is_ensured(bridge_name, physical_interface):
+            return physical_interface
         ips, gateway = self.get_interface_details(physical_interface)
         if self.ensure_bridge(bridge_name, physical_interface, ips, gateway):
             return physical_interface
@@ -214,6 +245,8 @@ class LinuxBridgeManager:
     def ensure_local_bridge(self, network_id):
         """Create a local bridge unless it already exists."""
         bridge_name = self.get_bridge_name(network_id)
+        if self.bridge_is_ensured(bridge_name):
+            return bridge_name
         return self.ensure_bridge(bridge_name)
 
     def ensure_vlan(self, physical_interface, vlan_id):
@@ -310,6 +343,7 @@ class LinuxBridgeManager:
                       {'bridge_name': bridge_name, 'interface': interface})
 
         if not interface:
+            self.ensured_bridges.add((bridge_name, None))
             return bridge_name
 
         # Update IP info if necessary
@@ -332,6 +366,7 @@ class LinuxBridgeManager:
                           {'interface': interface, 'bridge_name': bridge_name,
                            'e': e})
                 return
+        self.ensured_bridges.add((bridge_name, interface))
         return bridge_name
 
     def ensure_physical_in_bridge(self, network_id,
@@ -373,12 +408,8 @@ class LinuxBridgeManager:
             return False
 
         bridge_name = self.get_bridge_name(network_id)
-        if network_type == p_const.TYPE_LOCAL:
-            self.ensure_local_bridge(network_id)
-        elif not self.ensure_physical_in_bridge(network_id,
-                                                network_type,
-                                                physical_network,
-                                                segmentation_id):
+        if not self.ensure_network_bridge(network_id, network_type,
+                                          physical_network, segmentation_id):
             return False
 
         # Check if device needs to be added to bridge
@@ -400,6 +431,82 @@ class LinuxBridgeManager:
             LOG.debug(msg)
         return True
 
+    def ensure_network_bridge(self, network_id, network_type,
+                              physical_network, segmentation_id):
+        if network_type == p_const.TYPE_LOCAL:
+            self.ensure_local_bridge(network_id)
+            return True
+        return bool(self.ensure_physical_in_bridge(network_id,
+                                                   network_type,
+                                                   physical_network,
+                                                   segmentation_id))
+
+    def add_interfaces(self, ports):
+        """Plug several ports, enslaving their taps in one ip batch.
+
+        Ports are grouped by network so that each bridge is ensured once.
+        Each port is a dict with the network_id, network_type,
+        physical_network, segmentation_id and port_id keys. Returns the
+        ids of the ports that are plugged.
+        """
+        networks = {}
+        for port in ports:
+            networks.setdefault(port['network_id'], []).append(port)
+
+        tap_devices = self.get_tap_devices()
+        plugged = set()
+        pending = []
+        for network_id, network_ports in networks.iteritems():
+            segment = network_ports[0]
+            self.network_map[network_id] = NetworkSegment(
+                segment['network_type'], segment['physical_network'],
+                segment['segmentation_id'])
+            if not self.ensure_network_bridge(network_id,
+                                              segment['network_type'],
+                                              segment['physical_network'],
+                                              segment['segmentation_id']):
+                continue
+            bridge_name = self.get_bridge_name(network_id)
+            for port in network_ports:
+                tap_device_name = self.get_tap_device_name(port['port_id'])
+                if tap_device_name not in tap_devices:
+                    LOG.debug(_("Tap device: %s does not exist on "
+                                "this host, skipped"), tap_device_name)
+                elif self.is_device_on_bridge(tap_device_name):
+                    plugged.add(port['port_id'])
+                else:
+                    pending.append((port, bridge_name, tap_device_name))
+
+        if not pending:
+            return plugged
+        commands = ['link set dev %s master %s' % (tap_device_name,
+                                                   bridge_name)
+                    for port, bridge_name, tap_device_name in pending]
+        try:
+            self.execute_batch('ip', commands)
+        except RuntimeError:
+            LOG.warning(_("Batched plugging of %d tap devices failed, "
+                          "plugging them one by one"), len(pending))
+            for port, bridge_name, tap_device_name in pending:
+                if self.add_tap_interface(port['network_id'],
+                                          port['network_type'],
+                                          port['physical_network'],
+                                          port['segmentation_id'],
+                                          tap_device_name):
+                    plugged.add(port['port_id'])
+        else:
+            plugged.update(port['port_id'] for port, _b, _t in pending)
+        return plugged
+
+    def execute_batch(self, command, lines, check_exit_code=True):
+        """Run lines through a single 'ip -batch' or 'bridge -batch'."""
+        if not lines:
+            return
+        return utils.execute([command, '-force', '-batch', '-'],
+                             root_helper=self.root_helper,
+                             process_input='\n'.join(lines) + '\n',
+                             check_exit_code=check_exit_code)
+
     def add_interface(self, network_id, network_type, physical_network,
                       segmentation_id, port_id):
         self.network_map[network_id] = NetworkSegment(network_type,
@@ -411,6 +518,7 @@ class LinuxBridgeManager:
                                       tap_device_name)
 
     def delete_vlan_bridge(self, bridge_name):
+        self.forget_bridge(bridge_name)
         if self.device_exists(bridge_name):
             interfaces_on_bridge = self.get_interfaces_on_bridge(bridge_name)
             for interface in interfaces_on_bridge:
@@ -506,6 +614,27 @@ class LinuxBridgeManager:
                 'added': added,
                 'removed': removed}
 
+    def update_devices_from_events(self, registered_devices, events):
+        """Compute device deltas from link monitor events.
+
+        Only the last event seen for a device counts, so a tap created and
+        deleted between two iterations is never reported.
+        """
+        present = {}
+        for exists, device in events:
+            present[device] = exists
+        devices = set(registered_devices)
+        for device, exists in present.iteritems():
+            if exists:
+                devices.add(device)
+            else:
+                devices.discard(device)
+        if devices == registered_devices:
+            return
+        return {'current': devices,
+                'added': devices - registered_devices,
+                'removed': registered_devices - devices}
+
     def get_tap_devices(self):
         devices = set()
         for device in os.listdir(BRIDGE_FS):
@@ -622,6 +751,8 @@ class LinuxBridgeManager:
                       check_exit_code=False)
 
     def add_fdb_entries(self, agent_ip, ports, interface):
+        if cfg.CONF.AGENT.batch_device_commands:
+            return self._add_fdb_entries_batch(agent_ip, ports, interface)
         for mac, ip in ports:
             if mac != constants.FLOODING_ENTRY[0]:
                 self.add_fdb_ip_entry(mac, ip, interface)
@@ -634,6 +765,8 @@ class LinuxBridgeManager:
                     self.add_fdb_bridge_entry(mac, agent_ip, interface)
 
     def remove_fdb_entries(self, agent_ip, ports, interface):
+        if cfg.CONF.AGENT.batch_device_commands:
+            return self._remove_fdb_entries_batch(agent_ip, ports, interface)
         for mac, ip in ports:
             if mac != constants.FLOODING_ENTRY[0]:
                 self.remove_fdb_ip_entry(mac, ip, interface)
@@ -641,6 +774,39 @@ class LinuxBridgeManager:
             elif self.vxlan_mode == lconst.VXLAN_UCAST:
                 self.remove_fdb_bridge_entry(mac, agent_ip, interface)
 
+    def _add_fdb_entries_batch(self, agent_ip, ports, interface):
+        neigh_lines = []
+        fdb_lines = []
+        for mac, ip in ports:
+            if mac != constants.FLOODING_ENTRY[0]:
+                neigh_lines.append('neigh replace %s lladdr %s dev %s nud '
+                                   'permanent' % (ip, mac, interface))
+                fdb_lines.append('fdb add %s dev %s dst %s' %
+                                 (mac, interface, agent_ip))
+            elif self.vxlan_mode == lconst.VXLAN_UCAST:
+                if self.fdb_bridge_entry_exists(mac, interface):
+                    operation = 'append'
+                else:
+                    operation = 'add'
+                fdb_lines.append('fdb %s %s dev %s dst %s' %
+                                 (operation, mac, interface, agent_ip))
+        self.execute_batch('ip', neigh_lines, check_exit_code=False)
+        self.execute_batch('bridge', fdb_lines, check_exit_code=False)
+
+    def _remove_fdb_entries_batch(self, agent_ip, ports, interface):
+        neigh_lines = []
+        fdb_lines = []
+        for mac, ip in ports:
+            if mac != constants.FLOODING_ENTRY[0]:
+                neigh_lines.append('neigh del %s lladdr %s dev %s' %
+                                   (ip, mac, interface))
+            elif self.vxlan_mode != lconst.VXLAN_UCAST:
+                continue
+            fdb_lines.append('fdb del %s dev %s dst %s' %
+                             (mac, interface, agent_ip))
+        self.execute_batch('ip', neigh_lines, check_exit_code=False)
+        self.execute_batch('bridge', fdb_lines, check_exit_code=False)
+
 
 class LinuxBridgeRpcCallbacks(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                               l2pop_rpc.L2populationRpcCallBackMixin):
@@ -900,6 +1066,7 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
     def treat_devices_added(self, devices):
         resync = False
         self.prepare_devices_filter(devices)
+        batch_ports = {}
         for device in devices:
             LOG.debug(_("Port %s added"), device)
             try:
@@ -925,29 +1092,45 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                         vlan_id = details.get('vlan_id')
                         (network_type,
                          segmentation_id) = lconst.interpret_vlan_id(vlan_id)
-                    if self.br_mgr.add_interface(details['network_id'],
-                                                 network_type,
-                                                 details['physical_network'],
-                                                 segmentation_id,
-                                                 details['port_id']):
-
-                        # update plugin about port status
-                        self.plugin_rpc.update_device_up(self.context,
-                                                         device,
-                                                         self.agent_id,
-                                                         cfg.CONF.host)
-                    else:
-                        self.plugin_rpc.update_device_down(self.context,
-                                                           device,
-                                                           self.agent_id,
-                                                           cfg.CONF.host)
+                    if cfg.CONF.AGENT.batch_device_commands:
+                        batch_ports[device] = {
+                            'network_id': details['network_id'],
+                            'network_type': network_type,
+                            'physical_network': details['physical_network'],
+                            'segmentation_id': segmentation_id,
+                            'port_id': details['port_id']}
+                        continue
+                    self.update_device_status(
+                        device,
+                        self.br_mgr.add_interface(details['network_id'],
+                                                  network_type,
+                                                  details['physical_network'],
+                                                  segmentation_id,
+                                                  details['port_id']))
                 else:
                     self.remove_port_binding(details['network_id'],
                                              details['port_id'])
             else:
                 LOG.info(_("Device %s not defined on plugin"), device)
+        if batch_ports:
+            plugged = self.br_mgr.add_interfaces(batch_ports.values())
+            for device, port in batch_ports.iteritems():
+                self.update_device_status(device, port['port_id'] in plugged)
         return resync
 
+    def update_device_status(self, device, plugged):
+        # update plugin about port status
+        if plugged:
+            self.plugin_rpc.update_device_up(self.context,
+                                             device,
+                                             self.agent_id,
+                                             cfg.CONF.host)
+        else:
+            self.plugin_rpc.update_device_down(self.context,
+                                               device,
+                                               self.agent_id,
+                                               cfg.CONF.host)
+
     def treat_devices_removed(self, devices):
         resync = False
         self.remove_devices_filter(devices)
@@ -966,12 +1149,39 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                 LOG.info(_("Port %s updated."), device)
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
+        if devices:
             self.br_mgr.remove_empty_bridges()
         return resync
 
+    def start_link_monitor(self):
+        if not cfg.CONF.AGENT.use_netlink_monitor:
+            return
+        monitor = netlink_monitor.LinkMonitor(prefix=TAP_INTERFACE_PREFIX)
+        try:
+            monitor.start()
+        except Exception:
+            LOG.exception(_("Unable to start netlink link monitor, "
+                            "falling back to polling"))
+            return
+        return monitor
+
+    def _wait_for_devices(self, monitor, timeout):
+        """Wait for link events, returning them or None to force a poll."""
+        if not monitor or not monitor.is_active:
+            if timeout > 0:
+                time.sleep(timeout)
+            return
+        events = monitor.get_events(timeout=max(timeout, 0))
+        if not events or netlink_monitor.OVERFLOW in events:
+            return
+        return events
+
     def daemon_loop(self):
         sync = True
         devices = set()
+        events = None
+        last_poll = 0
+        monitor = self.start_link_monitor()
 
         LOG.info(_("LinuxBridge Agent RPC Daemon Started!"))
 
@@ -981,9 +1191,17 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                 LOG.info(_("Agent out of sync with plugin!"))
                 devices.clear()
                 sync = False
+                events = None
             device_info = {}
             try:
-                device_info = self.br_mgr.update_devices(devices)
+                # Link events only carry deltas; a full scan is still done
+                # every polling interval to catch anything they missed.
+                if events and start - last_poll < self.polling_interval:
+                    device_info = self.br_mgr.update_devices_from_events(
+                        devices, events)
+                else:
+                    last_poll = start
+                    device_info = self.br_mgr.update_devices(devices)
             except Exception:
                 LOG.exception(_("Update devices failed"))
                 sync = True
@@ -999,15 +1217,15 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                 LOG.exception(_("Error in agent loop. Devices info: %s"),
                               device_info)
                 sync = True
-            # sleep till end of polling interval
+            # wait for link events until the end of polling interval
             elapsed = (time.time() - start)
-            if (elapsed < self.polling_interval):
-                time.sleep(self.polling_interval - elapsed)
-            else:
+            if (elapsed >= self.polling_interval):
                 LOG.debug(_("Loop iteration exceeded interval "
                             "(%(polling_interval)s vs. %(elapsed)s)!"),
                           {'polling_interval': self.polling_interval,
                            'elapsed': elapsed})
+            events = self._wait_for_devices(
+                monitor, last_poll + self.polling_interval - time.time())
 
 
 def main():
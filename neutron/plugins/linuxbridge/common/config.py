@@ -65,6 +65,15 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.BoolOpt('use_netlink_monitor', default=True,
+                help=_("Listen to rtnetlink for tap devices being added "
+                       "or removed instead of waiting for the next poll. "
+                       "Polling is still done as a consistency check.")),
+    cfg.BoolOpt('batch_device_commands', default=False,
+                help=_("Plug tap devices and program VXLAN forwarding "
+                       "entries through 'ip -batch' and 'bridge -batch' "
+                       "rather than one command per device. Requires an "
+                       "iproute2 supporting -force and -batch.")),
     cfg.BoolOpt('rpc_support_old_agents', default=False,
                 help=_("Enable server RPC compatibility with old agents")),
 ]
@@ -21,3 +21,8 @@ from neutron.common import exceptions
 class MechanismDriverError(exceptions.NeutronException):
     """Mechanism driver call failed."""
     message = _("%(method)s failed.")
+
+
+class MechanismDriverTimeout(MechanismDriverError):
+    """Mechanism driver call timed out."""
+    message = _("%(method)s timed out after %(timeout)s seconds.")
@@ -30,6 +30,49 @@ ml2_opts = [
                 help=_("An ordered list of networking mechanism driver "
                        "entrypoints to be loaded from the "
                        "neutron.ml2.mechanism_drivers namespace.")),
+    cfg.IntOpt('postcommit_pool_size',
+               default=16,
+               help=_("Maximum number of postcommit calls of mechanism "
+                      "drivers declared parallel made concurrently.")),
+    cfg.FloatOpt('postcommit_timeout',
+                 default=0,
+                 help=_("Seconds after which a postcommit call of a "
+                        "mechanism driver is abandoned and considered "
+                        "failed, 0 to wait indefinitely.")),
+    cfg.DictOpt('postcommit_driver_timeouts',
+                default={},
+                help=_("Mapping of mechanism driver names to the "
+                       "postcommit_timeout they are given, overriding the "
+                       "default.")),
+    cfg.IntOpt('journal_workers',
+               default=1,
+               help=_("Number of green threads of each server dispatching "
+                      "the journaled postcommit operations of mechanism "
+                      "drivers.")),
+    cfg.IntOpt('journal_batch_size',
+               default=50,
+               help=_("Maximum number of journal entries claimed by a "
+                      "worker at once.")),
+    cfg.IntOpt('journal_poll_interval',
+               default=5,
+               help=_("Seconds between checks of the journal for entries "
+                      "written by other servers or due for a retry.")),
+    cfg.IntOpt('journal_max_retries',
+               default=5,
+               help=_("Number of times a failed journal entry is retried "
+                      "before it is marked as failed.")),
+    cfg.IntOpt('journal_retry_interval',
+               default=10,
+               help=_("Seconds before the first retry of a failed journal "
+                      "entry, doubled for every further retry.")),
+    cfg.IntOpt('journal_processing_timeout',
+               default=300,
+               help=_("Seconds after which an entry claimed by a worker that "
+                      "did not complete it is handed out again.")),
+    cfg.IntOpt('journal_lag_warning',
+               default=60,
+               help=_("Log a warning when the oldest pending journal entry "
+                      "is older than this many seconds.")),
 ]
 
 
@@ -56,6 +56,23 @@ def get_network_segments(session, network_id):
                 for record in records]
 
 
+def get_networks_segments(session, network_ids):
+    """Return a dict mapping each of the network ids to its segments."""
+    result = dict((network_id, []) for network_id in network_ids)
+    if not network_ids:
+        return result
+    with session.begin(subtransactions=True):
+        records = (session.query(models.NetworkSegment).
+                   filter(models.NetworkSegment.network_id.in_(network_ids)))
+        for record in records:
+            result[record.network_id].append(
+                {api.ID: record.id,
+                 api.NETWORK_TYPE: record.network_type,
+                 api.PHYSICAL_NETWORK: record.physical_network,
+                 api.SEGMENTATION_ID: record.segmentation_id})
+    return result
+
+
 def ensure_port_binding(session, port_id):
     with session.begin(subtransactions=True):
         try:
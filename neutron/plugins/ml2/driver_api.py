@@ -305,8 +305,26 @@ class MechanismDriver(object):
     Because rollback outside of the transaction is not done in the
     update network/port case, all data validation must be done within
     methods that are part of the database transaction.
+
+    A driver setting journal_postcommit to True is not called after
+    the transaction. Its postcommit operations are instead recorded in
+    the ml2 journal within the transaction, and dispatched in order for
+    each resource by background workers that retry failed calls. The
+    context passed to those calls is rebuilt from the journal, so it
+    only provides what the driver API defines, and exceptions do not
+    affect the resource anymore.
+
+    A driver setting parallel_postcommit to True has its postcommit
+    operations called in a green thread, concurrently with those of the
+    other such drivers, instead of after the drivers preceding it in
+    mechanism_drivers. It must not depend on the work of other drivers,
+    nor use the database session of the plugin context, which is shared
+    with them.
     """
 
+    journal_postcommit = False
+    parallel_postcommit = False
+
     @abstractmethod
     def initialize(self):
         """Perform driver initialization.
@@ -63,7 +63,20 @@ ARISTA_DRIVER_OPTS = [
                       'the region name registered (or known) to keystone'
                       'service. Authentication with Keysotne is performed by'
                       'EOS. This is optional. If not set, a value of'
-                      '"RegionOne" is assumed'))
+                      '"RegionOne" is assumed')),
+    cfg.FloatOpt('command_batch_window',
+                 default=0,
+                 help=_('Time in seconds during which the commands sent to '
+                        'EOS by concurrent requests are accumulated, to be '
+                        'sent together in a single eAPI call. Commands are '
+                        'always run in the order of the requests. This is '
+                        'optional. If not set, a value of 0 is assumed and '
+                        'each request sends its own commands')),
+    cfg.IntOpt('command_batch_size',
+               default=100,
+               help=_('Maximum number of requests whose commands are sent '
+                      'to EOS in a single eAPI call. This is optional. If '
+                      'not set, a value of 100 is assumed'))
 ]
 
 cfg.CONF.register_opts(ARISTA_DRIVER_OPTS, "ml2_arista")
@@ -13,7 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
 import threading
+import time
 
 import jsonrpclib
 from oslo.config import cfg
@@ -32,6 +34,72 @@ LOG = logging.getLogger(__name__)
 EOS_UNREACHABLE_MSG = _('Unable to reach EOS')
 
 
+class _QueuedCommands(object):
+    """Openstack CLI commands waiting to be sent to EOS."""
+
+    def __init__(self, commands, commands_to_log, leader):
+        self.commands = commands
+        self.commands_to_log = commands_to_log or commands
+        # The first caller of a batch sends it to EOS
+        self.leader = leader
+        self.done = threading.Event()
+        self.error = None
+
+
+class EOSCommandBatcher(object):
+    """Sends the openstack CLI commands of concurrent callers together.
+
+    Commands queued within window seconds of each other are sent in a
+    single eAPI call, at most max_size callers' commands at a time.
+    Commands are sent in the order they were queued, batches one after
+    the other, so the commands for a tenant are always run in order.
+    """
+
+    def __init__(self, send, window, max_size):
+        # send(commands, commands_to_log) runs a list of command lists
+        self._send = send
+        self._window = window
+        self._max_size = max_size
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def add(self, commands, commands_to_log=None):
+        """Queue commands, to be waited for with wait()."""
+        with self._queue_lock:
+            queued = _QueuedCommands(commands, commands_to_log,
+                                     not self._queue)
+            self._queue.append(queued)
+        return queued
+
+    def wait(self, queued):
+        """Wait for queued commands to be run, raising their error."""
+        if queued.leader:
+            # Give other callers the time to queue their commands
+            time.sleep(self._window)
+            self._flush()
+        queued.done.wait()
+        if queued.error:
+            raise queued.error
+
+    def _flush(self):
+        while True:
+            with self._send_lock:
+                with self._queue_lock:
+                    batch = self._queue[:self._max_size]
+                    del self._queue[:self._max_size]
+                if not batch:
+                    return
+                try:
+                    self._send([queued.commands for queued in batch],
+                               [queued.commands_to_log for queued in batch])
+                except arista_exc.AristaRpcError as error:
+                    for queued in batch:
+                        queued.error = error
+                for queued in batch:
+                    queued.done.set()
+
+
 class AristaRPCWrapper(object):
     """Wraps Arista JSON RPC.
 
@@ -48,6 +116,13 @@ class AristaRPCWrapper(object):
         # and the actual CLI command.
         self.cli_commands = {}
         self.initialize_cli_commands()
+        self._batcher = None
+        if cfg.CONF.ml2_arista.command_batch_window:
+            self._batcher = EOSCommandBatcher(
+                self._run_openstack_cmds_batch,
+                cfg.CONF.ml2_arista.command_batch_window,
+                cfg.CONF.ml2_arista.command_batch_size)
+        self._local = threading.local()
 
     def _get_exit_mode_cmds(self, modes):
         """Returns a list of 'exit' commands for the modes.
@@ -462,6 +537,57 @@ class AristaRPCWrapper(object):
         full_command.extend(self.cli_commands['timestamp'])
         return full_command
 
+    @contextlib.contextmanager
+    def deferred_commands(self):
+        """Queue the openstack CLI commands issued in the block.
+
+        The commands are batched with the ones of concurrent callers and
+        waited for when leaving the block, which raises AristaRpcError if
+        they failed. This allows callers to release their locks before
+        waiting. Commands are run right away when batching is disabled.
+        """
+        if (not self._batcher or
+                getattr(self._local, 'deferred', None) is not None):
+            yield
+            return
+        deferred = self._local.deferred = []
+        try:
+            yield
+        finally:
+            self._local.deferred = None
+            error = None
+            # Queued commands are waited for even if the block failed,
+            # the first of a batch is responsible for sending it
+            for queued in deferred:
+                try:
+                    self._batcher.wait(queued)
+                except arista_exc.AristaRpcError as e:
+                    error = error or e
+        if error:
+            raise error
+
+    def _run_openstack_cmds_batch(self, batch, batch_to_log):
+        """Send several lists of openstack CLI commands in one eAPI call.
+
+        Each list is run from the region mode and ended with 'end', as
+        the lists do not all return to the mode they started from.
+        """
+        def build(command_lists):
+            full_command = []
+            for cmds in command_lists:
+                full_command.extend(['enable',
+                                     'configure',
+                                     'management openstack',
+                                     'region %s' % self.region])
+                full_command.extend(cmds)
+                full_command.append('end')
+            full_command.extend(self.cli_commands['timestamp'])
+            return full_command
+
+        ret = self._run_eos_cmds(build(batch), build(batch_to_log))
+        if self.cli_commands['timestamp']:
+            self._region_updated_time = ret[-1]
+
     def _run_openstack_cmds(self, commands, commands_to_log=None):
         """Execute/sends a CAPI (Command API) command to EOS.
 
@@ -474,6 +600,15 @@ class AristaRPCWrapper(object):
                                   param is logged.
         """
 
+        if self._batcher:
+            queued = self._batcher.add(commands, commands_to_log)
+            deferred = getattr(self._local, 'deferred', None)
+            if deferred is not None:
+                deferred.append(queued)
+            else:
+                self._batcher.wait(queued)
+            return
+
         full_command = self._build_command(commands)
         if commands_to_log:
             full_log_command = self._build_command(commands_to_log)
@@ -703,21 +838,22 @@ class AristaDriver(driver_api.MechanismDriver):
         tenant_id = network['tenant_id']
         segments = context.network_segments
         vlan_id = segments[0]['segmentation_id']
-        with self.eos_sync_lock:
-            if db.is_network_provisioned(tenant_id, network_id):
-                try:
-                    network_dict = {
-                        'network_id': network_id,
-                        'segmentation_id': vlan_id,
-                        'network_name': network_name}
-                    self.rpc.create_network(tenant_id, network_dict)
-                except arista_exc.AristaRpcError:
-                    LOG.info(EOS_UNREACHABLE_MSG)
-                    raise ml2_exc.MechanismDriverError()
-            else:
-                msg = _('Network %s is not created as it is not found in'
-                        'Arista DB') % network_id
-                LOG.info(msg)
+        try:
+            with self.rpc.deferred_commands():
+                with self.eos_sync_lock:
+                    if db.is_network_provisioned(tenant_id, network_id):
+                        network_dict = {
+                            'network_id': network_id,
+                            'segmentation_id': vlan_id,
+                            'network_name': network_name}
+                        self.rpc.create_network(tenant_id, network_dict)
+                    else:
+                        msg = _('Network %s is not created as it is not '
+                                'found in Arista DB') % network_id
+                        LOG.info(msg)
+        except arista_exc.AristaRpcError:
+            LOG.info(EOS_UNREACHABLE_MSG)
+            raise ml2_exc.MechanismDriverError()
 
     def update_network_precommit(self, context):
         """At the moment we only support network name change
@@ -745,21 +881,22 @@ class AristaDriver(driver_api.MechanismDriver):
             network_name = new_network['name']
             tenant_id = new_network['tenant_id']
             vlan_id = new_network['provider:segmentation_id']
-            with self.eos_sync_lock:
-                if db.is_network_provisioned(tenant_id, network_id):
-                    try:
-                        network_dict = {
-                            'network_id': network_id,
-                            'segmentation_id': vlan_id,
-                            'network_name': network_name}
-                        self.rpc.create_network(tenant_id, network_dict)
-                    except arista_exc.AristaRpcError:
-                        LOG.info(EOS_UNREACHABLE_MSG)
-                        raise ml2_exc.MechanismDriverError()
-                else:
-                    msg = _('Network %s is not updated as it is not found in'
-                            'Arista DB') % network_id
-                    LOG.info(msg)
+            try:
+                with self.rpc.deferred_commands():
+                    with self.eos_sync_lock:
+                        if db.is_network_provisioned(tenant_id, network_id):
+                            network_dict = {
+                                'network_id': network_id,
+                                'segmentation_id': vlan_id,
+                                'network_name': network_name}
+                            self.rpc.create_network(tenant_id, network_dict)
+                        else:
+                            msg = _('Network %s is not updated as it is not '
+                                    'found in Arista DB') % network_id
+                            LOG.info(msg)
+            except arista_exc.AristaRpcError:
+                LOG.info(EOS_UNREACHABLE_MSG)
+                raise ml2_exc.MechanismDriverError()
 
     def delete_network_precommit(self, context):
         """Delete the network infromation from the DB."""
@@ -777,16 +914,17 @@ class AristaDriver(driver_api.MechanismDriver):
         network = context.current
         network_id = network['id']
         tenant_id = network['tenant_id']
-        with self.eos_sync_lock:
 
-            # Succeed deleting network in case EOS is not accessible.
-            # EOS state will be updated by sync thread once EOS gets
-            # alive.
-            try:
-                self.rpc.delete_network(tenant_id, network_id)
-            except arista_exc.AristaRpcError:
-                LOG.info(EOS_UNREACHABLE_MSG)
-                raise ml2_exc.MechanismDriverError()
+        # Succeed deleting network in case EOS is not accessible.
+        # EOS state will be updated by sync thread once EOS gets
+        # alive.
+        try:
+            with self.rpc.deferred_commands():
+                with self.eos_sync_lock:
+                    self.rpc.delete_network(tenant_id, network_id)
+        except arista_exc.AristaRpcError:
+            LOG.info(EOS_UNREACHABLE_MSG)
+            raise ml2_exc.MechanismDriverError()
 
     def create_port_precommit(self, context):
         """Remember the infromation about a VM and its ports
@@ -827,31 +965,32 @@ class AristaDriver(driver_api.MechanismDriver):
             port_name = port['name']
             network_id = port['network_id']
             tenant_id = port['tenant_id']
-            with self.eos_sync_lock:
-                hostname = self._host_name(host)
-                vm_provisioned = db.is_vm_provisioned(device_id,
-                                                      host,
-                                                      port_id,
-                                                      network_id,
-                                                      tenant_id)
-                net_provisioned = db.is_network_provisioned(tenant_id,
-                                                            network_id)
-                if vm_provisioned and net_provisioned:
-                    try:
-                        self.rpc.plug_port_into_network(device_id,
-                                                        hostname,
-                                                        port_id,
-                                                        network_id,
-                                                        tenant_id,
-                                                        port_name,
-                                                        device_owner)
-                    except arista_exc.AristaRpcError:
-                        LOG.info(EOS_UNREACHABLE_MSG)
-                        raise ml2_exc.MechanismDriverError()
-                else:
-                    msg = _('VM %s is not created as it is not found in '
-                            'Arista DB') % device_id
-                    LOG.info(msg)
+            try:
+                with self.rpc.deferred_commands():
+                    with self.eos_sync_lock:
+                        hostname = self._host_name(host)
+                        vm_provisioned = db.is_vm_provisioned(device_id,
+                                                              host,
+                                                              port_id,
+                                                              network_id,
+                                                              tenant_id)
+                        net_provisioned = db.is_network_provisioned(
+                            tenant_id, network_id)
+                        if vm_provisioned and net_provisioned:
+                            self.rpc.plug_port_into_network(device_id,
+                                                            hostname,
+                                                            port_id,
+                                                            network_id,
+                                                            tenant_id,
+                                                            port_name,
+                                                            device_owner)
+                        else:
+                            msg = _('VM %s is not created as it is not '
+                                    'found in Arista DB') % device_id
+                            LOG.info(msg)
+            except arista_exc.AristaRpcError:
+                LOG.info(EOS_UNREACHABLE_MSG)
+                raise ml2_exc.MechanismDriverError()
 
     def update_port_precommit(self, context):
         """Update the name of a given port.
@@ -889,34 +1028,34 @@ class AristaDriver(driver_api.MechanismDriver):
             port_name = port['name']
             network_id = port['network_id']
             tenant_id = port['tenant_id']
-            with self.eos_sync_lock:
-                hostname = self._host_name(host)
-                segmentation_id = db.get_segmentation_id(tenant_id,
-                                                         network_id)
-                vm_provisioned = db.is_vm_provisioned(device_id,
-                                                      host,
-                                                      port_id,
-                                                      network_id,
-                                                      tenant_id)
-                net_provisioned = db.is_network_provisioned(tenant_id,
+            try:
+                with self.rpc.deferred_commands():
+                    with self.eos_sync_lock:
+                        hostname = self._host_name(host)
+                        segmentation_id = db.get_segmentation_id(tenant_id,
+                                                                 network_id)
+                        vm_provisioned = db.is_vm_provisioned(device_id,
+                                                              host,
+                                                              port_id,
+                                                              network_id,
+                                                              tenant_id)
+                        net_provisioned = db.is_network_provisioned(
+                            tenant_id, network_id, segmentation_id)
+                        if vm_provisioned and net_provisioned:
+                            self.rpc.plug_port_into_network(device_id,
+                                                            hostname,
+                                                            port_id,
                                                             network_id,
-                                                            segmentation_id)
-                if vm_provisioned and net_provisioned:
-                    try:
-                        self.rpc.plug_port_into_network(device_id,
-                                                        hostname,
-                                                        port_id,
-                                                        network_id,
-                                                        tenant_id,
-                                                        port_name,
-                                                        device_owner)
-                    except arista_exc.AristaRpcError:
-                        LOG.info(EOS_UNREACHABLE_MSG)
-                        raise ml2_exc.MechanismDriverError()
-                else:
-                    msg = _('VM %s is not updated as it is not found in '
-                            'Arista DB') % device_id
-                    LOG.info(msg)
+                                                            tenant_id,
+                                                            port_name,
+                                                            device_owner)
+                        else:
+                            msg = _('VM %s is not updated as it is not '
+                                    'found in Arista DB') % device_id
+                            LOG.info(msg)
+            except arista_exc.AristaRpcError:
+                LOG.info(EOS_UNREACHABLE_MSG)
+                raise ml2_exc.MechanismDriverError()
 
     def delete_port_precommit(self, context):
         """Delete information about a VM and host from the DB."""
@@ -950,20 +1089,21 @@ class AristaDriver(driver_api.MechanismDriver):
         device_owner = port['device_owner']
 
         try:
-            with self.eos_sync_lock:
-                hostname = self._host_name(host)
-                if device_owner == n_const.DEVICE_OWNER_DHCP:
-                    self.rpc.unplug_dhcp_port_from_network(device_id,
-                                                           hostname,
-                                                           port_id,
-                                                           network_id,
-                                                           tenant_id)
-                else:
-                    self.rpc.unplug_host_from_network(device_id,
-                                                      hostname,
-                                                      port_id,
-                                                      network_id,
-                                                      tenant_id)
+            with self.rpc.deferred_commands():
+                with self.eos_sync_lock:
+                    hostname = self._host_name(host)
+                    if device_owner == n_const.DEVICE_OWNER_DHCP:
+                        self.rpc.unplug_dhcp_port_from_network(device_id,
+                                                               hostname,
+                                                               port_id,
+                                                               network_id,
+                                                               tenant_id)
+                    else:
+                        self.rpc.unplug_host_from_network(device_id,
+                                                          hostname,
+                                                          port_id,
+                                                          network_id,
+                                                          tenant_id)
         except arista_exc.AristaRpcError:
             LOG.info(EOS_UNREACHABLE_MSG)
             raise ml2_exc.MechanismDriverError()
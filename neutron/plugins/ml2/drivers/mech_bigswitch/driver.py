@@ -55,7 +55,7 @@ class BigSwitchMechanismDriver(NeutronRestProxyV2Base,
 
         # init network ctrl connections
         self.servers = servermanager.ServerPool(server_timeout)
-        self.servers.get_topo_function = self._get_all_data
+        self.servers.get_topo_function = self._get_topology
         self.servers.get_topo_function_args = {'get_ports': True,
                                                'get_floating_ips': False,
                                                'get_routers': False}
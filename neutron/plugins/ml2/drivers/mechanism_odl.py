@@ -15,6 +15,8 @@
 # @author: Kyle Mestery, Cisco Systems, Inc.
 # @author: Dave Tucker, Hewlett-Packard Development Company L.P.
 
+import copy
+import hashlib
 import time
 
 from oslo.config import cfg
@@ -53,11 +55,19 @@ odl_opts = [
                help=_("HTTP timeout in seconds.")),
     cfg.IntOpt('session_timeout', default=30,
                help=_("Tomcat session timeout in minutes.")),
+    cfg.IntOpt('sync_page_size', default=100,
+               help=_("Maximum number of resources created in a single "
+                      "request during a full sync.")),
 ]
 
 cfg.CONF.register_opts(odl_opts, "ml2_odl")
 
 
+def resource_hash(resource):
+    """Return a digest of the content of a Neutron resource."""
+    return hashlib.md5(jsonutils.dumps(resource, sort_keys=True)).hexdigest()
+
+
 def try_del(d, keys):
     """Ignore key errors when deleting from a dictionary."""
     for key in keys:
@@ -129,6 +139,12 @@ class OpenDaylightMechanismDriver(api.MechanismDriver):
         self.username = cfg.CONF.ml2_odl.username
         self.password = cfg.CONF.ml2_odl.password
         self.auth = JsessionId(self.url, self.username, self.password)
+        # Keeps the connections to ODL open across requests
+        self.session = requests.Session()
+        # Digests of the resources as last sent to ODL, by collection and
+        # id, so a full sync only sends what changed since.
+        self.synced_hashes = {ODL_NETWORKS: {}, ODL_SUBNETS: {},
+                              ODL_PORTS: {}}
         self.vif_type = portbindings.VIF_TYPE_OVS
         self.vif_details = {portbindings.CAP_PORT_FILTER: True}
 
@@ -185,27 +201,52 @@ class OpenDaylightMechanismDriver(api.MechanismDriver):
         try_del(port, ['status'])
 
     def sync_resources(self, resource_name, collection_name, resources,
-                       context, dbcontext, attr_filter):
+                       context, dbcontext, attr_filter, attr_filter_update):
         """Sync objects from Neutron over to OpenDaylight.
 
         This will handle syncing networks, subnets, and ports from Neutron to
-        OpenDaylight. It also filters out the requisite items which are not
-        valid for create API operations.
+        OpenDaylight. A single request lists the objects known to
+        OpenDaylight. Those missing are created in pages of sync_page_size,
+        after filtering out the items which are not valid for create API
+        operations, and those which changed since they were last synced are
+        updated. Objects unchanged since then are not sent again.
         """
+        hashes = self.synced_hashes[collection_name]
+        response = self.sendjson('get', collection_name, None)
+        remote_ids = set()
+        if response is not None:
+            remote_ids = set(obj['id'] for obj in
+                             response.json().get(collection_name, []))
+
         to_be_synced = []
         for resource in resources:
-            try:
-                urlpath = collection_name + '/' + resource['id']
-                self.sendjson('get', urlpath, None)
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 404:
-                    attr_filter(resource, context, dbcontext)
-                    to_be_synced.append(resource)
-
-        key = resource_name if len(to_be_synced) == 1 else collection_name
-
-        # 400 errors are returned if an object exists, which we ignore.
-        self.sendjson('post', collection_name, {key: to_be_synced}, [400])
+            digest = resource_hash(resource)
+            if resource['id'] not in remote_ids:
+                to_be_synced.append((resource, digest))
+            elif hashes.get(resource['id'], digest) != digest:
+                update = copy.deepcopy(resource)
+                attr_filter_update(update, context, dbcontext)
+                # 400 errors are returned if an object exists, which we
+                # ignore.
+                self.sendjson('put', collection_name + '/' + resource['id'],
+                              {resource_name: update}, [400])
+                hashes[resource['id']] = digest
+            else:
+                # Assumed in sync when created before this server started
+                hashes[resource['id']] = digest
+
+        page_size = cfg.CONF.ml2_odl.sync_page_size
+        for i in range(0, len(to_be_synced), page_size):
+            page = to_be_synced[i:i + page_size]
+            for resource, digest in page:
+                attr_filter(resource, context, dbcontext)
+            key = resource_name if len(page) == 1 else collection_name
+            # 400 errors are returned if an object exists, which we ignore.
+            self.sendjson('post', collection_name,
+                          {key: [resource for resource, digest in page]},
+                          [400])
+            for resource, digest in page:
+                hashes[resource['id']] = digest
 
     @utils.synchronized('odl-sync-full')
     def sync_full(self, context):
@@ -223,13 +264,16 @@ class OpenDaylightMechanismDriver(api.MechanismDriver):
 
         self.sync_resources(ODL_NETWORK, ODL_NETWORKS, networks,
                             context, dbcontext,
-                            self.filter_create_network_attributes)
+                            self.filter_create_network_attributes,
+                            self.filter_update_network_attributes)
         self.sync_resources(ODL_SUBNET, ODL_SUBNETS, subnets,
                             context, dbcontext,
-                            self.filter_create_subnet_attributes)
+                            self.filter_create_subnet_attributes,
+                            self.filter_update_subnet_attributes)
         self.sync_resources(ODL_PORT, ODL_PORTS, ports,
                             context, dbcontext,
-                            self.filter_create_port_attributes)
+                            self.filter_create_port_attributes,
+                            self.filter_update_port_attributes)
         self.out_of_sync = False
 
     def filter_update_network_attributes(self, network, context, dbcontext):
@@ -279,6 +323,7 @@ class OpenDaylightMechanismDriver(api.MechanismDriver):
                       {'object_type': object_type.capitalize(),
                       'obj_id': obj_id})
         else:
+            digest = resource_hash(resource)
             if operation == 'create':
                 attr_filter_create(self, resource, context, dbcontext)
             elif operation == 'update':
@@ -290,10 +335,13 @@ class OpenDaylightMechanismDriver(api.MechanismDriver):
             except Exception:
                 with excutils.save_and_reraise_exception():
                     self.out_of_sync = True
+            self.synced_hashes[object_type][obj_id] = digest
 
     def sync_object(self, operation, object_type, context):
         """Synchronize the single modified record to ODL."""
         obj_id = context.current['id']
+        if operation == 'delete':
+            self.synced_hashes[object_type].pop(obj_id, None)
 
         self.sync_single_resource(operation, object_type, obj_id, context,
                                   self.create_object_map[object_type],
@@ -306,7 +354,10 @@ class OpenDaylightMechanismDriver(api.MechanismDriver):
         port['security_groups'] = groups
 
     def sendjson(self, method, urlpath, obj, ignorecodes=[]):
-        """Send json to the OpenDaylight controller."""
+        """Send json to the OpenDaylight controller.
+
+        Return the response, or None when no URL is configured.
+        """
 
         headers = {'Content-Type': 'application/json'}
         data = jsonutils.dumps(obj, indent=2) if obj else None
@@ -314,14 +365,14 @@ class OpenDaylightMechanismDriver(api.MechanismDriver):
             url = '/'.join([self.url, urlpath])
             LOG.debug(_('ODL-----> sending URL (%s) <-----ODL') % url)
             LOG.debug(_('ODL-----> sending JSON (%s) <-----ODL') % obj)
-            r = requests.request(method, url=url,
-                                 headers=headers, data=data,
-                                 auth=self.auth, timeout=self.timeout)
+            r = self.session.request(method, url=url,
+                                     headers=headers, data=data,
+                                     auth=self.auth, timeout=self.timeout)
 
             # ignorecodes contains a list of HTTP error codes to ignore.
-            if r.status_code in ignorecodes:
-                return
-            r.raise_for_status()
+            if r.status_code not in ignorecodes:
+                r.raise_for_status()
+            return r
 
     def bind_port(self, context):
         LOG.debug(_("Attempting to bind port %(port)s on "
@@ -0,0 +1,314 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import os
+
+import eventlet
+from eventlet import queue
+from oslo.config import cfg
+import sqlalchemy as sa
+
+from neutron import context as n_context
+from neutron.db import api as db_api
+from neutron.extensions import portbindings
+from neutron import manager
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log
+from neutron.openstack.common import timeutils
+from neutron.plugins.ml2.common import exceptions as ml2_exc
+from neutron.plugins.ml2 import driver_api as api
+from neutron.plugins.ml2 import models
+
+LOG = log.getLogger(__name__)
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+FAILED = 'failed'
+
+
+def _context_data(context):
+    data = {'current': context.current, 'original': context.original}
+    if isinstance(context, api.NetworkContext):
+        data['segments'] = context.network_segments
+    elif isinstance(context, api.PortContext):
+        data['network'] = _context_data(context.network)
+        data['bound_segment'] = context.bound_segment
+        data['original_bound_segment'] = context.original_bound_segment
+        data['bound_driver'] = context.bound_driver
+        data['original_bound_driver'] = context.original_bound_driver
+    return data
+
+
+class JournalContext(object):
+    """Driver context rebuilt from a journal entry."""
+
+    def __init__(self, plugin, plugin_context, data):
+        self._plugin = plugin
+        self._plugin_context = plugin_context
+        self._data = data
+
+    @property
+    def current(self):
+        return self._data['current']
+
+    @property
+    def original(self):
+        return self._data['original']
+
+
+class JournalNetworkContext(JournalContext, api.NetworkContext):
+
+    @property
+    def network_segments(self):
+        return self._data['segments']
+
+
+class JournalSubnetContext(JournalContext, api.SubnetContext):
+    pass
+
+
+class JournalPortContext(JournalContext, api.PortContext):
+
+    @property
+    def network(self):
+        return JournalNetworkContext(self._plugin, self._plugin_context,
+                                     self._data['network'])
+
+    @property
+    def bound_segment(self):
+        return self._data['bound_segment']
+
+    @property
+    def original_bound_segment(self):
+        return self._data['original_bound_segment']
+
+    @property
+    def bound_driver(self):
+        return self._data['bound_driver']
+
+    @property
+    def original_bound_driver(self):
+        return self._data['original_bound_driver']
+
+    def host_agents(self, agent_type):
+        return self._plugin.get_agents(
+            self._plugin_context,
+            filters={'agent_type': [agent_type],
+                     'host': [self.current.get(portbindings.HOST_ID)]})
+
+    def set_binding(self, segment_id, vif_type, vif_details):
+        # Only postcommit calls are journaled, and the port was bound
+        # before they were recorded.
+        LOG.error(_("Port %s cannot be bound from a journaled postcommit "
+                    "call"), self.current['id'])
+        raise ml2_exc.MechanismDriverError(method='set_binding')
+
+
+_CONTEXTS = {'network': JournalNetworkContext,
+             'subnet': JournalSubnetContext,
+             'port': JournalPortContext}
+
+
+def get_stats(session):
+    """Return the depth and lag of the journal.
+
+    depth is the number of entries waiting to be dispatched or being
+    dispatched, lag the age in seconds of the oldest of them, and failed
+    the number of entries given up on.
+    """
+    entry = models.JournalEntry
+    depth, oldest = (session.query(sa.func.count(entry.id),
+                                   sa.func.min(entry.created_at)).
+                     filter(entry.state.in_([PENDING, PROCESSING])).one())
+    failed = session.query(entry).filter_by(state=FAILED).count()
+    lag = 0
+    if oldest:
+        lag = timeutils.delta_seconds(oldest, timeutils.utcnow())
+    return {'depth': depth, 'lag': lag, 'failed': failed}
+
+
+class Journal(object):
+    """Records and dispatches the postcommit calls of journaled drivers.
+
+    Each server runs journal_workers green threads claiming entries in
+    batches. Only the oldest unfinished entry of a driver and resource
+    can be claimed, so the calls for a resource are made in the order
+    they were recorded even with several servers sharing the journal.
+    """
+
+    def __init__(self, drivers):
+        # Journaled mechanism drivers, keyed by name
+        self.drivers = drivers
+        self._kick = queue.LightQueue()
+        self._workers = []
+        self._pid = None
+
+    def record(self, context, method):
+        """Record a postcommit call, within the current transaction."""
+        resource = method.split('_')[1]
+        session = context._plugin_context.session
+        now = timeutils.utcnow()
+        data = jsonutils.dumps({'resource': resource,
+                                'context': _context_data(context)})
+        with session.begin(subtransactions=True):
+            for name in self.drivers:
+                session.add(models.JournalEntry(
+                    driver=name, method=method,
+                    resource_id=context.current['id'], data=data,
+                    state=PENDING, retries=0, created_at=now,
+                    updated_at=now, next_attempt=now))
+
+    def start(self):
+        # Worker threads do not survive forking API workers, so each
+        # process starts its own.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._workers = [eventlet.spawn(self._run)
+                         for i in range(cfg.CONF.ml2.journal_workers)]
+
+    def wake(self):
+        """Have a worker look at the journal without waiting for a poll."""
+        self.start()
+        if self._kick.qsize() < len(self._workers):
+            self._kick.put(None)
+
+    def _run(self):
+        while True:
+            processed = 0
+            try:
+                processed = self.process()
+                if not processed:
+                    self._report()
+            except Exception:
+                LOG.exception(_("Failed to process the ml2 journal"))
+            if not processed:
+                try:
+                    self._kick.get(timeout=cfg.CONF.ml2.journal_poll_interval)
+                except queue.Empty:
+                    pass
+
+    def _report(self):
+        stats = get_stats(db_api.get_session())
+        if stats['lag'] > cfg.CONF.ml2.journal_lag_warning:
+            LOG.warning(_("ml2 journal is lagging: %(depth)s entries "
+                          "pending, oldest %(lag)d seconds, "
+                          "%(failed)s failed"), stats)
+        else:
+            LOG.debug(_("ml2 journal: %(depth)s entries pending, oldest "
+                        "%(lag)d seconds, %(failed)s failed"), stats)
+
+    def process(self):
+        """Dispatch a batch of entries, returning how many were claimed."""
+        session = db_api.get_session()
+        self._reclaim(session)
+        entries = self._claim(session)
+        if not entries:
+            return 0
+        plugin = manager.NeutronManager.get_plugin()
+        plugin_context = n_context.get_admin_context()
+        completed = []
+        for entry in entries:
+            if self._dispatch(plugin, plugin_context, entry):
+                completed.append(entry.id)
+            else:
+                self._retry(session, entry)
+        if completed:
+            (session.query(models.JournalEntry).
+             filter(models.JournalEntry.id.in_(completed)).
+             delete(synchronize_session=False))
+        return len(entries)
+
+    def _reclaim(self, session):
+        timeout = datetime.timedelta(
+            seconds=cfg.CONF.ml2.journal_processing_timeout)
+        (session.query(models.JournalEntry).
+         filter_by(state=PROCESSING).
+         filter(models.JournalEntry.updated_at < timeutils.utcnow() - timeout).
+         update({'state': PENDING}, synchronize_session=False))
+
+    def _claim(self, session):
+        now = timeutils.utcnow()
+        candidates = (session.query(models.JournalEntry).
+                      filter_by(state=PENDING).
+                      filter(models.JournalEntry.next_attempt <= now).
+                      order_by(models.JournalEntry.id).
+                      limit(cfg.CONF.ml2.journal_batch_size).all())
+        if not candidates:
+            return []
+        # Only the oldest unfinished entry of each resource may be
+        # dispatched.
+        resource_ids = set(entry.resource_id for entry in candidates)
+        heads = (session.query(models.JournalEntry.driver,
+                               models.JournalEntry.resource_id,
+                               sa.func.min(models.JournalEntry.id)).
+                 filter(models.JournalEntry.state.in_([PENDING,
+                                                       PROCESSING])).
+                 filter(models.JournalEntry.resource_id.in_(resource_ids)).
+                 group_by(models.JournalEntry.driver,
+                          models.JournalEntry.resource_id))
+        head_ids = set(head[2] for head in heads)
+        claimed = []
+        for entry in candidates:
+            if entry.id not in head_ids:
+                continue
+            # Another worker may have claimed it in the meantime
+            count = (session.query(models.JournalEntry).
+                     filter_by(id=entry.id, state=PENDING).
+                     update({'state': PROCESSING, 'updated_at': now},
+                            synchronize_session=False))
+            if count:
+                claimed.append(entry)
+        return claimed
+
+    def _dispatch(self, plugin, plugin_context, entry):
+        driver = self.drivers.get(entry.driver)
+        if not driver:
+            LOG.error(_("Journal entry %(id)s is for unknown mechanism "
+                        "driver %(driver)s"),
+                      {'id': entry.id, 'driver': entry.driver})
+            return False
+        try:
+            data = jsonutils.loads(entry.data)
+            context = _CONTEXTS[data['resource']](plugin, plugin_context,
+                                                  data['context'])
+            getattr(driver.obj, entry.method)(context)
+        except Exception:
+            LOG.exception(_("Mechanism driver '%(name)s' failed in "
+                            "%(method)s for %(resource_id)s"),
+                          {'name': entry.driver, 'method': entry.method,
+                           'resource_id': entry.resource_id})
+            return False
+        return True
+
+    def _retry(self, session, entry):
+        retries = entry.retries + 1
+        now = timeutils.utcnow()
+        values = {'retries': retries, 'updated_at': now}
+        if retries > cfg.CONF.ml2.journal_max_retries:
+            LOG.error(_("Giving up on %(method)s of %(resource_id)s for "
+                        "mechanism driver '%(name)s' after %(retries)s "
+                        "retries"),
+                      {'method': entry.method,
+                       'resource_id': entry.resource_id,
+                       'name': entry.driver, 'retries': retries - 1})
+            values['state'] = FAILED
+        else:
+            delay = cfg.CONF.ml2.journal_retry_interval * 2 ** (retries - 1)
+            values['state'] = PENDING
+            values['next_attempt'] = now + datetime.timedelta(seconds=delay)
+        (session.query(models.JournalEntry).filter_by(id=entry.id).
+         update(values, synchronize_session=False))
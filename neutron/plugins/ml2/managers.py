@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
+import eventlet
 from oslo.config import cfg
 import stevedore
 
@@ -21,6 +24,7 @@ from neutron.extensions import portbindings
 from neutron.openstack.common import log
 from neutron.plugins.ml2.common import exceptions as ml2_exc
 from neutron.plugins.ml2 import driver_api as api
+from neutron.plugins.ml2 import journal
 
 
 LOG = log.getLogger(__name__)
@@ -110,6 +114,13 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         # Ordered list of mechanism drivers, defining
         # the order in which the drivers are called.
         self.ordered_mech_drivers = []
+        # Dispatches the postcommit calls of the drivers asking for it
+        self.journal = None
+        # Names of the drivers whose postcommit calls run concurrently
+        self.parallel_drivers = set()
+        self._pool = None
+        # Postcommit call statistics, keyed by driver name
+        self.driver_stats = {}
 
         LOG.info(_("Configured mechanism driver names: %s"),
                  cfg.CONF.ml2.mechanism_drivers)
@@ -140,6 +151,46 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
             driver.obj.initialize()
             self.native_bulk_support &= getattr(driver.obj,
                                                 'native_bulk_support', True)
+        journaled = dict((driver.name, driver)
+                         for driver in self.ordered_mech_drivers
+                         if getattr(driver.obj, 'journal_postcommit', False))
+        if journaled:
+            LOG.info(_("Journaling postcommit calls of mechanism drivers: "
+                       "%s"), journaled.keys())
+            self.journal = journal.Journal(journaled)
+            self.journal.start()
+        self.parallel_drivers = set(
+            driver.name for driver in self.ordered_mech_drivers
+            if getattr(driver.obj, 'parallel_postcommit', False))
+        if self.parallel_drivers:
+            LOG.info(_("Calling postcommit operations of mechanism drivers "
+                       "in parallel: %s"), list(self.parallel_drivers))
+            self._pool = eventlet.GreenPool(
+                cfg.CONF.ml2.postcommit_pool_size)
+        self.driver_stats = dict(
+            (driver.name, {'calls': 0, 'failures': 0, 'total_time': 0.0,
+                           'max_time': 0.0})
+            for driver in self.ordered_mech_drivers)
+
+    def _call_postcommit(self, driver, method_name, context):
+        """Call a postcommit method of a driver, within its timeout."""
+        timeout = float(cfg.CONF.ml2.postcommit_driver_timeouts.get(
+            driver.name, cfg.CONF.ml2.postcommit_timeout))
+        stats = self.driver_stats[driver.name]
+        start = time.time()
+        try:
+            with eventlet.Timeout(timeout or None,
+                                  ml2_exc.MechanismDriverTimeout(
+                                      method=method_name, timeout=timeout)):
+                getattr(driver.obj, method_name)(context)
+        except Exception:
+            stats['failures'] += 1
+            raise
+        finally:
+            elapsed = time.time() - start
+            stats['calls'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
 
     def _call_on_drivers(self, method_name, context,
                          continue_on_failure=False):
@@ -151,11 +202,31 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         all mechanism drivers once one has raised an exception
         :raises: neutron.plugins.ml2.common.MechanismDriverError
         if any mechanism driver call fails.
+
+        Postcommit methods of the drivers declaring parallel_postcommit
+        are called in green threads, and waited for once the other
+        drivers have been called in order.
         """
+        postcommit = method_name.endswith('_postcommit')
+        journaled = {}
+        if self.journal and postcommit:
+            journaled = self.journal.drivers
+            self.journal.wake()
         error = False
+        threads = []
         for driver in self.ordered_mech_drivers:
+            if driver.name in journaled:
+                # Dispatched by the journal workers
+                continue
             try:
-                getattr(driver.obj, method_name)(context)
+                if not postcommit:
+                    getattr(driver.obj, method_name)(context)
+                elif driver.name in self.parallel_drivers:
+                    threads.append((driver, self._pool.spawn(
+                        self._call_postcommit, driver, method_name,
+                        context)))
+                else:
+                    self._call_postcommit(driver, method_name, context)
             except Exception:
                 LOG.exception(
                     _("Mechanism driver '%(name)s' failed in %(method)s"),
@@ -164,10 +235,24 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
                 error = True
                 if not continue_on_failure:
                     break
+        # Drivers called in parallel have all been started, wait for them
+        # even if a failure stopped the others.
+        for driver, thread in threads:
+            try:
+                thread.wait()
+            except Exception:
+                LOG.exception(
+                    _("Mechanism driver '%(name)s' failed in %(method)s"),
+                    {'name': driver.name, 'method': method_name}
+                )
+                error = True
         if error:
             raise ml2_exc.MechanismDriverError(
                 method=method_name
             )
+        if self.journal and method_name.endswith('_precommit'):
+            self.journal.record(
+                context, method_name.replace('_precommit', '_postcommit'))
 
     def create_network_precommit(self, context):
         """Notify all mechanism drivers during network creation.
@@ -41,6 +41,32 @@ class NetworkSegment(model_base.BASEV2, models_v2.HasId):
     segmentation_id = sa.Column(sa.Integer)
 
 
+class JournalEntry(model_base.BASEV2):
+    """Represent a postcommit operation queued for a mechanism driver.
+
+    Entries are written within the transaction of the operation and
+    removed once the driver completed the call.
+    """
+
+    __tablename__ = 'ml2_journal'
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    driver = sa.Column(sa.String(64), nullable=False)
+    method = sa.Column(sa.String(64), nullable=False)
+    resource_id = sa.Column(sa.String(36), nullable=False)
+    data = sa.Column(sa.Text, nullable=False)
+    state = sa.Column(sa.String(16), nullable=False)
+    retries = sa.Column(sa.Integer, nullable=False, default=0)
+    created_at = sa.Column(sa.DateTime, nullable=False)
+    updated_at = sa.Column(sa.DateTime, nullable=False)
+    next_attempt = sa.Column(sa.DateTime, nullable=False)
+
+    __table_args__ = (
+        sa.Index('ml2_journal_driver_resource', 'driver', 'resource_id'),
+        sa.Index('ml2_journal_state', 'state'),
+    )
+
+
 class PortBinding(model_base.BASEV2):
     """Represent binding-related state of a port.
 
@@ -17,11 +17,15 @@
 #    under the License.
 # @author: Fumihiko Kakuma, VA Linux Systems Japan K.K.
 
+import contextlib
+import functools
 import time
 
 from oslo.config import cfg
 from ryu.app.ofctl import api as ryu_api
 from ryu.base import app_manager
+from ryu.controller import handler
+from ryu.controller import ofp_event
 from ryu.lib import hub
 from ryu.ofproto import ofproto_v1_3 as ryu_ofp13
 
@@ -51,6 +55,15 @@ LOG = logging.getLogger(__name__)
 DEAD_VLAN_TAG = str(n_const.MAX_VLAN_TAG + 1)
 
 
+def batch_flows(f):
+    """Run an agent method with its flow messages batched per bridge."""
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        with self.deferred_flows():
+            return f(self, *args, **kwargs)
+    return wrapper
+
+
 # A class to represent a VIF (i.e., a port that has 'iface-id' and 'vif-mac'
 # attributes set).
 class LocalVLANMapping:
@@ -108,6 +121,11 @@ class OVSBridge(ovs_lib.OVSBridge):
         self.datapath = None
         self.ofparser = None
         self.ryuapp = ryuapp
+        # flow-mods queued by defer_flows() until flush_flows()
+        self.deferred_msgs = None
+        # flow-mods of the last flush by xid, to match error replies
+        self.sent_msgs = {}
+        self.flow_errors = []
 
     def find_datapath_id(self):
         self.datapath_id = self.get_datapath_id()
@@ -123,6 +141,59 @@ class OVSBridge(ovs_lib.OVSBridge):
                 raise SystemExit(1)
             time.sleep(1)
         self.ofparser = self.datapath.ofproto_parser
+        self.ryuapp.register_bridge(self)
+
+    def defer_flows(self):
+        """Queue the messages sent from now on until flush_flows()."""
+        if self.deferred_msgs is None:
+            self.deferred_msgs = []
+
+    def send_msg(self, msg):
+        """Send msg and wait for the switch, or queue it when deferred."""
+        if self.deferred_msgs is not None:
+            self.deferred_msgs.append(msg)
+            return
+        result = ryu_api.send_msg(self.ryuapp, msg)
+        LOG.info(_("ryu send_msg() result: %s"), result)
+
+    def flush_flows(self):
+        """Send the queued messages and wait for them with one barrier.
+
+        Open vSwitch processes the messages of a connection in order, so
+        a single barrier request after the batch replaces the round trip
+        each message would otherwise cost.
+
+        :returns: list of (msg, error) for the messages the switch rejected
+                  before answering the barrier.
+        """
+        msgs, self.deferred_msgs = self.deferred_msgs, None
+        if not msgs:
+            return []
+        self.sent_msgs = {}
+        self.flow_errors = []
+        for msg in msgs:
+            self.datapath.set_xid(msg)
+            self.sent_msgs[msg.xid] = msg
+            self.datapath.send_msg(msg)
+        barrier = self.ofparser.OFPBarrierRequest(self.datapath)
+        ryu_api.send_msg(self.ryuapp, barrier,
+                         reply_cls=self.ofparser.OFPBarrierReply)
+        LOG.debug(_("Sent %(count)d flow messages to bridge %(br)s"),
+                  {'count': len(msgs), 'br': self.br_name})
+        return self.flow_errors
+
+    def flow_error(self, error):
+        """Record an error reply to a message sent by flush_flows()."""
+        if error.datapath is not self.datapath:
+            return
+        msg = self.sent_msgs.get(error.xid)
+        if msg is None:
+            return
+        LOG.error(_("Bridge %(br)s rejected flow message %(msg)s: "
+                    "type=%(type)s code=%(code)s"),
+                  {'br': self.br_name, 'msg': msg,
+                   'type': error.type, 'code': error.code})
+        self.flow_errors.append((msg, error))
 
     def setup_ofp(self, controller_names=None,
                   protocols='OpenFlow13',
@@ -160,6 +231,19 @@ class OFASecurityGroupAgent(sg_rpc.SecurityGroupAgentRpcMixin):
 class OFANeutronAgentRyuApp(app_manager.RyuApp):
     OFP_VERSIONS = [ryu_ofp13.OFP_VERSION]
 
+    def __init__(self, *args, **kwargs):
+        super(OFANeutronAgentRyuApp, self).__init__(*args, **kwargs)
+        self.bridges = []
+
+    def register_bridge(self, br):
+        if br not in self.bridges:
+            self.bridges.append(br)
+
+    @handler.set_ev_cls(ofp_event.EventOFPErrorMsg, handler.MAIN_DISPATCHER)
+    def error_msg_handler(self, ev):
+        for br in self.bridges:
+            br.flow_error(ev.msg)
+
     def start(self):
 
         super(OFANeutronAgentRyuApp, self).start()
@@ -229,6 +313,10 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                the ovsdb monitor.
         """
         self.ryuapp = ryuapp
+        # bridges whose flow messages are batched by deferred_flows()
+        self.deferred_bridges = []
+        # set when a bridge failed to apply a batch of flow messages
+        self.flows_failed = False
         self.veth_mtu = veth_mtu
         self.root_helper = root_helper
         self.available_local_vlans = set(xrange(n_const.MIN_VLAN_TAG,
@@ -298,9 +386,48 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             LOG.exception(_("Failed reporting state!"))
 
     def ryu_send_msg(self, msg):
+        for br in self.deferred_bridges:
+            if br.datapath is msg.datapath:
+                br.send_msg(msg)
+                return
         result = ryu_api.send_msg(self.ryuapp, msg)
         LOG.info(_("ryu send_msg() result: %s"), result)
 
+    def _get_bridges(self):
+        bridges = [self.int_br]
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        bridges.extend(self.phys_brs.values())
+        return bridges
+
+    @contextlib.contextmanager
+    def deferred_flows(self):
+        """Batch the flow messages sent in the block per bridge.
+
+        The messages are sent at the end of the block, followed by a single
+        barrier per bridge.  Nested blocks join the outermost batch.  If a
+        bridge rejects some of them, flows_failed is set so that the agent
+        loop resyncs.
+        """
+        if self.deferred_bridges:
+            yield
+            return
+        self.deferred_bridges = self._get_bridges()
+        for br in self.deferred_bridges:
+            br.defer_flows()
+        try:
+            yield
+        finally:
+            bridges, self.deferred_bridges = self.deferred_bridges, []
+            for br in bridges:
+                try:
+                    if br.flush_flows():
+                        self.flows_failed = True
+                except Exception:
+                    LOG.exception(_("Failed to send flows to bridge %s"),
+                                  br.br_name)
+                    self.flows_failed = True
+
     def setup_rpc(self):
         mac = self.int_br.get_local_port_mac()
         self.agent_id = '%s%s' % ('ovs', (mac.replace(":", "")))
@@ -494,6 +621,7 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             lvid, int(segmentation_id) | ryu_ofp13.OFPVID_PRESENT,
             physical_network)
 
+    @batch_flows
     def provision_local_vlan(self, net_uuid, network_type, physical_network,
                              segmentation_id):
         """Provisions a local VLAN.
@@ -579,6 +707,7 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                                      match=match)
         self.ryu_send_msg(msg)
 
+    @batch_flows
     def reclaim_local_vlan(self, net_uuid):
         """Reclaim a local VLAN.
 
@@ -637,6 +766,7 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
 
         self.available_local_vlans.add(lvm.vlan)
 
+    @batch_flows
     def port_bound(self, port, net_uuid,
                    network_type, physical_network, segmentation_id):
         """Bind port to net_uuid/lsw_id and install flow for inbound traffic
@@ -992,6 +1122,7 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         else:
             LOG.debug(_("No VIF port for port %s defined on agent."), port_id)
 
+    @batch_flows
     def setup_tunnel_port(self, port_name, remote_ip, tunnel_type):
         ofport = self.tun_br.add_tunnel_port(port_name,
                                              remote_ip,
@@ -1063,6 +1194,7 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                     self.tun_br.delete_port(port_name)
                     self.tun_br_ofports[tunnel_type].pop(remote_ip, None)
 
+    @batch_flows
     def treat_devices_added(self, devices):
         resync = False
         self.sg_agent.prepare_devices_filter(devices)
@@ -1121,6 +1253,7 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                                              cfg.CONF.host)
         return resync
 
+    @batch_flows
     def treat_devices_removed(self, devices):
         resync = False
         self.sg_agent.remove_devices_filter(devices)
@@ -1204,6 +1337,7 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         # If one of the above opertaions fails => resync with plugin
         return (resync_add | resync_removed)
 
+    @batch_flows
     def tunnel_sync(self):
         resync = False
         try:
@@ -1241,6 +1375,11 @@ class OFANeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 LOG.debug(_("Agent ovsdb_monitor_loop - "
                           "iteration:%d started"),
                           self.iter_num)
+                if self.flows_failed:
+                    LOG.info(_("Agent flows out of sync!"))
+                    self.flows_failed = False
+                    sync = True
+                    tunnel_sync = True
                 if sync:
                     LOG.info(_("Agent out of sync with plugin!"))
                     ports.clear()
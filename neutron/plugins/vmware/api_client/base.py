@@ -15,7 +15,10 @@
 # under the License.
 
 from abc import ABCMeta
+import bisect
+import copy
 import httplib
+import re
 import six
 import time
 
@@ -27,6 +30,10 @@ LOG = logging.getLogger(__name__)
 GENERATION_ID_TIMEOUT = -1
 DEFAULT_CONCURRENT_CONNECTIONS = 3
 DEFAULT_CONNECT_TIMEOUT = 5
+# Upper bounds, in seconds, of the buckets of the request latency histograms
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UUID_RE = re.compile('[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-'
+                     '[0-9a-f]{12}')
 
 
 @six.add_metaclass(ABCMeta)
@@ -89,6 +96,41 @@ class ApiClientBase(object):
         if data:
             self._set_provider_data(conn, (data[0], cookie))
 
+    def expire_auth_cookie(self, conn, cookie):
+        '''Clear the session cookie of a provider if it is still cookie.
+
+        Requests sent with a cookie which was already replaced by a new
+        login must not clear the new cookie.
+        '''
+        if self.auth_cookie(conn) == cookie:
+            self.set_auth_cookie(conn, None)
+
+    def record_latency(self, method, url, elapsed):
+        '''Account for a request in the latency histogram of its endpoint.
+
+        Endpoints are identified by method and path, with the query string
+        stripped and resource uuids replaced by '*'.
+        '''
+        endpoint = "%s %s" % (method, UUID_RE.sub('*', url.split('?')[0]))
+        stats = self._latency_stats.get(endpoint)
+        if stats is None:
+            stats = self._latency_stats[endpoint] = {
+                'count': 0, 'total': 0.0, 'max': 0.0,
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        stats['buckets'][bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def get_latency_stats(self):
+        '''Return the request latency histograms, keyed by endpoint.
+
+        Each histogram holds the number of requests, their total and
+        maximum latency, and the count of requests in each bucket of
+        LATENCY_BUCKETS, the last bucket counting the slower ones.
+        '''
+        return copy.deepcopy(self._latency_stats)
+
     def acquire_connection(self, auto_login=True, headers=None, rid=-1):
         '''Check out an available HTTPConnection instance.
 
@@ -141,6 +183,9 @@ class ApiClientBase(object):
                       {'rid': rid, 'conn': ctrl_conn_to_str(http_conn)})
             return
         elif hasattr(http_conn, "no_release"):
+            # Extra connection to a redirect target, do not leave its
+            # socket open until it is garbage collected
+            http_conn.close()
             return
 
         if bad_state:
@@ -17,6 +17,8 @@
 
 import httplib
 
+import eventlet
+
 from neutron.openstack.common import log as logging
 from neutron.plugins.vmware.api_client import base
 from neutron.plugins.vmware.api_client import eventlet_client
@@ -58,6 +60,11 @@ class NsxApiClient(eventlet_client.EventletApiClient):
         self._retries = retries
         self._redirects = redirects
         self._version = None
+        # In flight GET requests, keyed by url and write sequence number
+        self._pending_gets = {}
+        # Incremented when a request which is not a GET is issued and
+        # again when it completes
+        self._write_seq = 0
 
     # NOTE(salvatore-orlando): This method is not used anymore. Login is now
     # performed automatically inside the request eventlet if necessary.
@@ -80,16 +87,52 @@ class NsxApiClient(eventlet_client.EventletApiClient):
 
         return self._login()
 
-    def request(self, method, url, body="", content_type="application/json"):
-        '''Issues request to controller.'''
-
+    def _issue_request(self, method, url, body, content_type):
         g = eventlet_request.GenericRequestEventlet(
             self, method, url, body, content_type, auto_login=True,
             request_timeout=self._request_timeout,
             http_timeout=self._http_timeout,
             retries=self._retries, redirects=self._redirects)
         g.start()
-        response = g.join()
+        return g.join()
+
+    def _issue_get_request(self, url, body, content_type):
+        '''Issue a GET request, or wait for an identical one in flight.
+
+        A GET is only shared with one issued after the last request which
+        might have changed the NSX state was both started and completed,
+        so that callers always see the effects of their own writes.
+        '''
+        key = (url, self._write_seq)
+        pending = self._pending_gets.get(key)
+        if pending:
+            LOG.debug(_("Waiting for in flight request GET %s"), url)
+            return pending.wait()
+        pending = self._pending_gets[key] = eventlet.event.Event()
+        try:
+            response = self._issue_request("GET", url, body, content_type)
+        except Exception as e:
+            pending.send_exception(e)
+            raise
+        else:
+            pending.send(response)
+        finally:
+            del self._pending_gets[key]
+        return response
+
+    def request(self, method, url, body="", content_type="application/json"):
+        '''Issues request to controller.'''
+
+        if method == "GET":
+            response = self._issue_get_request(url, body, content_type)
+        else:
+            self._write_seq += 1
+            try:
+                response = self._issue_request(method, url, body,
+                                               content_type)
+            finally:
+                # GETs issued while the write was in flight may not see it
+                self._write_seq += 1
         LOG.debug(_('Request returns "%s"'), response)
 
         # response is a modified HTTPResponse object or None.
@@ -60,6 +60,7 @@ class EventletApiClient(base.ApiClientBase):
         self._config_gen = None
         self._config_gen_ts = None
         self._gen_timeout = gen_timeout
+        self._latency_stats = {}
 
         # Connection pool is a list of queues.
         self._conn_pool = eventlet.queue.PriorityQueue()
@@ -128,7 +129,7 @@ class EventletApiClient(base.ApiClientBase):
             result_conn = conn
         if result_conn:
             result_conn.last_used = time.time()
-            if auto_login and self.auth_cookie(conn) is None:
+            if auto_login and self.auth_cookie(result_conn) is None:
                 self._wait_for_login(result_conn, headers)
         return result_conn
 
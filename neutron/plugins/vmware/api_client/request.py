@@ -128,6 +128,8 @@ class ApiRequest(object):
                 response.body = response.read()
                 response.headers = response.getheaders()
                 elapsed_time = time.time() - issued_time
+                self._api_client.record_latency(self._method, url,
+                                                elapsed_time)
                 LOG.debug(_("[%(rid)d] Completed request '%(conn)s': "
                             "%(status)s (%(elapsed)s seconds)"),
                           {'rid': self._rid(),
@@ -156,9 +158,9 @@ class ApiRequest(object):
                         # If request is unauthorized, clear the session cookie
                         # for the current provider so that subsequent requests
                         # to the same provider triggers re-authentication.
-                        self._api_client.set_auth_cookie(conn, None)
-
-                    self._api_client.set_auth_cookie(conn, None)
+                        # The cookie is kept if another request has already
+                        # logged in again.
+                        self._api_client.expire_auth_cookie(conn, cookie)
                 elif response.status == httplib.SERVICE_UNAVAILABLE:
                     is_conn_service_unavail = True
 
@@ -14,8 +14,12 @@
 #    under the License.
 
 import random
+import sys
 
+import eventlet
+import six
 from sqlalchemy.orm import exc
+from sqlalchemy.sql import expression as expr
 
 from neutron.common import constants
 from neutron.common import exceptions
@@ -38,6 +42,8 @@ from neutron.plugins.vmware.nsxlib import switch as switchlib
 # NOTE(salv-orlando): This might become a version-dependent map should the
 # limit be raised in future versions
 MAX_PAGE_SIZE = 5000
+# Maximum number of ids in the IN clause of a status update
+UPDATE_BATCH_SIZE = 500
 
 LOG = log.getLogger(__name__)
 
@@ -159,24 +165,29 @@ class NsxCache(object):
 class SyncParameters():
     """Defines attributes used by the synchronization procedure.
 
+    min_chunk_size: Lower bound for the chunk size
     chunk_size: Actual chunk size
-    extra_chunk_size: Additional data to fetch because of chunk size
-                      adjustment
     current_chunk: Counter of the current data chunk being synchronized
     Page cursors: markers for the next resource to fetch.
                  'start' means page cursor unset for fetching 1st page
     init_sync_performed: True if the initial synchronization concluded
+    sizes, fetched: number of resources of each type in NSX, and fetched
+                    in the current synchronization run
+    throughput: resources fetched per second, averaged over the chunks
     """
 
     def __init__(self, min_chunk_size):
+        self.min_chunk_size = min_chunk_size
         self.chunk_size = min_chunk_size
-        self.extra_chunk_size = 0
         self.current_chunk = 0
         self.ls_cursor = 'start'
         self.lr_cursor = 'start'
         self.lp_cursor = 'start'
         self.init_sync_performed = False
         self.total_size = 0
+        self.sizes = {'ls': 0, 'lr': 0, 'lp': 0}
+        self.fetched = {'ls': 0, 'lr': 0, 'lp': 0}
+        self.throughput = None
 
 
 def _start_loopingcall(min_chunk_size, state_sync_interval, func):
@@ -237,25 +248,47 @@ class NsxSynchronizer():
     def _get_tag_dict(self, tags):
         return dict((tag.get('scope'), tag['tag']) for tag in tags)
 
-    def synchronize_network(self, context, neutron_network_data,
-                            lswitches=None):
-        """Synchronize a Neutron network with its NSX counterpart.
+    def _update_status(self, context, model, updates):
+        """Apply status changes with one UPDATE per status value.
 
-        This routine synchronizes a set of switches when a Neutron
-        network is mapped to multiple lswitches.
+        updates maps each status to the ids of the resources to set to it.
         """
+        for status, ids in updates.iteritems():
+            for i in range(0, len(ids), UPDATE_BATCH_SIZE):
+                batch = ids[i:i + UPDATE_BATCH_SIZE]
+                with context.session.begin(subtransactions=True):
+                    (context.session.query(model).
+                     filter(model.id.in_(batch)).
+                     update({'status': status}, synchronize_session=False))
+            LOG.debug(_("Updated status for %(count)d neutron %(table)s "
+                        "to: %(status)s"),
+                      {'count': len(ids), 'table': model.__tablename__,
+                       'status': status})
+
+    def _query_by_ids(self, query, column, ids):
+        # All rows are returned at the first sync, otherwise the ids
+        # are looked up in batches to keep the IN clauses short
+        if ids is None:
+            return query.all()
+        ids = list(ids)
+        results = []
+        for i in range(0, len(ids), UPDATE_BATCH_SIZE):
+            results.extend(
+                query.filter(column.in_(ids[i:i + UPDATE_BATCH_SIZE])))
+        return results
+
+    def _get_network_status(self, context, network_id, lswitches=None):
         if not lswitches:
             # Try to get logical switches from nsx
             try:
                 lswitches = nsx_utils.fetch_nsx_switches(
-                    context.session, self._cluster,
-                    neutron_network_data['id'])
+                    context.session, self._cluster, network_id)
             except exceptions.NetworkNotFound:
                 # TODO(salv-orlando): We should be catching
                 # api_exc.ResourceNotFound here
                 # The logical switch was not found
                 LOG.warning(_("Logical switch for neutron network %s not "
-                              "found on NSX."), neutron_network_data['id'])
+                              "found on NSX."), network_id)
                 lswitches = []
             else:
                 for lswitch in lswitches:
@@ -276,6 +309,17 @@ class NsxSynchronizer():
             # there were no switches in the first place!
             if lswitches:
                 status = constants.NET_STATUS_ACTIVE
+        return status
+
+    def synchronize_network(self, context, neutron_network_data,
+                            lswitches=None):
+        """Synchronize a Neutron network with its NSX counterpart.
+
+        This routine synchronizes a set of switches when a Neutron
+        network is mapped to multiple lswitches.
+        """
+        status = self._get_network_status(
+            context, neutron_network_data['id'], lswitches)
         # Update db object
         if status == neutron_network_data['status']:
             # do nothing
@@ -311,29 +355,34 @@ class NsxSynchronizer():
             neutron_nsx_mappings[neutron_id] = (
                 neutron_nsx_mappings.get(neutron_id, []) +
                 [self._nsx_cache[ls_uuid]])
-        # Fetch neutron networks from database
-        filters = {'router:external': [False]}
-        if not scan_missing:
-            filters['id'] = neutron_net_ids
-
-        networks = self._plugin._get_collection(
-            ctx, models_v2.Network, self._plugin._make_network_dict,
-            filters=filters)
-
-        for network in networks:
-            lswitches = neutron_nsx_mappings.get(network['id'], [])
+        # Fetch status of non external neutron networks from database
+        query = ctx.session.query(
+            models_v2.Network.id, models_v2.Network.status).outerjoin(
+                external_net_db.ExternalNetwork,
+                (models_v2.Network.id ==
+                 external_net_db.ExternalNetwork.network_id)).filter(
+                     external_net_db.ExternalNetwork.network_id ==
+                     expr.null())
+        networks = self._query_by_ids(
+            query, models_v2.Network.id,
+            None if scan_missing else neutron_net_ids)
+
+        updates = {}
+        for network_id, network_status in networks:
+            lswitches = neutron_nsx_mappings.get(network_id, [])
             lswitches = [lswitch.get('data') for lswitch in lswitches]
-            self.synchronize_network(ctx, network, lswitches)
+            status = self._get_network_status(ctx, network_id, lswitches)
+            if status != network_status:
+                updates.setdefault(status, []).append(network_id)
+        self._update_status(ctx, models_v2.Network, updates)
 
-    def synchronize_router(self, context, neutron_router_data,
-                           lrouter=None):
-        """Synchronize a neutron router with its NSX counterpart."""
+    def _get_router_status(self, context, router_id, lrouter=None):
         if not lrouter:
             # Try to get router from nsx
             try:
                 # This query will return the logical router status too
                 nsx_router_id = nsx_utils.get_nsx_router_id(
-                    context.session, self._cluster, neutron_router_data['id'])
+                    context.session, self._cluster, router_id)
                 lrouter = routerlib.get_lrouter(
                     self._cluster, nsx_router_id)
             except exceptions.NotFound:
@@ -341,7 +390,7 @@ class NsxSynchronizer():
                 # api_exc.ResourceNotFound here
                 # The logical router was not found
                 LOG.warning(_("Logical router for neutron router %s not "
-                              "found on NSX."), neutron_router_data['id'])
+                              "found on NSX."), router_id)
                 lrouter = None
             else:
                 # Update the cache
@@ -358,6 +407,13 @@ class NsxSynchronizer():
             status = (lr_status and
                       constants.NET_STATUS_ACTIVE
                       or constants.NET_STATUS_DOWN)
+        return status
+
+    def synchronize_router(self, context, neutron_router_data,
+                           lrouter=None):
+        """Synchronize a neutron router with its NSX counterpart."""
+        status = self._get_router_status(
+            context, neutron_router_data['id'], lrouter)
         # Update db object
         if status == neutron_router_data['status']:
             # do nothing
@@ -393,37 +449,33 @@ class NsxSynchronizer():
             else:
                 LOG.warn(_("Unable to find Neutron router id for "
                            "NSX logical router: %s"), lr_uuid)
-        # Fetch neutron routers from database
-        filters = ({} if scan_missing else
-                   {'id': neutron_router_mappings.keys()})
-        routers = self._plugin._get_collection(
-            ctx, l3_db.Router, self._plugin._make_router_dict,
-            filters=filters)
-        for router in routers:
-            lrouter = neutron_router_mappings.get(router['id'])
-            self.synchronize_router(
-                ctx, router, lrouter and lrouter.get('data'))
-
-    def synchronize_port(self, context, neutron_port_data,
-                         lswitchport=None, ext_networks=None):
-        """Synchronize a Neutron port with its NSX counterpart."""
-        # Skip synchronization for ports on external networks
-        if not ext_networks:
-            ext_networks = [net['id'] for net in context.session.query(
-                models_v2.Network).join(
-                    external_net_db.ExternalNetwork,
-                    (models_v2.Network.id ==
-                     external_net_db.ExternalNetwork.network_id))]
-        if neutron_port_data['network_id'] in ext_networks:
-            with context.session.begin(subtransactions=True):
-                neutron_port_data['status'] = constants.PORT_STATUS_ACTIVE
-                return
+        # Fetch neutron routers status from database
+        routers = self._query_by_ids(
+            ctx.session.query(l3_db.Router.id, l3_db.Router.status),
+            l3_db.Router.id,
+            None if scan_missing else neutron_router_mappings.keys())
+        updates = {}
+        for router_id, router_status in routers:
+            lrouter = neutron_router_mappings.get(router_id)
+            status = self._get_router_status(
+                ctx, router_id, lrouter and lrouter.get('data'))
+            if status != router_status:
+                updates.setdefault(status, []).append(router_id)
+        self._update_status(ctx, l3_db.Router, updates)
+
+    def _get_external_networks(self, context):
+        return [net['id'] for net in context.session.query(
+            models_v2.Network).join(
+                external_net_db.ExternalNetwork,
+                (models_v2.Network.id ==
+                 external_net_db.ExternalNetwork.network_id))]
 
+    def _get_port_status(self, context, port_id, lswitchport=None):
         if not lswitchport:
             # Try to get port from nsx
             try:
                 ls_uuid, lp_uuid = nsx_utils.get_nsx_switch_and_port_id(
-                    context.session, self._cluster, neutron_port_data['id'])
+                    context.session, self._cluster, port_id)
                 if lp_uuid:
                     lswitchport = switchlib.get_port(
                         self._cluster, ls_uuid, lp_uuid,
@@ -434,7 +486,7 @@ class NsxSynchronizer():
                 # of PortNotFoundOnNetwork when the id exists but
                 # the logical switch port was not found
                 LOG.warning(_("Logical switch port for neutron port %s "
-                              "not found on NSX."), neutron_port_data['id'])
+                              "not found on NSX."), port_id)
                 lswitchport = None
             else:
                 # If lswitchport is not None, update the cache.
@@ -452,7 +504,21 @@ class NsxSynchronizer():
             status = (lp_status and
                       constants.PORT_STATUS_ACTIVE
                       or constants.PORT_STATUS_DOWN)
+        return status
+
+    def synchronize_port(self, context, neutron_port_data,
+                         lswitchport=None, ext_networks=None):
+        """Synchronize a Neutron port with its NSX counterpart."""
+        # Skip synchronization for ports on external networks
+        if not ext_networks:
+            ext_networks = self._get_external_networks(context)
+        if neutron_port_data['network_id'] in ext_networks:
+            with context.session.begin(subtransactions=True):
+                neutron_port_data['status'] = constants.PORT_STATUS_ACTIVE
+                return
 
+        status = self._get_port_status(
+            context, neutron_port_data['id'], lswitchport)
         # Update db object
         if status == neutron_port_data['status']:
             # do nothing
@@ -487,32 +553,40 @@ class NsxSynchronizer():
             if neutron_port_id:
                 neutron_port_mappings[neutron_port_id] = (
                     self._nsx_cache[lp_uuid])
-        # Fetch neutron ports from database
+        # Fetch neutron ports status from database
         # At the first sync we need to fetch all ports
-        filters = ({} if scan_missing else
-                   {'id': neutron_port_mappings.keys()})
         # TODO(salv-orlando): Work out a solution for avoiding
         # this query
-        ext_nets = [net['id'] for net in ctx.session.query(
-            models_v2.Network).join(
-                external_net_db.ExternalNetwork,
-                (models_v2.Network.id ==
-                 external_net_db.ExternalNetwork.network_id))]
-        ports = self._plugin._get_collection(
-            ctx, models_v2.Port, self._plugin._make_port_dict,
-            filters=filters)
-        for port in ports:
-            lswitchport = neutron_port_mappings.get(port['id'])
-            self.synchronize_port(
-                ctx, port, lswitchport and lswitchport.get('data'),
-                ext_networks=ext_nets)
+        ext_nets = set(self._get_external_networks(ctx))
+        ports = self._query_by_ids(
+            ctx.session.query(models_v2.Port.id, models_v2.Port.status,
+                              models_v2.Port.network_id),
+            models_v2.Port.id,
+            None if scan_missing else neutron_port_mappings.keys())
+        updates = {}
+        for port_id, port_status, network_id in ports:
+            # Ports on external networks are not synchronized
+            if network_id in ext_nets:
+                continue
+            lswitchport = neutron_port_mappings.get(port_id)
+            status = self._get_port_status(
+                ctx, port_id, lswitchport and lswitchport.get('data'))
+            if status != port_status:
+                updates.setdefault(status, []).append(port_id)
+        self._update_status(ctx, models_v2.Port, updates)
 
     def _get_chunk_size(self, sp):
-        # NOTE(salv-orlando): Try to use __future__ for this routine only?
-        ratio = ((float(sp.total_size) / float(sp.chunk_size)) /
-                 (float(self._sync_interval) / float(self._req_delay)))
-        new_size = max(1.0, ratio) * float(sp.chunk_size)
-        return int(new_size) + (new_size - int(new_size) > 0)
+        # Enough resources for completing a run within the sync interval
+        num_requests = float(self._sync_interval) / float(self._req_delay)
+        new_size = float(sp.total_size) / num_requests
+        new_size = max(sp.min_chunk_size,
+                       int(new_size) + (new_size - int(new_size) > 0))
+        if sp.throughput:
+            # Or as many as NSX returns within the minimum request delay,
+            # up to what can be fetched with a single request
+            new_size = max(new_size, min(int(sp.throughput * self._req_delay),
+                                         MAX_PAGE_SIZE))
+        return new_size
 
     def _fetch_data(self, uri, cursor, page_size):
         # If not cursor there is nothing to retrieve
@@ -556,40 +630,64 @@ class NsxSynchronizer():
             return results, cursor if page_size else 'start', total_size
         return [], cursor, None
 
+    def _get_page_sizes(self, sp, streams):
+        remaining = dict((name, max(sp.sizes[name] - sp.fetched[name], 0))
+                         for name in streams)
+        total = sum(remaining.values())
+        if sp.current_chunk == 0 or not total:
+            # Sizes are not known before the first pages are returned
+            return dict((name, sp.chunk_size) for name in streams)
+        # Share the chunk among resource types so that they all complete
+        # at the same chunk
+        return dict((name, max(1, sp.chunk_size * remaining[name] / total))
+                    for name in streams)
+
     def _fetch_nsx_data_chunk(self, sp):
-        base_chunk_size = sp.chunk_size
-        chunk_size = base_chunk_size + sp.extra_chunk_size
+        uris = {'ls': self.LS_URI, 'lr': self.LR_URI, 'lp': self.LP_URI}
+        streams = [name for name in ('ls', 'lr', 'lp')
+                   if getattr(sp, '%s_cursor' % name)]
+        page_sizes = self._get_page_sizes(sp, streams)
         LOG.info(_("Fetching up to %s resources "
-                   "from NSX backend"), chunk_size)
-        fetched = ls_count = lr_count = lp_count = 0
-        lswitches = lrouters = lswitchports = []
-        if sp.ls_cursor or sp.ls_cursor == 'start':
-            (lswitches, sp.ls_cursor, ls_count) = self._fetch_data(
-                self.LS_URI, sp.ls_cursor, chunk_size)
-            fetched = len(lswitches)
-        if fetched < chunk_size and sp.lr_cursor or sp.lr_cursor == 'start':
-            (lrouters, sp.lr_cursor, lr_count) = self._fetch_data(
-                self.LR_URI, sp.lr_cursor, max(chunk_size - fetched, 0))
-        fetched += len(lrouters)
-        if fetched < chunk_size and sp.lp_cursor or sp.lp_cursor == 'start':
-            (lswitchports, sp.lp_cursor, lp_count) = self._fetch_data(
-                self.LP_URI, sp.lp_cursor, max(chunk_size - fetched, 0))
-        fetched += len(lswitchports)
-        if sp.current_chunk == 0:
-            # No cursors were provided. Then it must be possible to
-            # calculate the total amount of data to fetch
-            sp.total_size = ls_count + lr_count + lp_count
+                   "from NSX backend"), sum(page_sizes.values()))
+        start = timeutils.utcnow()
+        # Each resource type is fetched in its own green thread
+        threads = dict(
+            (name, eventlet.spawn(self._fetch_data, uris[name],
+                                  getattr(sp, '%s_cursor' % name),
+                                  page_sizes[name]))
+            for name in streams)
+        pages = {}
+        exc_info = None
+        for name, thread in threads.iteritems():
+            try:
+                pages[name] = thread.wait()
+            except Exception:
+                exc_info = exc_info or sys.exc_info()
+        if exc_info:
+            # Cursors are left untouched so the chunk is fetched again
+            six.reraise(*exc_info)
+        results = {'ls': [], 'lr': [], 'lp': []}
+        for name, (results[name], cursor, count) in pages.iteritems():
+            setattr(sp, '%s_cursor' % name, cursor)
+            if count is not None:
+                sp.sizes[name] = count
+            sp.fetched[name] += len(results[name])
+        fetched = sum(len(page) for page in results.values())
+        elapsed = timeutils.delta_seconds(start, timeutils.utcnow())
+        if fetched and elapsed > 0:
+            throughput = fetched / elapsed
+            sp.throughput = (throughput if sp.throughput is None else
+                             (sp.throughput + throughput) / 2)
+        sp.total_size = sum(sp.sizes.values())
         LOG.debug(_("Total data size: %d"), sp.total_size)
         sp.chunk_size = self._get_chunk_size(sp)
-        # Calculate chunk size adjustment
-        sp.extra_chunk_size = sp.chunk_size - base_chunk_size
         LOG.debug(_("Fetched %(num_lswitches)d logical switches, "
                     "%(num_lswitchports)d logical switch ports,"
                     "%(num_lrouters)d logical routers"),
-                  {'num_lswitches': len(lswitches),
-                   'num_lswitchports': len(lswitchports),
-                   'num_lrouters': len(lrouters)})
-        return (lswitches, lrouters, lswitchports)
+                  {'num_lswitches': len(results['ls']),
+                   'num_lswitchports': len(results['lp']),
+                   'num_lrouters': len(results['lr'])})
+        return (results['ls'], results['lr'], results['lp'])
 
     def _synchronize_state(self, sp):
         # If the plugin has been destroyed, stop the LoopingCall
@@ -599,6 +697,7 @@ class NsxSynchronizer():
         # Reset page cursor variables if necessary
         if sp.current_chunk == 0:
             sp.ls_cursor = sp.lr_cursor = sp.lp_cursor = 'start'
+            sp.fetched = {'ls': 0, 'lr': 0, 'lp': 0}
         LOG.info(_("Running state synchronization task. Chunk: %s"),
                  sp.current_chunk)
         # Fetch chunk_size data from NSX
@@ -625,10 +724,11 @@ class NsxSynchronizer():
         # to be synchronized
         (ls_uuids, lr_uuids, lp_uuids) = self._nsx_cache.process_updates(
             lswitches, lrouters, lswitchports)
+        # The run is over once every resource type has been fetched
+        last_chunk = not (sp.ls_cursor or sp.lr_cursor or sp.lp_cursor)
         # Process removed objects only at the last chunk
-        scan_missing = (sp.current_chunk == num_chunks - 1 and
-                        not sp.init_sync_performed)
-        if sp.current_chunk == num_chunks - 1:
+        scan_missing = last_chunk and not sp.init_sync_performed
+        if last_chunk:
             self._nsx_cache.process_deletes()
             ls_uuids = self._nsx_cache.get_lswitches(
                 changed_only=not scan_missing)
@@ -652,7 +752,7 @@ class NsxSynchronizer():
                    "%(total_chunks)d performed"),
                  {'chunk_num': sp.current_chunk + 1,
                   'total_chunks': num_chunks})
-        sp.current_chunk = (sp.current_chunk + 1) % num_chunks
+        sp.current_chunk = 0 if last_chunk else sp.current_chunk + 1
         added_delay = 0
         if sp.current_chunk == 0:
             # Ensure init_sync_performed is True
@@ -19,6 +19,8 @@
 # @author: Sridar Kandaswamy, skandasw@cisco.com, Cisco Systems, Inc.
 # @author: Dan Florea, dflorea@cisco.com, Cisco Systems, Inc.
 
+import hashlib
+
 from oslo.config import cfg
 
 from neutron.agent.common import config
@@ -27,7 +29,9 @@ from neutron.common import topics
 from neutron import context
 from neutron.extensions import firewall as fw_ext
 from neutron.openstack.common import importutils
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.plugins.common import constants
 from neutron.services.firewall.agents import firewall_agent_api as api
 
@@ -58,6 +62,25 @@ class FWaaSL3PluginApi(api.FWaaSPluginApiMixin):
                                        host=self.host),
                          topic=self.topic)
 
+    def get_firewalls_for_tenants(self, context, tenant_ids):
+        """Get the Firewalls with rules of the given tenants."""
+        LOG.debug(_("Retrieve Firewalls with rules for %d tenants from "
+                    "Plugin"), len(tenant_ids))
+
+        return self.call(context,
+                         self.make_msg('get_firewalls_for_tenants',
+                                       tenant_ids=tenant_ids,
+                                       host=self.host),
+                         topic=self.topic,
+                         version='1.1')
+
+
+def _get_firewall_hash(fw):
+    """Return a digest of everything the driver applies for a firewall."""
+    fw = dict((key, value) for key, value in fw.iteritems()
+              if key != 'status')
+    return hashlib.sha1(jsonutils.dumps(fw, sort_keys=True)).hexdigest()
+
 
 class FWaaSL3AgentRpcCallback(api.FWaaSAgentRpcCallbackMixin):
     """FWaaS Agent support to be used by Neutron L3 agent."""
@@ -77,37 +100,56 @@ class FWaaSL3AgentRpcCallback(api.FWaaSAgentRpcCallbackMixin):
                 msg = _('Error importing FWaaS device driver: %s')
                 raise ImportError(msg % fwaas_driver_class_path)
         self.services_sync = False
+        self.bulk_sync_supported = True
+        # firewall id -> {router id: hash of the firewall applied on it}
+        self.applied_firewalls = {}
         self.root_helper = config.get_root_helper(conf)
         # setup RPC to msg fwaas plugin
         self.fwplugin_rpc = FWaaSL3PluginApi(topics.FIREWALL_PLUGIN,
                                              conf.host)
         super(FWaaSL3AgentRpcCallback, self).__init__(host=conf.host)
 
-    def _get_router_info_list_for_tenant(self, routers, tenant_id):
-        """Returns the list of router info objects on which to apply the fw."""
+    def _get_router_info_lists(self, routers):
+        """Returns the router info objects to apply fws on, by tenant."""
         root_ip = ip_lib.IPWrapper(self.root_helper)
-        # Get the routers for the tenant
-        router_ids = [
-            router['id']
-            for router in routers
-            if router['tenant_id'] == tenant_id]
         local_ns_list = root_ip.get_namespaces(
             self.root_helper) if self.conf.use_namespaces else []
 
-        router_info_list = []
+        router_info_lists = {}
         # Pick up namespaces for Tenant Routers
-        for rid in router_ids:
+        for router in routers:
+            rid = router['id']
             # for routers without an interface - get_routers returns
             # the router - but this is not yet populated in router_info
             if rid not in self.router_info:
                 continue
-            if self.router_info[rid].use_namespaces:
-                router_ns = self.router_info[rid].ns_name()
-                if router_ns in local_ns_list:
-                    router_info_list.append(self.router_info[rid])
-            else:
-                router_info_list.append(self.router_info[rid])
-        return router_info_list
+            ri = self.router_info[rid]
+            if ri.use_namespaces and ri.ns_name() not in local_ns_list:
+                continue
+            router_info_lists.setdefault(router['tenant_id'], []).append(ri)
+        return router_info_lists
+
+    def _get_router_info_list_for_tenant(self, routers, tenant_id):
+        """Returns the list of router info objects on which to apply the fw."""
+        # Get the routers for the tenant
+        routers = [router for router in routers
+                   if router['tenant_id'] == tenant_id]
+        return self._get_router_info_lists(routers).get(tenant_id, [])
+
+    def _set_firewall_applied(self, router_info_list, fw):
+        fw_hash = _get_firewall_hash(fw)
+        applied = self.applied_firewalls.setdefault(fw['id'], {})
+        for ri in router_info_list:
+            applied[ri.router['id']] = fw_hash
+
+    def _is_firewall_applied(self, router_info_list, fw):
+        """Check if fw is applied unchanged on all the routers."""
+        if fw['status'] not in (constants.ACTIVE, constants.DOWN):
+            return False
+        applied = self.applied_firewalls.get(fw['id'], {})
+        fw_hash = _get_firewall_hash(fw)
+        return all(applied.get(ri.router['id']) == fw_hash
+                   for ri in router_info_list)
 
     def _invoke_driver_for_plugin_api(self, context, fw, func_name):
         """Invoke driver method for plugin API and provide status back."""
@@ -137,10 +179,15 @@ class FWaaSL3AgentRpcCallback(api.FWaaSAgentRpcCallbackMixin):
                     status = constants.ACTIVE
                 else:
                     status = constants.DOWN
+                if func_name == 'delete_firewall':
+                    self.applied_firewalls.pop(fw['id'], None)
+                else:
+                    self._set_firewall_applied(router_info_list, fw)
             except fw_ext.FirewallInternalDriverError:
                 LOG.error(_("Firewall Driver Error for %(func_name)s "
                             "for fw: %(fwid)s"),
                           {'func_name': func_name, 'fwid': fw['id']})
+                self.applied_firewalls.pop(fw['id'], None)
                 status = constants.ERROR
             # delete needs different handling
             if func_name == 'delete_firewall':
@@ -164,6 +211,7 @@ class FWaaSL3AgentRpcCallback(api.FWaaSAgentRpcCallbackMixin):
         Idempotent.
         """
         if fw['status'] == constants.PENDING_DELETE:
+            self.applied_firewalls.pop(fw['id'], None)
             try:
                 self.fwaas_driver.delete_firewall(router_info_list, fw)
                 self.fwplugin_rpc.firewall_deleted(
@@ -185,10 +233,12 @@ class FWaaSL3AgentRpcCallback(api.FWaaSAgentRpcCallbackMixin):
                     status = constants.ACTIVE
                 else:
                     status = constants.DOWN
+                self._set_firewall_applied(router_info_list, fw)
             except fw_ext.FirewallInternalDriverError:
                 LOG.error(_("Firewall Driver Error on fw state %(fwmsg)s "
                             "for fw: %(fwid)s"),
                           {'fwmsg': fw['status'], 'fwid': fw['id']})
+                self.applied_firewalls.pop(fw['id'], None)
                 status = constants.ERROR
 
             self.fwplugin_rpc.set_firewall_status(
@@ -230,44 +280,93 @@ class FWaaSL3AgentRpcCallback(api.FWaaSAgentRpcCallbackMixin):
                 ri.router['id'])
             self.services_sync = True
 
+    def process_router_remove(self, ri):
+        """On router remove, forget the firewalls applied on the router.
+
+        A router added back later gets a new namespace, so the firewalls
+        must be applied again instead of being skipped as unchanged.
+        """
+        router_id = ri.router['id']
+        for applied in self.applied_firewalls.values():
+            applied.pop(router_id, None)
+
+    def _sync_firewalls(self, ctx):
+        """Apply the firewalls of the tenants of the local routers.
+
+        The firewalls are fetched with a single call and only the ones
+        which changed since they were last applied are sent to the driver.
+        """
+        routers = [ri.router for ri in self.router_info.values()]
+        router_info_lists = self._get_router_info_lists(routers)
+        if not router_info_lists:
+            return
+        fw_list = self.fwplugin_rpc.get_firewalls_for_tenants(
+            ctx, router_info_lists.keys())
+        LOG.debug(_("fw_list: '%s'"), [fw['id'] for fw in fw_list])
+        for fw in fw_list:
+            router_info_list = router_info_lists.get(fw['tenant_id'])
+            if (not router_info_list or
+                    self._is_firewall_applied(router_info_list, fw)):
+                continue
+            LOG.debug(_("Apply fw on Router List: '%s'"),
+                      [ri.router['id'] for ri in router_info_list])
+            self._invoke_driver_for_sync_from_plugin(
+                ctx,
+                router_info_list,
+                fw)
+
+    def _sync_firewalls_by_tenant(self, ctx):
+        """Apply the firewalls with one call per tenant for old plugins."""
+        # get all routers
+        routers = self.plugin_rpc.get_routers(ctx)
+        # get the list of tenants with firewalls configured
+        # from the plugin
+        tenant_ids = self.fwplugin_rpc.get_tenants_with_firewalls(ctx)
+        LOG.debug(_("Tenants with Firewalls: '%s'"), tenant_ids)
+        for tenant_id in tenant_ids:
+            ctx = context.Context('', tenant_id)
+            fw_list = self.fwplugin_rpc.get_firewalls_for_tenant(ctx)
+            if fw_list:
+                # if fw present on tenant
+                router_info_list = self._get_router_info_list_for_tenant(
+                    routers,
+                    tenant_id)
+                if router_info_list:
+                    LOG.debug(_("Router List: '%s'"),
+                              [ri.router['id'] for ri in router_info_list])
+                    LOG.debug(_("fw_list: '%s'"),
+                              [fw['id'] for fw in fw_list])
+                    # apply sync data on fw for this tenant
+                    for fw in fw_list:
+                        # fw, routers present on this host for tenant
+                        # install
+                        LOG.debug(_("Apply fw on Router List: '%s'"),
+                                  [ri.router['id']
+                                      for ri in router_info_list])
+                        # no need to apply sync data for ACTIVE fw
+                        if fw['status'] != constants.ACTIVE:
+                            self._invoke_driver_for_sync_from_plugin(
+                                ctx,
+                                router_info_list,
+                                fw)
+
     def process_services_sync(self, ctx):
         """On RPC issues sync with plugin and apply the sync data."""
         # avoid msg to plugin when fwaas is not configured
         if not self.fwaas_enabled:
             return
         try:
-            # get all routers
-            routers = self.plugin_rpc.get_routers(ctx)
-            # get the list of tenants with firewalls configured
-            # from the plugin
-            tenant_ids = self.fwplugin_rpc.get_tenants_with_firewalls(ctx)
-            LOG.debug(_("Tenants with Firewalls: '%s'"), tenant_ids)
-            for tenant_id in tenant_ids:
-                ctx = context.Context('', tenant_id)
-                fw_list = self.fwplugin_rpc.get_firewalls_for_tenant(ctx)
-                if fw_list:
-                    # if fw present on tenant
-                    router_info_list = self._get_router_info_list_for_tenant(
-                        routers,
-                        tenant_id)
-                    if router_info_list:
-                        LOG.debug(_("Router List: '%s'"),
-                                  [ri.router['id'] for ri in router_info_list])
-                        LOG.debug(_("fw_list: '%s'"),
-                                  [fw['id'] for fw in fw_list])
-                        # apply sync data on fw for this tenant
-                        for fw in fw_list:
-                            # fw, routers present on this host for tenant
-                            # install
-                            LOG.debug(_("Apply fw on Router List: '%s'"),
-                                      [ri.router['id']
-                                          for ri in router_info_list])
-                            # no need to apply sync data for ACTIVE fw
-                            if fw['status'] != constants.ACTIVE:
-                                self._invoke_driver_for_sync_from_plugin(
-                                    ctx,
-                                    router_info_list,
-                                    fw)
+            if self.bulk_sync_supported:
+                try:
+                    self._sync_firewalls(ctx)
+                except rpc_common.RemoteError as e:
+                    if e.exc_type != 'UnsupportedRpcVersion':
+                        raise
+                    LOG.info(_("Plugin does not support bulk firewall "
+                               "sync, falling back to per tenant sync"))
+                    self.bulk_sync_supported = False
+            if not self.bulk_sync_supported:
+                self._sync_firewalls_by_tenant(ctx)
             self.services_sync = False
         except Exception:
             LOG.exception(_("Failed fwaas process services sync"))
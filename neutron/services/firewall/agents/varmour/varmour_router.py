@@ -86,6 +86,7 @@ class vArmourL3NATAgent(l3_agent.L3NATAgent,
             name = va_utils.get_untrusted_zone_name(ri)
             self._va_unset_zone_interfaces(name, True)
 
+            super(vArmourL3NATAgent, self).process_router_remove(ri)
             del self.router_info[router_id]
 
     def _spawn_metadata_proxy(self, router_id, ns_name):
@@ -17,6 +17,8 @@
 #
 # @author: Rajesh Mohan, Rajesh_Mohan3@Dell.com, DELL Inc.
 
+import netaddr
+
 from neutron.agent.linux import iptables_manager
 from neutron.extensions import firewall as fw_ext
 from neutron.openstack.common import log as logging
@@ -41,6 +43,12 @@ IPV4 = 'ipv4'
 IPV6 = 'ipv6'
 IP_VER_TAG = {IPV4: 'v4',
               IPV6: 'v6'}
+IP_VERSION = {IPV4: 4,
+              IPV6: 6}
+# multiport matches at most 15 ports, a port range counts as two
+MULTIPORT_MAX_PORTS = 15
+RULE_MATCH_FIELDS = ('protocol', 'source_port', 'destination_port',
+                     'source_ip_address', 'destination_ip_address')
 
 
 class IptablesFwaasDriver(fwaas_base.FwaasDriverBase):
@@ -71,7 +79,7 @@ class IptablesFwaasDriver(fwaas_base.FwaasDriverBase):
                 ipt_mgr = router_info.iptables_manager
                 self._remove_chains(fwid, ipt_mgr)
                 self._remove_default_chains(ipt_mgr)
-                ipt_mgr.apply()
+            self._apply(apply_list)
         except (LookupError, RuntimeError):
             # catch known library exceptions and raise Fwaas generic exception
             LOG.exception(_("Failed to delete firewall: %s"), fwid)
@@ -106,8 +114,8 @@ class IptablesFwaasDriver(fwaas_base.FwaasDriverBase):
                 self._add_default_policy_chain_v4v6(ipt_mgr)
                 self._enable_policy_chain(fwid, ipt_mgr)
 
-                # apply the changes
-                ipt_mgr.apply()
+            # apply the changes
+            self._apply(apply_list)
         except (LookupError, RuntimeError):
             # catch known library exceptions and raise Fwaas generic exception
             LOG.exception(_("Failed to apply default policy on firewall: %s"),
@@ -116,6 +124,10 @@ class IptablesFwaasDriver(fwaas_base.FwaasDriverBase):
 
     def _setup_firewall(self, apply_list, firewall):
         fwid = firewall['id']
+        # the rules are the same on every router, compile them once
+        rules = dict((ver, self._compile_rules(firewall['firewall_rule_list'],
+                                               ver))
+                     for ver in [IPV4, IPV6])
         for router_info in apply_list:
             ipt_mgr = router_info.iptables_manager
 
@@ -126,21 +138,37 @@ class IptablesFwaasDriver(fwaas_base.FwaasDriverBase):
             # create default 'DROP ALL' policy chain
             self._add_default_policy_chain_v4v6(ipt_mgr)
             #create chain based on configured policy
-            self._setup_chains(firewall, ipt_mgr)
+            self._setup_chains(firewall, ipt_mgr, rules)
 
-            # apply the changes
-            ipt_mgr.apply()
+        # apply the changes
+        self._apply(apply_list)
+
+    def _apply(self, apply_list):
+        """Apply the iptables of all routers once they are all updated.
+
+        A failure while building the rules of one router then leaves every
+        router with its previous rules.
+        """
+        for router_info in apply_list:
+            router_info.iptables_manager.apply()
 
     def _get_chain_name(self, fwid, ver, direction):
         return '%s%s%s' % (CHAIN_NAME_PREFIX[direction],
                            IP_VER_TAG[ver],
                            fwid)
 
-    def _setup_chains(self, firewall, ipt_mgr):
+    def _setup_chains(self, firewall, ipt_mgr, rules=None):
         """Create Fwaas chain using the rules in the policy
+
+        :param rules: iptables rules by ip version, as compiled by
+                      _compile_rules. Compiled from the firewall when None.
         """
-        fw_rules_list = firewall['firewall_rule_list']
         fwid = firewall['id']
+        if rules is None:
+            rules = dict(
+                (ver, self._compile_rules(firewall['firewall_rule_list'],
+                                          ver))
+                for ver in [IPV4, IPV6])
 
         #default rules for invalid packets and established sessions
         invalid_rule = self._drop_invalid_packets_rule()
@@ -158,22 +186,126 @@ class IptablesFwaasDriver(fwaas_base.FwaasDriverBase):
                 table.add_rule(name, invalid_rule)
                 table.add_rule(name, est_rule)
 
-        for rule in fw_rules_list:
-            if not rule['enabled']:
-                continue
-            iptbl_rule = self._convert_fwaas_to_iptables_rule(rule)
-            if rule['ip_version'] == 4:
-                ver = IPV4
+        for ver in [IPV4, IPV6]:
+            if ver == IPV4:
                 table = ipt_mgr.ipv4['filter']
             else:
-                ver = IPV6
                 table = ipt_mgr.ipv6['filter']
             ichain_name = self._get_chain_name(fwid, ver, INGRESS_DIRECTION)
             ochain_name = self._get_chain_name(fwid, ver, EGRESS_DIRECTION)
-            table.add_rule(ichain_name, iptbl_rule)
-            table.add_rule(ochain_name, iptbl_rule)
+            for rule in rules[ver]:
+                iptbl_rule = self._convert_fwaas_to_iptables_rule(rule)
+                table.add_rule(ichain_name, iptbl_rule)
+                table.add_rule(ochain_name, iptbl_rule)
         self._enable_policy_chain(fwid, ipt_mgr)
 
+    def _compile_rules(self, fw_rules_list, ver):
+        """Return the enabled rules of an ip version with fewer matches.
+
+        Packets are matched against a run of consecutive rules with the same
+        action in any order without changing the verdict. Within such a run
+        duplicates are dropped, rules differing only by an address are
+        merged into the smallest set of CIDRs and rules differing only by
+        destination port are folded into multiport matches. Rules are never
+        moved across a rule with another action.
+        """
+        compiled = []
+        run = []
+        for rule in fw_rules_list:
+            if not rule['enabled'] or rule['ip_version'] != IP_VERSION[ver]:
+                continue
+            if run and self._get_action(rule) != self._get_action(run[0]):
+                compiled.extend(self._compress_rules(run))
+                run = []
+            run.append(rule)
+        if run:
+            compiled.extend(self._compress_rules(run))
+        return compiled
+
+    def _compress_rules(self, rules):
+        """Merge rules which all have the same action."""
+        matches = []
+        for rule in rules:
+            match = dict((field, rule.get(field))
+                         for field in RULE_MATCH_FIELDS)
+            if match['protocol'] not in ['udp', 'tcp']:
+                # ports are ignored for other protocols
+                match['source_port'] = None
+                match['destination_port'] = None
+            match['action'] = rule.get('action')
+            if match not in matches:
+                matches.append(match)
+        matches = self._merge_field(matches, 'source_ip_address',
+                                    self._merge_addresses)
+        matches = self._merge_field(matches, 'destination_ip_address',
+                                    self._merge_addresses)
+        return self._merge_field(matches, 'destination_port',
+                                 self._merge_ports)
+
+    def _merge_field(self, matches, field, merge):
+        """Merge the matches which only differ by the value of field."""
+        groups = []
+        values = {}
+        for match in matches:
+            key = tuple((k, v) for k, v in sorted(match.items())
+                        if k != field)
+            if key not in values:
+                groups.append((key, match))
+                values[key] = []
+            values[key].append(match[field])
+
+        merged = []
+        for key, match in groups:
+            group_values = values[key]
+            if len(group_values) == 1:
+                merged.append(match)
+                continue
+            if None in group_values:
+                # a rule matching any value covers all the others
+                group_values = [None]
+            else:
+                group_values = merge(group_values)
+            for value in group_values:
+                match = dict(match)
+                match[field] = value
+                merged.append(match)
+        return merged
+
+    def _merge_addresses(self, addresses):
+        return [str(cidr) for cidr in netaddr.cidr_merge(addresses)]
+
+    def _merge_ports(self, ports):
+        """Fold ports and port ranges into as few multiport lists as can."""
+        ranges = []
+        for port in ports:
+            bounds = [int(p) for p in str(port).split(':')]
+            ranges.append((bounds[0], bounds[-1]))
+        ranges.sort()
+        merged = [ranges[0]]
+        for low, high in ranges[1:]:
+            last_low, last_high = merged[-1]
+            if low <= last_high + 1:
+                merged[-1] = (last_low, max(high, last_high))
+            else:
+                merged.append((low, high))
+
+        port_lists = []
+        current = []
+        used = 0
+        for low, high in merged:
+            if low == high:
+                item, size = str(low), 1
+            else:
+                item, size = '%s:%s' % (low, high), 2
+            if used + size > MULTIPORT_MAX_PORTS:
+                port_lists.append(','.join(current))
+                current = []
+                used = 0
+            current.append(item)
+            used += size
+        port_lists.append(','.join(current))
+        return port_lists
+
     def _remove_default_chains(self, nsid):
         """Remove fwaas default policy chain."""
         self._remove_chain_by_name(IPV4, FWAAS_DEFAULT_CHAIN, nsid)
@@ -232,8 +364,11 @@ class IptablesFwaasDriver(fwaas_base.FwaasDriverBase):
         self._add_rules_to_chain(ipt_mgr, IPV4, 'FORWARD', jump_rule)
         self._add_rules_to_chain(ipt_mgr, IPV6, 'FORWARD', jump_rule)
 
+    def _get_action(self, rule):
+        return rule.get('action') == 'allow' and 'ACCEPT' or 'DROP'
+
     def _convert_fwaas_to_iptables_rule(self, rule):
-        action = rule.get('action') == 'allow' and 'ACCEPT' or 'DROP'
+        action = self._get_action(rule)
         args = [self._protocol_arg(rule.get('protocol')),
                 self._port_arg('dport',
                                rule.get('protocol'),
@@ -267,6 +402,8 @@ class IptablesFwaasDriver(fwaas_base.FwaasDriverBase):
     def _port_arg(self, direction, protocol, port):
         if not (protocol in ['udp', 'tcp'] and port):
             return ''
+        if ',' in str(port):
+            return '-m multiport --%ss %s' % (direction, port)
         return '--%s %s' % (direction, port)
 
     def _ip_prefix_arg(self, direction, ip_prefix):
@@ -36,7 +36,11 @@ LOG = logging.getLogger(__name__)
 
 
 class FirewallCallbacks(object):
-    RPC_API_VERSION = '1.0'
+    # history
+    #   1.0 Initial version
+    #   1.1 Added get_firewalls_for_tenants
+
+    RPC_API_VERSION = '1.1'
 
     def __init__(self, plugin):
         self.plugin = plugin
@@ -87,6 +91,42 @@ class FirewallCallbacks(object):
         fw_list = [fw for fw in self.plugin.get_firewalls(context)]
         return fw_list
 
+    def get_firewalls_for_tenants(self, context, tenant_ids=None, **kwargs):
+        """Agent uses this to get the firewalls and rules of many tenants.
+
+        All the firewalls, policies and rules are read with one query each
+        instead of the per firewall queries of get_firewalls_for_tenant.
+        """
+        LOG.debug(_("get_firewalls_for_tenants() called"))
+        if not tenant_ids:
+            return []
+        ctx = neutron_context.get_admin_context()
+        fw_list = self.plugin.get_firewalls(
+            ctx, filters={'tenant_id': tenant_ids})
+        policy_ids = set(fw['firewall_policy_id'] for fw in fw_list
+                         if fw['firewall_policy_id'])
+        policies = {}
+        if policy_ids:
+            policies = dict(
+                (fwp['id'], fwp) for fwp in self.plugin.get_firewall_policies(
+                    ctx, filters={'id': list(policy_ids)}))
+        rule_ids = set(rule_id for fwp in policies.values()
+                       for rule_id in fwp['firewall_rules'])
+        rules = {}
+        if rule_ids:
+            rules = dict(
+                (fwr['id'], fwr) for fwr in self.plugin.get_firewall_rules(
+                    ctx, filters={'id': list(rule_ids)}))
+        for fw in fw_list:
+            fw_policy = policies.get(fw['firewall_policy_id'])
+            if fw_policy:
+                fw['firewall_rule_list'] = [
+                    rules[rule_id] for rule_id in fw_policy['firewall_rules']
+                    if rule_id in rules]
+            else:
+                fw['firewall_rule_list'] = []
+        return fw_list
+
     def get_tenants_with_firewalls(self, context, **kwargs):
         """Agent uses this to get all tenants that have firewalls."""
         LOG.debug(_("get_tenants_with_firewalls() called"))
@@ -28,6 +28,8 @@ class LbaasAgentApi(proxy.RpcProxy):
     #   2.0 Generic API for agent based drivers
     #       - get_logical_device() handling changed on plugin side;
     #       - pool_deployed() and update_status() methods added;
+    #   2.1 update_pools_stats() method added
+    #   2.2 get_logical_devices() method added
 
     def __init__(self, topic, context, host):
         super(LbaasAgentApi, self).__init__(topic, self.API_VERSION)
@@ -65,6 +67,17 @@ class LbaasAgentApi(proxy.RpcProxy):
             topic=self.topic
         )
 
+    def get_logical_devices(self, pool_ids):
+        return self.call(
+            self.context,
+            self.make_msg(
+                'get_logical_devices',
+                pool_ids=pool_ids
+            ),
+            topic=self.topic,
+            version='2.2'
+        )
+
     def update_status(self, obj_type, obj_id, status):
         return self.call(
             self.context,
@@ -98,3 +111,15 @@ class LbaasAgentApi(proxy.RpcProxy):
             ),
             topic=self.topic
         )
+
+    def update_pools_stats(self, stats):
+        return self.call(
+            self.context,
+            self.make_msg(
+                'update_pools_stats',
+                stats=stats,
+                host=self.host
+            ),
+            topic=self.topic,
+            version='2.1'
+        )
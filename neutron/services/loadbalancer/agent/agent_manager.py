@@ -16,6 +16,7 @@
 #
 # @author: Mark McClain, DreamHost
 
+import eventlet
 from oslo.config import cfg
 
 from neutron.agent import rpc as agent_rpc
@@ -27,6 +28,7 @@ from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import periodic_task
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.plugins.common import constants
 from neutron.services.loadbalancer.agent import agent_api
 
@@ -39,6 +41,18 @@ OPTS = [
                  '.haproxy.namespace_driver.HaproxyNSDriver'],
         help=_('Drivers used to manage loadbalancing devices'),
     ),
+    cfg.IntOpt(
+        'stats_workers',
+        default=16,
+        help=_('Maximum number of pools whose statistics are read '
+               'concurrently'),
+    ),
+    cfg.IntOpt(
+        'resync_workers',
+        default=8,
+        help=_('Maximum number of pools deployed concurrently when '
+               'resyncing with the plugin'),
+    ),
 ]
 
 
@@ -80,6 +94,10 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):
         self.needs_resync = False
         # pool_id->device_driver_name mapping used to store known instances
         self.instance_mapping = {}
+        # pool_id->stats last acknowledged by the plugin
+        self.reported_stats = {}
+        self.bulk_stats_supported = True
+        self.bulk_devices_supported = True
 
     def _load_drivers(self):
         self.device_drivers = {}
@@ -131,16 +149,76 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):
 
     @periodic_task.periodic_task(spacing=6)
     def collect_stats(self, context):
-        for pool_id, driver_name in self.instance_mapping.items():
-            driver = self.device_drivers[driver_name]
+        for pool_id in set(self.reported_stats) - set(self.instance_mapping):
+            del self.reported_stats[pool_id]
+
+        pool = eventlet.GreenPool(self.conf.stats_workers)
+        all_stats = {}
+        deltas = {}
+        for pool_id, stats in pool.imap(self._get_pool_stats,
+                                        self.instance_mapping.items()):
+            if not stats:
+                continue
+            delta = self._get_stats_delta(pool_id, stats)
+            if delta:
+                all_stats[pool_id] = stats
+                deltas[pool_id] = delta
+        if not deltas:
+            return
+
+        if self.bulk_stats_supported:
+            try:
+                self.plugin_rpc.update_pools_stats(deltas)
+            except rpc_common.RemoteError as e:
+                if e.exc_type != 'UnsupportedRpcVersion':
+                    LOG.exception(_('Error updating statistics of %d pools'),
+                                  len(deltas))
+                    return
+                LOG.info(_('Plugin does not support bulk statistics '
+                           'updates, reporting them per pool'))
+                self.bulk_stats_supported = False
+            except Exception:
+                LOG.exception(_('Error updating statistics of %d pools'),
+                              len(deltas))
+                return
+            else:
+                self.reported_stats.update(all_stats)
+                return
+
+        for pool_id, stats in all_stats.iteritems():
             try:
-                stats = driver.get_stats(pool_id)
-                if stats:
-                    self.plugin_rpc.update_pool_stats(pool_id, stats)
+                self.plugin_rpc.update_pool_stats(pool_id, stats)
             except Exception:
                 LOG.exception(_('Error updating statistics on pool %s'),
                               pool_id)
                 self.needs_resync = True
+            else:
+                self.reported_stats[pool_id] = stats
+
+    def _get_pool_stats(self, instance):
+        pool_id, driver_name = instance
+        driver = self.device_drivers[driver_name]
+        try:
+            return pool_id, driver.get_stats(pool_id)
+        except Exception:
+            LOG.exception(_('Error updating statistics on pool %s'),
+                          pool_id)
+            self.needs_resync = True
+            return pool_id, None
+
+    def _get_stats_delta(self, pool_id, stats):
+        """Return the part of stats that changed since the last report."""
+        reported = self.reported_stats.get(pool_id, {})
+        delta = dict((key, value) for key, value in stats.iteritems()
+                     if key != 'members' and reported.get(key) != value)
+        reported_members = reported.get('members', {})
+        members = dict((member_id, member_stats)
+                       for member_id, member_stats
+                       in stats.get('members', {}).iteritems()
+                       if reported_members.get(member_id) != member_stats)
+        if members:
+            delta['members'] = members
+        return delta
 
     def sync_state(self):
         known_instances = set(self.instance_mapping.keys())
@@ -150,8 +228,12 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):
             for deleted_id in known_instances - ready_instances:
                 self._destroy_pool(deleted_id)
 
+            logical_configs = self._get_logical_devices(ready_instances)
+            pool = eventlet.GreenPool(self.conf.resync_workers)
             for pool_id in ready_instances:
-                self._reload_pool(pool_id)
+                pool.spawn_n(self._reload_pool, pool_id,
+                             logical_configs.get(pool_id))
+            pool.waitall()
 
         except Exception:
             LOG.exception(_('Unable to retrieve ready devices'))
@@ -166,9 +248,28 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):
         driver_name = self.instance_mapping[pool_id]
         return self.device_drivers[driver_name]
 
-    def _reload_pool(self, pool_id):
+    def _get_logical_devices(self, pool_ids):
+        """Fetch the logical configs of several pools in one call.
+
+        Pools missing from the result, or all of them with a plugin not
+        supporting the bulk call, are fetched one by one by _reload_pool.
+        """
+        if not pool_ids or not self.bulk_devices_supported:
+            return {}
+        try:
+            return self.plugin_rpc.get_logical_devices(list(pool_ids))
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.info(_('Plugin does not support fetching logical devices '
+                       'in bulk, fetching them per pool'))
+            self.bulk_devices_supported = False
+            return {}
+
+    def _reload_pool(self, pool_id, logical_config=None):
         try:
-            logical_config = self.plugin_rpc.get_logical_device(pool_id)
+            if not logical_config:
+                logical_config = self.plugin_rpc.get_logical_device(pool_id)
             driver_name = logical_config['driver']
             if driver_name not in self.device_drivers:
                 LOG.error(_('No device driver '
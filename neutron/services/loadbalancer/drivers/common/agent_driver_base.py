@@ -19,6 +19,7 @@
 import uuid
 
 from oslo.config import cfg
+from sqlalchemy.orm import exc as orm_exc
 
 from neutron.common import constants as q_const
 from neutron.common import exceptions as n_exc
@@ -55,12 +56,14 @@ class DriverNotSpecified(n_exc.NeutronException):
 
 class LoadBalancerCallbacks(object):
 
-    RPC_API_VERSION = '2.0'
+    RPC_API_VERSION = '2.2'
     # history
     #   1.0 Initial version
     #   2.0 Generic API for agent based drivers
     #       - get_logical_device() handling changed;
     #       - pool_deployed() and update_status() methods added;
+    #   2.1 update_pools_stats() method added
+    #   2.2 get_logical_devices() method added
 
     def __init__(self, plugin):
         self.plugin = plugin
@@ -132,6 +135,19 @@ class LoadBalancerCallbacks(object):
 
             return retval
 
+    def get_logical_devices(self, context, pool_ids=None):
+        """Return the logical configs of the given pools, keyed by id.
+
+        Pools that are gone or not ACTIVE are left out of the result.
+        """
+        devices = {}
+        for pool_id in pool_ids or []:
+            try:
+                devices[pool_id] = self.get_logical_device(context, pool_id)
+            except (n_exc.Invalid, orm_exc.NoResultFound):
+                LOG.debug(_('Pool %s is not ready to be deployed'), pool_id)
+        return devices
+
     def pool_deployed(self, context, pool_id):
         with context.session.begin(subtransactions=True):
             qry = context.session.query(loadbalancer_db.Pool)
@@ -244,6 +260,9 @@ class LoadBalancerCallbacks(object):
     def update_pool_stats(self, context, pool_id=None, stats=None, host=None):
         self.plugin.update_pool_stats(context, pool_id, data=stats)
 
+    def update_pools_stats(self, context, stats=None, host=None):
+        self.plugin.update_pools_stats(context, stats or {})
+
 
 class LoadBalancerAgentApi(proxy.RpcProxy):
     """Plugin side of plugin to agent RPC API."""
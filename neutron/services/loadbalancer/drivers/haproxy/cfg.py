@@ -16,7 +16,9 @@
 #
 # @author: Mark McClain, DreamHost
 
+import copy
 import itertools
+import os
 from six.moves import xrange
 
 from neutron.agent.linux import utils
@@ -53,18 +55,70 @@ INACTIVE = qconstants.INACTIVE
 
 
 def save_config(conf_path, logical_config, socket_path=None,
-                user_group='nogroup'):
-    """Convert a logical configuration to the HAProxy version."""
+                user_group='nogroup', runtime_members=False):
+    """Convert a logical configuration to the HAProxy version.
+
+    With runtime_members, members that are administratively down are kept
+    as disabled servers and the stats socket is opened at admin level, so
+    that member changes can be applied with get_member_commands().
+    """
+    utils.replace_file(conf_path,
+                       build_config(logical_config, socket_path, user_group,
+                                    runtime_members))
+
+
+def build_config(logical_config, socket_path=None, user_group='nogroup',
+                 runtime_members=False):
+    """Render a logical configuration as HAProxy configuration text."""
     data = []
     data.extend(_build_global(logical_config, socket_path=socket_path,
-                              user_group=user_group))
+                              user_group=user_group,
+                              admin_socket=runtime_members))
     data.extend(_build_defaults(logical_config))
     data.extend(_build_frontend(logical_config))
-    data.extend(_build_backend(logical_config))
-    utils.replace_file(conf_path, '\n'.join(data))
+    data.extend(_build_backend(logical_config,
+                               keep_disabled=runtime_members))
+    return '\n'.join(data)
 
 
-def _build_global(config, socket_path=None, user_group='nogroup'):
+def get_structure(logical_config):
+    """Return the configuration lines member changes cannot alter.
+
+    haproxy only needs to be restarted when these lines change; weight and
+    admin state changes are left out as they can be applied at runtime.
+    """
+    config = copy.deepcopy(logical_config)
+    for member in config['members']:
+        member['weight'] = 1
+        member['admin_state_up'] = True
+    return (list(_build_frontend(config)) +
+            list(_build_backend(config, keep_disabled=True)))
+
+
+def get_member_commands(old_config, new_config):
+    """Return the stats socket commands bringing members to new_config.
+
+    Both configurations are expected to share the same structure.
+    """
+    backend = new_config['pool']['id']
+    old_members = dict((member['id'], member)
+                       for member in old_config['members'])
+    commands = []
+    for member in new_config['members']:
+        if not _is_member_deployed(member, keep_disabled=True):
+            continue
+        old_member = old_members[member['id']]
+        server = '%s/%s' % (backend, member['id'])
+        if member['weight'] != old_member['weight']:
+            commands.append('set weight %s %s' % (server, member['weight']))
+        if member['admin_state_up'] != old_member['admin_state_up']:
+            action = member['admin_state_up'] and 'enable' or 'disable'
+            commands.append('%s server %s' % (action, server))
+    return commands
+
+
+def _build_global(config, socket_path=None, user_group='nogroup',
+                  admin_socket=False):
     opts = [
         'daemon',
         'user nobody',
@@ -74,7 +128,14 @@ def _build_global(config, socket_path=None, user_group='nogroup'):
     ]
 
     if socket_path:
-        opts.append('stats socket %s mode 0666 level user' % socket_path)
+        if admin_socket:
+            # the admin level allows to change servers and drop sessions,
+            # only the agent may use it
+            opts.append('stats socket %s mode 0600 uid %d level admin' %
+                        (socket_path, os.getuid()))
+        else:
+            opts.append('stats socket %s mode 0666 level user' %
+                        socket_path)
 
     return itertools.chain(['global'], ('\t' + o for o in opts))
 
@@ -117,7 +178,7 @@ def _build_frontend(config):
     )
 
 
-def _build_backend(config):
+def _build_backend(config, keep_disabled=False):
     protocol = config['pool']['protocol']
     lb_method = config['pool']['lb_method']
 
@@ -139,13 +200,13 @@ def _build_backend(config):
 
     # add the members
     for member in config['members']:
-        if ((member['status'] in ACTIVE_PENDING_STATUSES or
-             member['status'] == INACTIVE)
-            and member['admin_state_up']):
+        if _is_member_deployed(member, keep_disabled):
             server = (('server %(id)s %(address)s:%(protocol_port)s '
                        'weight %(weight)s') % member) + server_addon
             if _has_http_cookie_persistence(config):
                 server += ' cookie %d' % config['members'].index(member)
+            if not member['admin_state_up']:
+                server += ' disabled'
             opts.append(server)
 
     return itertools.chain(
@@ -154,6 +215,12 @@ def _build_backend(config):
     )
 
 
+def _is_member_deployed(member, keep_disabled=False):
+    return ((member['status'] in ACTIVE_PENDING_STATUSES or
+             member['status'] == INACTIVE) and
+            (member['admin_state_up'] or keep_disabled))
+
+
 def _get_first_ip_from_port(port):
     for fixed_ip in port['fixed_ips']:
         return fixed_ip['ip_address']
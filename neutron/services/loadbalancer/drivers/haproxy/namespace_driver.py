@@ -15,6 +15,7 @@
 #    under the License.
 #
 # @author: Mark McClain, DreamHost
+import hashlib
 import os
 import shutil
 import socket
@@ -26,9 +27,9 @@ from neutron.agent.common import config
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import utils
 from neutron.common import exceptions
-from neutron.common import utils as n_utils
 from neutron.openstack.common import excutils
 from neutron.openstack.common import importutils
+from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.plugins.common import constants
 from neutron.services.loadbalancer.agent import agent_device_driver
@@ -53,7 +54,13 @@ OPTS = [
         default=USER_GROUP_DEFAULT,
         help=_('The user group'),
         deprecated_opts=[cfg.DeprecatedOpt('user_group')],
-    )
+    ),
+    cfg.BoolOpt(
+        'runtime_member_updates',
+        default=False,
+        help=_('Apply member weight and admin state changes through the '
+               'haproxy stats socket instead of restarting haproxy'),
+    ),
 ]
 cfg.CONF.register_opts(OPTS, 'haproxy')
 
@@ -74,6 +81,9 @@ class HaproxyNSDriver(agent_device_driver.AgentDeviceDriver):
         self.vif_driver = vif_driver
         self.plugin_rpc = plugin_rpc
         self.pool_to_port_id = {}
+        # pool_id->logical config haproxy is running with, used to tell
+        # member-only changes from the ones requiring a restart
+        self.deployed_configs = {}
 
     @classmethod
     def get_name(cls):
@@ -88,6 +98,9 @@ class HaproxyNSDriver(agent_device_driver.AgentDeviceDriver):
 
     def update(self, logical_config):
         pool_id = logical_config['pool']['id']
+        if (self.conf.haproxy.runtime_member_updates and
+                self._update_members(logical_config)):
+            return
         pid_path = self._get_state_file_path(pool_id, 'pid')
 
         extra_args = ['-sf']
@@ -101,25 +114,99 @@ class HaproxyNSDriver(agent_device_driver.AgentDeviceDriver):
         pid_path = self._get_state_file_path(pool_id, 'pid')
         sock_path = self._get_state_file_path(pool_id, 'sock')
         user_group = self.conf.haproxy.user_group
+        runtime_members = self.conf.haproxy.runtime_member_updates
 
-        hacfg.save_config(conf_path, logical_config, sock_path, user_group)
+        hacfg.save_config(conf_path, logical_config, sock_path, user_group,
+                          runtime_members=runtime_members)
         cmd = ['haproxy', '-f', conf_path, '-p', pid_path]
         cmd.extend(extra_cmd_args)
 
         ns = ip_lib.IPWrapper(self.root_helper, namespace)
         ns.netns.execute(cmd)
 
+        self._remember_instance(logical_config)
+
+    def _remember_instance(self, logical_config):
+        pool_id = logical_config['pool']['id']
         # remember the pool<>port mapping
         self.pool_to_port_id[pool_id] = logical_config['vip']['port']['id']
+        if self.conf.haproxy.runtime_member_updates:
+            self.deployed_configs[pool_id] = logical_config
+
+    def _is_config_current(self, logical_config):
+        """Check whether the config on disk is the one we would render."""
+        pool_id = logical_config['pool']['id']
+        conf_path = self._get_state_file_path(pool_id, 'conf')
+        sock_path = self._get_state_file_path(pool_id, 'sock')
+        try:
+            with open(conf_path, 'r') as conf_file:
+                current = hashlib.sha1(conf_file.read()).hexdigest()
+        except IOError:
+            return False
+        config = hacfg.build_config(logical_config, sock_path,
+                                    self.conf.haproxy.user_group,
+                                    self.conf.haproxy.runtime_member_updates)
+        return current == hashlib.sha1(config).hexdigest()
+
+    def _update_members(self, logical_config):
+        """Apply member changes to the running haproxy if possible.
+
+        Returns False when haproxy has to be restarted instead, either
+        because more than members changed or because the stats socket
+        did not accept the commands.
+        """
+        pool_id = logical_config['pool']['id']
+        deployed_config = self.deployed_configs.get(pool_id)
+        if (not deployed_config or
+                hacfg.get_structure(deployed_config) !=
+                hacfg.get_structure(logical_config)):
+            return False
+
+        conf_path = self._get_state_file_path(pool_id, 'conf')
+        sock_path = self._get_state_file_path(pool_id, 'sock')
+        # keep the config file in sync for the next restart
+        hacfg.save_config(conf_path, logical_config, sock_path,
+                          self.conf.haproxy.user_group, runtime_members=True)
+        commands = hacfg.get_member_commands(deployed_config, logical_config)
+        if commands and not self._send_socket_commands(sock_path, commands):
+            return False
+        self.deployed_configs[pool_id] = logical_config
+        return True
+
+    def _send_socket_commands(self, socket_path, commands):
+        try:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.connect(socket_path)
+            s.send('%s\n' % ';'.join(commands))
+            response = ''
+            while True:
+                chunk = s.recv(1024)
+                if not chunk:
+                    break
+                response += chunk
+            s.close()
+        except socket.error as e:
+            LOG.warn(_('Error while connecting to stats socket: %s'), e)
+            return False
+        if response.strip():
+            LOG.warn(_('haproxy rejected commands %(commands)s: '
+                       '%(response)s'),
+                     {'commands': commands, 'response': response.strip()})
+            return False
+        return True
 
-    @n_utils.synchronized('haproxy-driver')
     def undeploy_instance(self, pool_id):
+        with pool_lock(pool_id):
+            self._undeploy_instance(pool_id)
+
+    def _undeploy_instance(self, pool_id):
         namespace = get_ns_name(pool_id)
         ns = ip_lib.IPWrapper(self.root_helper, namespace)
         pid_path = self._get_state_file_path(pool_id, 'pid')
 
         # kill the process
         kill_pids_in_file(self.root_helper, pid_path)
+        self.deployed_configs.pop(pool_id, None)
 
         # unplug the ports
         if pool_id in self.pool_to_port_id:
@@ -263,7 +350,6 @@ class HaproxyNSDriver(agent_device_driver.AgentDeviceDriver):
         interface_name = self.vif_driver.get_device_name(Wrap(port_stub))
         self.vif_driver.unplug(interface_name, namespace=namespace)
 
-    @n_utils.synchronized('haproxy-driver')
     def deploy_instance(self, logical_config):
         # do actual deploy only if vip is configured and active
         if ('vip' not in logical_config or
@@ -272,10 +358,16 @@ class HaproxyNSDriver(agent_device_driver.AgentDeviceDriver):
             not logical_config['vip']['admin_state_up']):
             return
 
-        if self.exists(logical_config['pool']['id']):
-            self.update(logical_config)
-        else:
-            self.create(logical_config)
+        pool_id = logical_config['pool']['id']
+        with pool_lock(pool_id):
+            if not self.exists(pool_id):
+                self.create(logical_config)
+            elif self._is_config_current(logical_config):
+                LOG.debug(_('haproxy configuration of pool %s is up to '
+                            'date'), pool_id)
+                self._remember_instance(logical_config)
+            else:
+                self.update(logical_config)
 
     def _refresh_device(self, pool_id):
         logical_config = self.plugin_rpc.get_logical_device(pool_id)
@@ -337,6 +429,10 @@ def get_ns_name(namespace_id):
     return NS_PREFIX + namespace_id
 
 
+def pool_lock(pool_id):
+    return lockutils.lock('haproxy-driver-%s' % pool_id)
+
+
 def kill_pids_in_file(root_helper, pid_path):
     if os.path.exists(pid_path):
         with open(pid_path, 'r') as pids:
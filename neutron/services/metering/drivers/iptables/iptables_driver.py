@@ -267,16 +267,19 @@ class IptablesMeteringDriver(abstract_driver.MeteringAbstractDriver):
             if not rm:
                 continue
 
-            for label_id, label in rm.metering_labels.items():
+            chains = {}
+            for label_id in rm.metering_labels:
                 chain = iptables_manager.get_chain_name(WRAP_NAME + LABEL +
                                                         label_id, wrap=False)
+                chains[chain] = label_id
+            if not chains:
+                continue
 
-                chain_acc = rm.iptables_manager.get_traffic_counters(
-                    chain, wrap=False, zero=True)
-
-                if not chain_acc:
-                    continue
+            chains_acc = rm.iptables_manager.get_bulk_traffic_counters(
+                chains.keys(), wrap=False, zero=True)
 
+            for chain, chain_acc in chains_acc.iteritems():
+                label_id = chains[chain]
                 acc = accs.get(label_id, {'pkts': 0, 'bytes': 0})
 
                 acc['pkts'] += chain_acc['pkts']
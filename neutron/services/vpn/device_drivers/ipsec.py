@@ -49,7 +49,12 @@ ipsec_opts = [
         help=_('Location to store ipsec server config files')),
     cfg.IntOpt('ipsec_status_check_interval',
                default=60,
-               help=_("Interval for checking ipsec status"))
+               help=_("Interval for checking ipsec status")),
+    cfg.IntOpt('ipsec_status_check_max_interval',
+               default=300,
+               help=_("Maximum interval for checking ipsec status. The "
+                      "check interval doubles up to this value while no "
+                      "status changes are seen"))
 ]
 cfg.CONF.register_opts(ipsec_opts, 'ipsec')
 
@@ -134,6 +139,7 @@ class BaseSwanProcess():
         self.updated_pending_status = False
         self.namespace = namespace
         self.connection_status = {}
+        self._status = None
         self.config_dir = os.path.join(
             cfg.CONF.ipsec.config_base_dir, self.id)
         self.etc_dir = os.path.join(self.config_dir, 'etc')
@@ -199,9 +205,22 @@ class BaseSwanProcess():
 
     @property
     def status(self):
+        """Return the last known status, checking it on first use."""
+        if self._status is None:
+            return self.refresh_status()
+        return self._status
+
+    def refresh_status(self):
+        """Query the process status and cache it.
+
+        This runs a single status command in the namespace, which also
+        updates the status of every connection.
+        """
         if self.active:
-            return constants.ACTIVE
-        return constants.DOWN
+            self._status = constants.ACTIVE
+        else:
+            self._status = constants.DOWN
+        return self._status
 
     @property
     def active(self):
@@ -225,7 +244,7 @@ class BaseSwanProcess():
         if plugin_utils.in_pending_status(self.vpnservice['status']):
             self.updated_pending_status = True
 
-        self.vpnservice['status'] = self.status
+        self.vpnservice['status'] = self.refresh_status()
         for ipsec_site_conn in self.vpnservice['ipsec_site_connections']:
             if plugin_utils.in_pending_status(ipsec_site_conn['status']):
                 conn_id = ipsec_site_conn['id']
@@ -498,6 +517,8 @@ class IPsecDriver(device_drivers.DeviceDriver):
 
         self.processes = {}
         self.process_status_cache = {}
+        # vpnservice configurations last applied, keyed by process_id
+        self.applied_vpnservices = {}
 
         self.conn.create_consumer(
             node_topic,
@@ -505,10 +526,11 @@ class IPsecDriver(device_drivers.DeviceDriver):
             fanout=False)
         self.conn.consume_in_thread()
         self.agent_rpc = IPsecVpnDriverApi(topics.IPSEC_DRIVER_TOPIC, '1.0')
-        self.process_status_cache_check = loopingcall.FixedIntervalLoopingCall(
-            self.report_status, self.context)
-        self.process_status_cache_check.start(
-            interval=self.conf.ipsec.ipsec_status_check_interval)
+        self.status_check_interval = (
+            self.conf.ipsec.ipsec_status_check_interval)
+        self.process_status_cache_check = loopingcall.DynamicLoopingCall(
+            self._report_status_periodic, self.context)
+        self.process_status_cache_check.start()
 
     def create_rpc_dispatcher(self):
         return q_rpc.PluginRpcDispatcher([self])
@@ -590,6 +612,7 @@ class IPsecDriver(device_drivers.DeviceDriver):
             if vpnservice:
                 self._update_nat(vpnservice, self.agent.remove_nat_rule)
             del self.processes[process_id]
+        self.applied_vpnservices.pop(process_id, None)
 
     def get_process_status_cache(self, process):
         if not self.process_status_cache.get(process.id):
@@ -622,9 +645,17 @@ class IPsecDriver(device_drivers.DeviceDriver):
             'ipsec_site_connections': copy.deepcopy(process.connection_status)
         }
 
-    def report_status(self, context):
+    def report_status(self, context, refresh=True):
+        """Report the vpnservices whose status changed.
+
+        :param refresh: query the status of every process first. When False
+                        the status cached by the processes is used.
+        :returns: list of the status changes sent to the server
+        """
         status_changed_vpn_services = []
         for process in self.processes.values():
+            if refresh:
+                process.refresh_status()
             previous_status = self.get_process_status_cache(process)
             if self.is_status_updated(process, previous_status):
                 new_status = self.copy_process_status(process)
@@ -638,6 +669,61 @@ class IPsecDriver(device_drivers.DeviceDriver):
             self.agent_rpc.update_status(
                 context,
                 status_changed_vpn_services)
+        return status_changed_vpn_services
+
+    def _report_status_periodic(self, context):
+        """Report status and return the delay until the next check.
+
+        The delay doubles, up to ipsec_status_check_max_interval, while the
+        status of the processes stays the same and drops back to
+        ipsec_status_check_interval as soon as something changes.
+        """
+        min_interval = self.conf.ipsec.ipsec_status_check_interval
+        max_interval = max(min_interval,
+                           self.conf.ipsec.ipsec_status_check_max_interval)
+        try:
+            changed = self.report_status(context)
+        except Exception:
+            LOG.exception(_("Failed to report ipsec status"))
+            changed = True
+        if changed:
+            self.status_check_interval = min_interval
+        else:
+            self.status_check_interval = min(self.status_check_interval * 2,
+                                             max_interval)
+        return self.status_check_interval
+
+    @staticmethod
+    def _get_service_config(vpnservice):
+        """Return a copy of vpnservice without its status fields."""
+        config = copy.deepcopy(vpnservice)
+        config.pop('status', None)
+        for ipsec_site_conn in config['ipsec_site_connections']:
+            ipsec_site_conn.pop('status', None)
+        return config
+
+    def _is_service_applied(self, process_id, vpnservice, config):
+        """Check if vpnservice is already running as last applied.
+
+        A service is applied again when its configuration changed, when
+        it or one of its connections is in a pending state, or when its
+        process is not running although the service is up. The cached
+        status may be stale, so the process is queried before skipping it.
+        """
+        process = self.processes.get(process_id)
+        if not process or not process.namespace:
+            return False
+        if self.applied_vpnservices.get(process_id) != config:
+            return False
+        if plugin_utils.in_pending_status(vpnservice['status']):
+            return False
+        for ipsec_site_conn in vpnservice['ipsec_site_connections']:
+            if plugin_utils.in_pending_status(ipsec_site_conn.get('status')):
+                return False
+        if (vpnservice['admin_state_up'] and
+            process.refresh_status() != constants.ACTIVE):
+            return False
+        return True
 
     @lockutils.synchronized('vpn-agent', 'neutron-')
     def sync(self, context, routers):
@@ -655,16 +741,23 @@ class IPsecDriver(device_drivers.DeviceDriver):
 
         In order to handle, these failure cases,
         This driver takes simple sync strategies.
+        Vpnservices which are unchanged since they were last applied
+        are skipped.
         """
         vpnservices = self.agent_rpc.get_vpn_services_on_host(
             context, self.host)
         router_ids = [vpnservice['router_id'] for vpnservice in vpnservices]
         # Ensure the ipsec process is enabled
         for vpnservice in vpnservices:
-            process = self.ensure_process(vpnservice['router_id'],
+            process_id = vpnservice['router_id']
+            config = self._get_service_config(vpnservice)
+            if self._is_service_applied(process_id, vpnservice, config):
+                continue
+            process = self.ensure_process(process_id,
                                           vpnservice=vpnservice)
             self._update_nat(vpnservice, self.agent.add_nat_rule)
             process.update()
+            self.applied_vpnservices[process_id] = config
 
         # Delete any IPSec processes that are
         # associated with routers, but are not running the VPN service.
@@ -682,7 +775,9 @@ class IPsecDriver(device_drivers.DeviceDriver):
                        if process_id not in router_ids]
         for process_id in process_ids:
             self.destroy_router(process_id)
-        self.report_status(context)
+        # Processes updated or skipped above have just refreshed their
+        # status
+        self.report_status(context, refresh=False)
 
 
 class OpenSwanDriver(IPsecDriver):
@@ -0,0 +1,103 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import socket
+
+import mock
+
+from neutron.agent.linux import netlink_monitor
+from neutron.tests import base
+
+AF_BRIDGE = 7
+
+
+def _link_message(msg_type, name, family=netlink_monitor.AF_UNSPEC):
+    value = name + '\0'
+    attr = netlink_monitor.RTATTR.pack(netlink_monitor.RTATTR.size +
+                                       len(value),
+                                       netlink_monitor.IFLA_IFNAME) + value
+    attr += '\0' * (netlink_monitor._align(len(attr)) - len(attr))
+    body = netlink_monitor.IFINFOMSG.pack(family, 1, 5, 0, 0) + attr
+    length = netlink_monitor.NLMSGHDR.size + len(body)
+    return netlink_monitor.NLMSGHDR.pack(length, msg_type, 0, 0, 0) + body
+
+
+class TestParseLinkMessages(base.BaseTestCase):
+
+    def test_parse_new_and_deleted_links(self):
+        data = (_link_message(netlink_monitor.RTM_NEWLINK, 'tap1') +
+                _link_message(netlink_monitor.RTM_DELLINK, 'tap22'))
+        self.assertEqual([(netlink_monitor.RTM_NEWLINK, 'tap1'),
+                          (netlink_monitor.RTM_DELLINK, 'tap22')],
+                         netlink_monitor.parse_link_messages(data))
+
+    def test_parse_ignores_bridge_family(self):
+        data = _link_message(netlink_monitor.RTM_DELLINK, 'tap1',
+                             family=AF_BRIDGE)
+        self.assertEqual([], netlink_monitor.parse_link_messages(data))
+
+    def test_parse_ignores_other_messages(self):
+        data = _link_message(20, 'tap1')
+        self.assertEqual([], netlink_monitor.parse_link_messages(data))
+
+    def test_parse_truncated_data(self):
+        data = _link_message(netlink_monitor.RTM_NEWLINK, 'tap1')
+        self.assertEqual([], netlink_monitor.parse_link_messages(data[:10]))
+
+
+class TestLinkMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestLinkMonitor, self).setUp()
+        self.monitor = netlink_monitor.LinkMonitor(prefix='tap')
+
+    def test_get_events_filters_prefix(self):
+        self.monitor._handle(
+            _link_message(netlink_monitor.RTM_NEWLINK, 'tap1') +
+            _link_message(netlink_monitor.RTM_NEWLINK, 'eth0') +
+            _link_message(netlink_monitor.RTM_DELLINK, 'tap1'))
+        self.assertEqual([(True, 'tap1'), (False, 'tap1')],
+                         self.monitor.get_events(timeout=0))
+        self.assertEqual([], self.monitor.get_events(timeout=0))
+
+    def test_read_queues_overflow(self):
+        sock = mock.Mock()
+        sock.recv.side_effect = [socket.error(errno.ENOBUFS, 'overflow'),
+                                 socket.error(errno.EBADF, 'closed')]
+        self.monitor._sock = sock
+        self.monitor._read()
+        self.assertEqual([netlink_monitor.OVERFLOW, netlink_monitor.OVERFLOW],
+                         self.monitor.get_events(timeout=0))
+
+    def test_start_and_stop(self):
+        with mock.patch('socket.socket') as sock_cls:
+            with mock.patch('eventlet.spawn') as spawn:
+                spawn.return_value.dead = False
+                self.monitor.start()
+                sock_cls.return_value.bind.assert_called_once_with(
+                    (0, netlink_monitor.RTMGRP_LINK))
+                self.assertTrue(self.monitor.is_active)
+                self.monitor.stop()
+        self.assertFalse(self.monitor.is_active)
+        sock_cls.return_value.close.assert_called_once_with()
+
+    def test_start_bind_failure_closes_socket(self):
+        with mock.patch('socket.socket') as sock_cls:
+            sock_cls.return_value.bind.side_effect = socket.error
+            self.assertRaises(socket.error, self.monitor.start)
+        sock_cls.return_value.close.assert_called_once_with()
+        self.assertFalse(self.monitor.is_active)
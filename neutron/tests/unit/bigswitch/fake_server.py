@@ -96,6 +96,24 @@ class HTTPConnectionMock(object):
 
         return
 
+    def putrequest(self, action, uri):
+        self.streamed = (action, uri, {}, [])
+
+    def putheader(self, header, value):
+        self.streamed[2][header] = value
+
+    def endheaders(self):
+        pass
+
+    def send(self, data):
+        # Chunked transfer encoding, the last chunk is empty
+        length, chunk = data.split('\r\n', 1)
+        if int(length, 16):
+            self.streamed[3].append(chunk[:-2])
+        else:
+            action, uri, headers, chunks = self.streamed
+            self.request(action, uri, ''.join(chunks), headers)
+
     def getresponse(self):
         return self.response
 
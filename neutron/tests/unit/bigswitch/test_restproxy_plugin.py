@@ -16,6 +16,8 @@
 # limitations under the License.
 
 from contextlib import nested
+import json
+
 import mock
 from oslo.config import cfg
 import webob.exc
@@ -313,6 +315,32 @@ class TestBigSwitchProxySync(BigSwitchProxyPluginV2TestCase):
         result = plugin_obj._send_all_data()
         self.assertEqual(result[0], 200)
 
+    def test_send_data_streaming(self):
+        cfg.CONF.set_override('sync_streaming', True, 'RESTPROXY')
+        plugin_obj = NeutronManager.get_plugin()
+        with self.port():
+            result = plugin_obj._send_all_data()
+        self.assertEqual(result[0], 200)
+
+    def test_streamed_data_matches_data(self):
+        cfg.CONF.set_override('sync_page_size', 1, 'RESTPROXY')
+        plugin_obj = NeutronManager.get_plugin()
+        with self.subnet() as sub:
+            with nested(self.port(subnet=sub), self.port(subnet=sub),
+                        self.network()):
+                body = plugin_obj._get_all_data_stream(
+                    extra={'triggered_by_tenant': None})
+                streamed = json.loads(''.join(body))
+                data = plugin_obj._get_all_data()
+        data['triggered_by_tenant'] = None
+        self.assertEqual(2, len(data['networks']))
+        # Streamed resources are ordered by id
+        for topology in (data, streamed):
+            topology['networks'].sort(key=lambda net: net['id'])
+            for net in topology['networks']:
+                net['ports'].sort(key=lambda port: port['id'])
+        self.assertEqual(data, streamed)
+
 
 class TestBigSwitchAddressPairs(BigSwitchProxyPluginV2TestCase,
                                 test_addr_pair.TestAllowedAddressPairs):
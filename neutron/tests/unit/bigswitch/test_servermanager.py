@@ -15,14 +15,17 @@
 # @author: Kevin Benton, kevin.benton@bigswitch.com
 #
 import httplib
+import json
 import socket
 
 from contextlib import nested
+import eventlet
 import mock
 from oslo.config import cfg
 
 from neutron.manager import NeutronManager
 from neutron.plugins.bigswitch import servermanager
+from neutron.tests import base
 from neutron.tests.unit.bigswitch import test_restproxy_plugin as test_rp
 
 HTTPCON = 'httplib.HTTPConnection'
@@ -147,3 +150,144 @@ class ServerManagerTests(test_rp.BigSwitchProxyPluginV2TestCase):
             conmock.return_value.request.side_effect = socket.timeout()
             resp = sp.servers[0].rest_call('GET', '/')
             self.assertEqual(resp, (0, None, None, None))
+
+    def test_keep_alive_connections_are_pooled(self):
+        sp = servermanager.ServerPool()
+        with mock.patch(HTTPCON) as conmock:
+            conmock.return_value.getresponse.return_value.getheader.\
+                return_value = None
+            sp.servers[0].capabilities = ['keep-alive']
+            sp.servers[0].rest_call('GET', '/first')
+            sp.servers[0].rest_call('GET', '/second')
+            self.assertEqual(1, conmock.call_count)
+            sp.servers[0].capabilities = []
+            sp.servers[0].rest_call('GET', '/third')
+            self.assertEqual(2, conmock.call_count)
+        server = '%s:%d' % (sp.servers[0].server, sp.servers[0].port)
+        stats = sp.get_stats()[server]
+        self.assertEqual(3, stats['calls'])
+        self.assertEqual(0, stats['in_use'])
+        self.assertEqual(0, stats['idle'])
+
+    def test_consistency_hash_only_stored_on_change(self):
+        sp = servermanager.ServerPool()
+        sp.consistency_hash = 'HASH1'
+        with nested(
+            mock.patch(HTTPCON),
+            mock.patch(SERVERMANAGER + '.cdb.put_consistency_hash')
+        ) as (conmock, putmock):
+            getheader = conmock.return_value.getresponse.return_value.getheader
+            getheader.return_value = 'HASH1'
+            sp.servers[0].rest_call('GET', '/')
+            self.assertFalse(putmock.called)
+            getheader.return_value = 'HASH2'
+            sp.servers[0].rest_call('GET', '/')
+            putmock.assert_called_once_with('HASH2')
+        self.assertEqual('HASH2', sp.consistency_hash)
+
+    def test_unexpected_error_releases_connection(self):
+        sp = servermanager.ServerPool()
+        with nested(
+            mock.patch(HTTPCON),
+            mock.patch(SERVERMANAGER + '.cdb.put_consistency_hash',
+                       side_effect=ValueError)
+        ) as (conmock, putmock):
+            conmock.return_value.getresponse.return_value.getheader.\
+                return_value = 'HASH2'
+            self.assertRaises(ValueError, sp.servers[0].rest_call, 'GET', '/')
+            conmock.return_value.close.assert_called_once_with()
+        server = '%s:%d' % (sp.servers[0].server, sp.servers[0].port)
+        self.assertEqual(0, sp.get_stats()[server]['in_use'])
+
+    def test_rest_call_serialized_with_consistency(self):
+        sp = servermanager.ServerPool()
+        with nested(
+            mock.patch.object(sp, '_rest_call_lock'),
+            mock.patch.object(sp, '_rest_call')
+        ) as (lock, rest_call):
+            sp.capabilities = set(['consistency'])
+            sp.rest_call('GET', '/', '', None, [])
+            self.assertEqual(1, lock.__enter__.call_count)
+            sp.capabilities = set()
+            sp.rest_call('GET', '/', '', None, [])
+            self.assertEqual(1, lock.__enter__.call_count)
+            self.assertEqual(2, rest_call.call_count)
+
+    def test_chunked_body(self):
+        sp = servermanager.ServerPool()
+        body = servermanager.ChunkedBody(lambda: ['{"a": ', '1}'],
+                                         chunk_size=2)
+        with mock.patch(HTTPCON) as conmock:
+            conmock.return_value.getresponse.return_value.getheader.\
+                return_value = None
+            sp.servers[0].rest_call('PUT', '/topology', body)
+        rv = conmock.return_value
+        self.assertFalse(rv.request.called)
+        rv.putrequest.assert_called_once_with('PUT',
+                                              sp.base_uri + '/topology')
+        rv.putheader.assert_any_call('Transfer-Encoding', 'chunked')
+        self.assertEqual([mock.call('6\r\n{"a": \r\n'),
+                          mock.call('2\r\n1}\r\n'),
+                          mock.call('0\r\n\r\n')],
+                         rv.send.call_args_list)
+
+
+class StreamJsonTests(base.BaseTestCase):
+
+    def test_stream_json(self):
+        nested = servermanager.stream_json({'id': 'n1'},
+                                           [('ports', iter([{'id': 'p1'}]))])
+        text = ''.join(servermanager.stream_json(
+            {'tenant': None},
+            [('networks', iter([nested, {'id': 'n2'}])),
+             ('routers', iter([]))]))
+        self.assertEqual({'tenant': None,
+                          'networks': [{'id': 'n1', 'ports': [{'id': 'p1'}]},
+                                       {'id': 'n2'}],
+                          'routers': []},
+                         json.loads(text))
+
+    def test_stream_json_empty_dict(self):
+        text = ''.join(servermanager.stream_json({}, [('a', iter([]))]))
+        self.assertEqual({'a': []}, json.loads(text))
+
+    def test_chunked_body_can_be_iterated_again(self):
+        body = servermanager.ChunkedBody(lambda: iter(['ab', 'c', 'd']),
+                                         chunk_size=3)
+        self.assertEqual(['abc', 'd'], list(body))
+        self.assertEqual(['abc', 'd'], list(body))
+
+
+class ConnectionPoolTests(base.BaseTestCase):
+
+    def setUp(self):
+        super(ConnectionPoolTests, self).setUp()
+        self.factory = mock.Mock(side_effect=lambda timeout: mock.Mock())
+        self.pool = servermanager.ConnectionPool(1, self.factory)
+
+    def test_get_reuses_idle_connection(self):
+        conn, reused = self.pool.get(10)
+        self.assertFalse(reused)
+        self.pool.put(conn)
+        self.assertEqual((conn, True), self.pool.get(10))
+        self.pool.put(conn, keep=False)
+        conn.close.assert_called_once_with()
+        self.assertEqual(0, self.pool.get_stats()['idle'])
+
+    def test_fresh_connection_replaces_idle_one(self):
+        conn, reused = self.pool.get(10)
+        self.pool.put(conn)
+        new_conn, reused = self.pool.get(10, fresh=True)
+        self.assertFalse(reused)
+        self.assertIsNot(conn, new_conn)
+        conn.close.assert_called_once_with()
+
+    def test_get_waits_when_saturated(self):
+        conn, reused = self.pool.get(10)
+        self.assertEqual(1.0, self.pool.get_stats()['saturation'])
+        waiter = eventlet.spawn(self.pool.get, 10)
+        eventlet.sleep(0)
+        self.assertEqual(1, self.pool.stats['waits'])
+        self.pool.put(conn)
+        self.assertEqual((conn, True), waiter.wait())
+        self.assertEqual(1, self.pool.stats['max_in_use'])
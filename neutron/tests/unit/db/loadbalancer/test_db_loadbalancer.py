@@ -1155,6 +1155,51 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                 member = self.plugin.get_member(ctx, member_id)
                 self.assertEqual('INACTIVE', member['status'])
 
+    def test_update_pools_stats(self):
+        with contextlib.nested(self.pool(), self.pool()) as (pool1, pool2):
+            pool1_id = pool1['pool']['id']
+            pool2_id = pool2['pool']['id']
+            ctx = context.get_admin_context()
+            with self.member(pool_id=pool1_id) as member:
+                member_id = member['member']['id']
+                self.plugin.update_pools_stats(ctx, {
+                    pool1_id: {'bytes_in': 1, 'bytes_out': 2,
+                               'members': {member_id: {'status': 'INACTIVE'}}},
+                    pool2_id: {'active_connections': 3},
+                    'unknown': {'bytes_in': 1}})
+                member = self.plugin.get_member(ctx, member_id)
+                self.assertEqual('INACTIVE', member['status'])
+
+            ctx.session.expire_all()
+            qry = ctx.session.query(ldb.PoolStatistics)
+            stats1 = qry.filter_by(pool_id=pool1_id).one()
+            self.assertEqual(1, stats1.bytes_in)
+            self.assertEqual(2, stats1.bytes_out)
+            self.assertEqual(0, stats1.active_connections)
+            stats2 = qry.filter_by(pool_id=pool2_id).one()
+            self.assertEqual(3, stats2.active_connections)
+            self.assertEqual(0, stats2.bytes_in)
+
+    def test_update_pools_stats_without_stats_row(self):
+        with self.pool() as pool:
+            pool_id = pool['pool']['id']
+            ctx = context.get_admin_context()
+            ctx.session.query(ldb.PoolStatistics).filter_by(
+                pool_id=pool_id).delete()
+            self.plugin.update_pools_stats(ctx, {pool_id: {'bytes_in': 7}})
+            ctx.session.expire_all()
+            stats = ctx.session.query(ldb.PoolStatistics).filter_by(
+                pool_id=pool_id).one()
+            self.assertEqual(7, stats.bytes_in)
+            self.assertEqual(0, stats.bytes_out)
+
+    def test_update_pools_stats_negative_value(self):
+        with self.pool() as pool:
+            pool_id = pool['pool']['id']
+            ctx = context.get_admin_context()
+            self.assertRaises(ValueError, self.plugin.update_pools_stats,
+                              ctx, {pool_id: {'bytes_in': -1}})
+
     def test_get_pool_stats(self):
         keys = [("bytes_in", 0),
                 ("bytes_out", 0),
@@ -98,6 +98,7 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
         super(TestLinuxBridgeAgent, self).setUp()
         # disable setting up periodic state reporting
         cfg.CONF.set_override('report_interval', 0, 'AGENT')
+        cfg.CONF.set_override('use_netlink_monitor', False, 'AGENT')
         cfg.CONF.set_override('rpc_backend',
                               'neutron.openstack.common.rpc.impl_fake')
         cfg.CONF.set_default('firewall_driver',
@@ -160,6 +161,125 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
                     agent.daemon_loop()
                 self.assertEqual(3, log.call_count)
 
+    def test_daemon_loop_uses_link_events(self):
+        cfg.CONF.set_override('use_netlink_monitor', True, 'AGENT')
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     60,
+                                                                     None)
+        monitor = mock.Mock()
+        monitor.is_active = True
+        monitor.get_events.side_effect = [[(True, 'tap1')],
+                                          [(False, 'tap1')],
+                                          RuntimeError]
+        with contextlib.nested(
+            mock.patch.object(agent, 'start_link_monitor',
+                              return_value=monitor),
+            mock.patch.object(agent.br_mgr, 'get_tap_devices',
+                              return_value=set(['tap0'])),
+            mock.patch.object(agent, 'process_network_devices',
+                              return_value=False)
+        ) as (start_monitor, get_tap_devices, process_devices):
+            with testtools.ExpectedException(RuntimeError):
+                agent.daemon_loop()
+        # Only the first iteration scans the devices, the next ones are
+        # driven by the link events.
+        self.assertEqual(1, get_tap_devices.call_count)
+        process_devices.assert_has_calls([
+            mock.call({'current': set(['tap0']),
+                       'added': set(['tap0']),
+                       'removed': set()}),
+            mock.call({'current': set(['tap0', 'tap1']),
+                       'added': set(['tap1']),
+                       'removed': set()}),
+            mock.call({'current': set(['tap0']),
+                       'added': set(),
+                       'removed': set(['tap1'])})])
+
+    def test_daemon_loop_polls_on_monitor_overflow(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     60,
+                                                                     None)
+        monitor = mock.Mock()
+        monitor.is_active = True
+        monitor.get_events.side_effect = [[(True, 'tap1'), None],
+                                          RuntimeError]
+        with contextlib.nested(
+            mock.patch.object(agent, 'start_link_monitor',
+                              return_value=monitor),
+            mock.patch.object(agent.br_mgr, 'get_tap_devices',
+                              return_value=set(['tap0'])),
+            mock.patch.object(agent, 'process_network_devices',
+                              return_value=False)
+        ) as (start_monitor, get_tap_devices, process_devices):
+            with testtools.ExpectedException(RuntimeError):
+                agent.daemon_loop()
+        self.assertEqual(2, get_tap_devices.call_count)
+
+    def test_start_link_monitor_failure_falls_back_to_polling(self):
+        cfg.CONF.set_override('use_netlink_monitor', True, 'AGENT')
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with mock.patch('neutron.agent.linux.netlink_monitor.'
+                        'LinkMonitor.start', side_effect=OSError):
+            self.assertIsNone(agent.start_link_monitor())
+
+    def test_treat_devices_added_batch(self):
+        cfg.CONF.set_override('batch_device_commands', True, 'AGENT')
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        details = {'tap1': {'port_id': '1', 'network_id': 'net1',
+                            'admin_state_up': True,
+                            'network_type': p_const.TYPE_VLAN,
+                            'segmentation_id': 10,
+                            'physical_network': 'physnet1'},
+                   'tap2': {'port_id': '2', 'network_id': 'net1',
+                            'admin_state_up': True,
+                            'network_type': p_const.TYPE_VLAN,
+                            'segmentation_id': 10,
+                            'physical_network': 'physnet1'}}
+        with contextlib.nested(
+            mock.patch.object(agent, 'prepare_devices_filter'),
+            mock.patch.object(agent.plugin_rpc, 'get_device_details',
+                              side_effect=lambda ctx, dev, aid: details[dev]),
+            mock.patch.object(agent.br_mgr, 'add_interfaces',
+                              return_value=set(['1'])),
+            mock.patch.object(agent.br_mgr, 'add_interface'),
+            mock.patch.object(agent.plugin_rpc, 'update_device_up'),
+            mock.patch.object(agent.plugin_rpc, 'update_device_down')
+        ) as (prep_fn, details_fn, add_ifs_fn, add_if_fn, up_fn, down_fn):
+            self.assertFalse(agent.treat_devices_added(['tap1', 'tap2']))
+            self.assertEqual(1, add_ifs_fn.call_count)
+            self.assertEqual(
+                [{'port_id': '1', 'network_id': 'net1',
+                  'network_type': p_const.TYPE_VLAN, 'segmentation_id': 10,
+                  'physical_network': 'physnet1'},
+                 {'port_id': '2', 'network_id': 'net1',
+                  'network_type': p_const.TYPE_VLAN, 'segmentation_id': 10,
+                  'physical_network': 'physnet1'}],
+                sorted(add_ifs_fn.call_args[0][0],
+                       key=lambda port: port['port_id']))
+            self.assertFalse(add_if_fn.called)
+            up_fn.assert_called_once_with(agent.context, 'tap1',
+                                          agent.agent_id, cfg.CONF.host)
+            down_fn.assert_called_once_with(agent.context, 'tap2',
+                                            agent.agent_id, cfg.CONF.host)
+
+    def test_treat_devices_removed_collects_bridges_once(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with contextlib.nested(
+            mock.patch.object(agent, 'remove_devices_filter'),
+            mock.patch.object(agent.plugin_rpc, 'update_device_down',
+                              return_value={'exists': True}),
+            mock.patch.object(agent.br_mgr, 'remove_empty_bridges')
+        ) as (remove_filter, update_down, remove_bridges):
+            self.assertFalse(agent.treat_devices_removed(['tap1', 'tap2']))
+        self.assertEqual(2, update_down.call_count)
+        remove_bridges.assert_called_once_with()
+
 
 class TestLinuxBridgeManager(base.BaseTestCase):
     def setUp(self):
@@ -312,6 +432,32 @@ class TestLinuxBridgeManager(base.BaseTestCase):
                 ens.assert_called_once_with("brq123", "eth0",
                                             ipdict, gwdict)
 
+    def test_ensure_flat_bridge_cached(self):
+        self.lbm.ensured_bridges.add(("brq123", "eth0"))
+        with contextlib.nested(
+            mock.patch.object(self.lbm, 'interface_exists_on_bridge',
+                              return_value=True),
+            mock.patch.object(self.lbm, 'get_interface_details'),
+            mock.patch.object(self.lbm, 'ensure_bridge')
+        ) as (exists_fn, details_fn, ens):
+            self.assertEqual(self.lbm.ensure_flat_bridge("123", "eth0"),
+                             "eth0")
+            exists_fn.assert_called_once_with("brq123", "eth0")
+            self.assertFalse(details_fn.called)
+            self.assertFalse(ens.called)
+
+    def test_bridge_is_ensured(self):
+        self.assertFalse(self.lbm.bridge_is_ensured("brq123", "eth0"))
+        self.lbm.ensured_bridges.add(("brq123", "eth0"))
+        with mock.patch.object(self.lbm, 'interface_exists_on_bridge',
+                               side_effect=OSError) as exists_fn:
+            self.assertFalse(self.lbm.bridge_is_ensured("brq123", "eth0"))
+            exists_fn.return_value = True
+            exists_fn.side_effect = None
+            self.assertTrue(self.lbm.bridge_is_ensured("brq123", "eth0"))
+        self.lbm.forget_bridge("brq123")
+        self.assertEqual(set(), self.lbm.ensured_bridges)
+
     def test_ensure_vlan_bridge(self):
         with contextlib.nested(
             mock.patch.object(self.lbm, 'ensure_vlan'),
@@ -507,6 +653,70 @@ class TestLinuxBridgeManager(base.BaseTestCase):
             add_tap.assert_called_with("123", p_const.TYPE_VLAN, "physnet-1",
                                        "1", "tap234")
 
+    def test_add_interfaces(self):
+        ports = [{'network_id': 'net1', 'network_type': p_const.TYPE_VLAN,
+                  'physical_network': 'physnet1', 'segmentation_id': 1,
+                  'port_id': port_id} for port_id in ('1', '2', '3')]
+        ports.append({'network_id': 'net2', 'network_type': 'local',
+                      'physical_network': None, 'segmentation_id': None,
+                      'port_id': '4'})
+        with contextlib.nested(
+            mock.patch.object(self.lbm, 'ensure_network_bridge',
+                              return_value=True),
+            mock.patch.object(self.lbm, 'get_tap_devices',
+                              return_value=set(['tap1', 'tap2', 'tap4'])),
+            mock.patch.object(self.lbm, 'is_device_on_bridge',
+                              side_effect=lambda dev: dev == 'tap2'),
+            mock.patch.object(utils, 'execute')
+        ) as (ensure_fn, tap_fn, on_bridge_fn, exec_fn):
+            self.assertEqual(set(['1', '2', '4']),
+                             self.lbm.add_interfaces(ports))
+            self.assertEqual(2, ensure_fn.call_count)
+            self.assertEqual(1, exec_fn.call_count)
+            cmd = exec_fn.call_args[0][0]
+            self.assertEqual(['ip', '-force', '-batch', '-'], cmd)
+            lines = exec_fn.call_args[1]['process_input'].splitlines()
+            self.assertEqual(['link set dev tap1 master brqnet1',
+                              'link set dev tap4 master brqnet2'],
+                             sorted(lines))
+        self.assertIn('net1', self.lbm.network_map)
+        self.assertIn('net2', self.lbm.network_map)
+
+    def test_add_interfaces_batch_failure(self):
+        ports = [{'network_id': 'net1', 'network_type': p_const.TYPE_VLAN,
+                  'physical_network': 'physnet1', 'segmentation_id': 1,
+                  'port_id': port_id} for port_id in ('1', '2')]
+        with contextlib.nested(
+            mock.patch.object(self.lbm, 'ensure_network_bridge',
+                              return_value=True),
+            mock.patch.object(self.lbm, 'get_tap_devices',
+                              return_value=set(['tap1', 'tap2'])),
+            mock.patch.object(self.lbm, 'is_device_on_bridge',
+                              return_value=False),
+            mock.patch.object(self.lbm, 'execute_batch',
+                              side_effect=RuntimeError),
+            mock.patch.object(self.lbm, 'add_tap_interface',
+                              side_effect=[True, False])
+        ) as (ensure_fn, tap_fn, on_bridge_fn, batch_fn, add_tap_fn):
+            self.assertEqual(set(['1']), self.lbm.add_interfaces(ports))
+            add_tap_fn.assert_has_calls([
+                mock.call('net1', p_const.TYPE_VLAN, 'physnet1', 1, 'tap1'),
+                mock.call('net1', p_const.TYPE_VLAN, 'physnet1', 1, 'tap2')])
+
+    def test_add_interfaces_bridge_failure(self):
+        ports = [{'network_id': 'net1', 'network_type': p_const.TYPE_VLAN,
+                  'physical_network': 'physnet1', 'segmentation_id': 1,
+                  'port_id': '1'}]
+        with contextlib.nested(
+            mock.patch.object(self.lbm, 'ensure_network_bridge',
+                              return_value=False),
+            mock.patch.object(self.lbm, 'get_tap_devices',
+                              return_value=set(['tap1'])),
+            mock.patch.object(utils, 'execute')
+        ) as (ensure_fn, tap_fn, exec_fn):
+            self.assertEqual(set(), self.lbm.add_interfaces(ports))
+            self.assertFalse(exec_fn.called)
+
     def test_delete_vlan_bridge(self):
         with contextlib.nested(
             mock.patch.object(self.lbm, "device_exists"),
@@ -651,6 +861,16 @@ class TestLinuxBridgeManager(base.BaseTestCase):
                               "removed": set(["dev3"])
                               })
 
+    def test_update_devices_from_events(self):
+        registered = set(["tap1", "tap2"])
+        self.assertIsNone(self.lbm.update_devices_from_events(
+            registered, [(True, "tap1"), (True, "tap3"), (False, "tap3")]))
+        self.assertEqual(self.lbm.update_devices_from_events(
+            registered, [(False, "tap1"), (True, "tap4")]),
+            {"current": set(["tap2", "tap4"]),
+             "added": set(["tap4"]),
+             "removed": set(["tap1"])})
+
     def _check_vxlan_support(self, expected, vxlan_module_supported,
                              vxlan_ucast_supported, vxlan_mcast_supported):
         with contextlib.nested(
@@ -962,6 +1182,70 @@ class TestLinuxBridgeRpcCallbacks(base.BaseTestCase):
             ]
             execute_fn.assert_has_calls(expected)
 
+    def test_fdb_add_batch(self):
+        cfg.CONF.set_override('batch_device_commands', True, 'AGENT')
+        fdb_entries = {'net_id':
+                       {'ports':
+                        {'agent_ip': [constants.FLOODING_ENTRY,
+                                      ['port_mac', 'port_ip'],
+                                      ['port_mac2', 'port_ip2']]},
+                        'network_type': 'vxlan',
+                        'segment_id': 1}}
+
+        with mock.patch.object(utils, 'execute',
+                               return_value='') as execute_fn:
+            self.lb_rpc.fdb_add(None, fdb_entries)
+
+            expected = [
+                mock.call(['bridge', 'fdb', 'show', 'dev', 'vxlan-1'],
+                          root_helper=self.root_helper),
+                mock.call(['ip', '-force', '-batch', '-'],
+                          root_helper=self.root_helper,
+                          process_input='neigh replace port_ip lladdr '
+                          'port_mac dev vxlan-1 nud permanent\n'
+                          'neigh replace port_ip2 lladdr port_mac2 dev '
+                          'vxlan-1 nud permanent\n',
+                          check_exit_code=False),
+                mock.call(['bridge', '-force', '-batch', '-'],
+                          root_helper=self.root_helper,
+                          process_input='fdb add %s dev vxlan-1 dst '
+                          'agent_ip\n'
+                          'fdb add port_mac dev vxlan-1 dst agent_ip\n'
+                          'fdb add port_mac2 dev vxlan-1 dst agent_ip\n'
+                          % constants.FLOODING_ENTRY[0],
+                          check_exit_code=False),
+            ]
+            self.assertEqual(expected, execute_fn.call_args_list)
+
+    def test_fdb_remove_batch(self):
+        cfg.CONF.set_override('batch_device_commands', True, 'AGENT')
+        fdb_entries = {'net_id':
+                       {'ports':
+                        {'agent_ip': [constants.FLOODING_ENTRY,
+                                      ['port_mac', 'port_ip']]},
+                        'network_type': 'vxlan',
+                        'segment_id': 1}}
+
+        with mock.patch.object(utils, 'execute',
+                               return_value='') as execute_fn:
+            self.lb_rpc.fdb_remove(None, fdb_entries)
+
+            expected = [
+                mock.call(['ip', '-force', '-batch', '-'],
+                          root_helper=self.root_helper,
+                          process_input='neigh del port_ip lladdr port_mac '
+                          'dev vxlan-1\n',
+                          check_exit_code=False),
+                mock.call(['bridge', '-force', '-batch', '-'],
+                          root_helper=self.root_helper,
+                          process_input='fdb del %s dev vxlan-1 dst '
+                          'agent_ip\n'
+                          'fdb del port_mac dev vxlan-1 dst agent_ip\n'
+                          % constants.FLOODING_ENTRY[0],
+                          check_exit_code=False),
+            ]
+            self.assertEqual(expected, execute_fn.call_args_list)
+
     def test_fdb_ignore(self):
         fdb_entries = {'net_id':
                        {'ports':
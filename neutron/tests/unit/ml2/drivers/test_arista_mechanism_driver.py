@@ -14,6 +14,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
 import mock
 from oslo.config import cfg
 
@@ -534,6 +536,92 @@ class NegativeRPCWrapperTestCase(base.BaseTestCase):
         self.assertRaises(arista_exc.AristaRpcError, drv.get_tenants)
 
 
+class EOSCommandBatcherTestCase(base.BaseTestCase):
+    """Test cases for the batching of the commands sent to EOS."""
+
+    def setUp(self):
+        super(EOSCommandBatcherTestCase, self).setUp()
+        self.send = mock.Mock()
+        self.batcher = arista.EOSCommandBatcher(self.send, 0.01, 2)
+
+    def _wait_all(self, queued_list):
+        threads = [threading.Thread(target=self.batcher.wait,
+                                    args=(queued,))
+                   for queued in queued_list[1:]]
+        for thread in threads:
+            thread.start()
+        self.batcher.wait(queued_list[0])
+        for thread in threads:
+            thread.join()
+
+    def test_commands_sent_in_order(self):
+        queued = [self.batcher.add(['tenant ten-1', 'exit']),
+                  self.batcher.add(['tenant ten-2', 'exit'],
+                                   ['tenant ten-2 logged', 'exit'])]
+        self._wait_all(queued)
+        self.send.assert_called_once_with(
+            [['tenant ten-1', 'exit'], ['tenant ten-2', 'exit']],
+            [['tenant ten-1', 'exit'], ['tenant ten-2 logged', 'exit']])
+
+    def test_batches_limited_in_size(self):
+        queued = [self.batcher.add(['tenant ten-%d' % i]) for i in range(3)]
+        self._wait_all(queued)
+        self.assertEqual(
+            [mock.call([['tenant ten-0'], ['tenant ten-1']],
+                       [['tenant ten-0'], ['tenant ten-1']]),
+             mock.call([['tenant ten-2']], [['tenant ten-2']])],
+            self.send.call_args_list)
+
+    def test_error_raised_to_all_callers(self):
+        self.send.side_effect = arista_exc.AristaRpcError(msg='error')
+        first = self.batcher.add(['tenant ten-1'])
+        second = self.batcher.add(['tenant ten-2'])
+        self.assertRaises(arista_exc.AristaRpcError,
+                          self.batcher.wait, first)
+        self.assertRaises(arista_exc.AristaRpcError,
+                          self.batcher.wait, second)
+        self.assertEqual(1, self.send.call_count)
+
+
+class BatchedRPCWrapperTestCase(base.BaseTestCase):
+    """Test cases for the RPC wrapper with command batching enabled."""
+
+    def setUp(self):
+        super(BatchedRPCWrapperTestCase, self).setUp()
+        setup_valid_config()
+        cfg.CONF.set_override('command_batch_window', 0.01, 'ml2_arista')
+        self.addCleanup(cfg.CONF.clear_override, 'command_batch_window',
+                        'ml2_arista')
+        self.drv = arista.AristaRPCWrapper()
+        self.drv._server = mock.MagicMock()
+
+    def test_deferred_commands_sent_together(self):
+        with self.drv.deferred_commands():
+            self.drv.delete_vm('ten-1', 'vm-1')
+            self.drv.delete_network('ten-1', 'net-1')
+            self.assertFalse(self.drv._server.runCmds.called)
+        prefix = ['enable', 'configure', 'management openstack',
+                  'region RegionOne']
+        cmds = (prefix + ['tenant ten-1', 'no vm id vm-1', 'exit', 'exit',
+                          'end'] +
+                prefix + ['tenant ten-1', 'no network id net-1', 'exit',
+                          'exit', 'end'])
+        self.drv._server.runCmds.assert_called_once_with(version=1, cmds=cmds)
+
+    def test_deferred_commands_error(self):
+        self.drv._server.runCmds.side_effect = Exception('server error')
+
+        def delete_vm():
+            with self.drv.deferred_commands():
+                self.drv.delete_vm('ten-1', 'vm-1')
+
+        self.assertRaises(arista_exc.AristaRpcError, delete_vm)
+
+    def test_commands_not_deferred(self):
+        self.drv.delete_vm('ten-1', 'vm-1')
+        self.assertEqual(1, self.drv._server.runCmds.call_count)
+
+
 class RealNetStorageAristaDriverTestCase(base.BaseTestCase):
     """Main test cases for Arista Mechanism driver.
 
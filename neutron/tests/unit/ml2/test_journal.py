@@ -0,0 +1,159 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron import context
+import neutron.db.api as db
+from neutron.plugins.ml2.common import exceptions as ml2_exc
+from neutron.plugins.ml2 import config  # noqa
+from neutron.plugins.ml2 import journal
+from neutron.plugins.ml2 import managers
+from neutron.plugins.ml2 import models
+from neutron.tests import base
+
+
+class JournalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(JournalTestCase, self).setUp()
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        cfg.CONF.set_override('journal_retry_interval', 0, group='ml2')
+        cfg.CONF.set_override('journal_max_retries', 1, group='ml2')
+        self.addCleanup(cfg.CONF.reset)
+        mock.patch('neutron.manager.NeutronManager.get_plugin').start()
+        self.addCleanup(mock.patch.stopall)
+        self.driver = mock.Mock()
+        self.driver.name = 'test'
+        self.journal = journal.Journal({'test': self.driver})
+        self.context = context.get_admin_context()
+        self.calls = []
+        self.driver.obj.update_network_postcommit.side_effect = (
+            lambda context: self.calls.append(context.current['name']))
+
+    def _record(self, network_id, name):
+        network_context = journal.JournalNetworkContext(
+            None, self.context,
+            {'current': {'id': network_id, 'name': name},
+             'original': None,
+             'segments': [{'network_type': 'local'}]})
+        self.journal.record(network_context, 'update_network_postcommit')
+
+    def _entries(self):
+        return self.context.session.query(models.JournalEntry).all()
+
+    def test_process_dispatches_rebuilt_context(self):
+        self._record('net1', 'a')
+        self.assertEqual(1, self.journal.process())
+        network_context = (
+            self.driver.obj.update_network_postcommit.call_args[0][0])
+        self.assertEqual({'id': 'net1', 'name': 'a'}, network_context.current)
+        self.assertEqual([{'network_type': 'local'}],
+                         network_context.network_segments)
+        self.assertEqual([], self._entries())
+
+    def test_process_keeps_order_per_resource(self):
+        self._record('net1', 'a')
+        self._record('net1', 'b')
+        self._record('net2', 'c')
+        self.assertEqual(2, self.journal.process())
+        self.assertEqual(1, self.journal.process())
+        self.assertEqual(['a', 'c', 'b'], self.calls)
+
+    def test_failed_entry_is_retried_before_later_ones(self):
+        self.driver.obj.update_network_postcommit.side_effect = [
+            Exception(), None, None]
+        self._record('net1', 'a')
+        self._record('net1', 'b')
+        self.journal.process()
+        entries = self._entries()
+        self.assertEqual([journal.PENDING, journal.PENDING],
+                         [entry.state for entry in entries])
+        self.assertEqual(1, entries[0].retries)
+        self.journal.process()
+        self.journal.process()
+        names = [call[0][0].current['name'] for call in
+                 self.driver.obj.update_network_postcommit.call_args_list]
+        self.assertEqual(['a', 'a', 'b'], names)
+
+    def test_entry_failed_after_max_retries(self):
+        self.driver.obj.update_network_postcommit.side_effect = Exception()
+        self._record('net1', 'a')
+        self.journal.process()
+        self.journal.process()
+        self.assertEqual([journal.FAILED],
+                         [entry.state for entry in self._entries()])
+        self.assertEqual(0, self.journal.process())
+
+    def test_port_context_cannot_be_bound(self):
+        port_context = journal.JournalPortContext(
+            None, self.context, {'current': {'id': 'port1'},
+                                 'original': None})
+        self.assertRaises(ml2_exc.MechanismDriverError,
+                          port_context.set_binding, 'segment1', 'ovs', {})
+
+    def test_get_stats(self):
+        self._record('net1', 'a')
+        self._record('net2', 'b')
+        stats = journal.get_stats(self.context.session)
+        self.assertEqual(2, stats['depth'])
+        self.assertEqual(0, stats['failed'])
+        self.assertTrue(stats['lag'] >= 0)
+
+
+class MechanismManagerJournalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(MechanismManagerJournalTestCase, self).setUp()
+        with mock.patch('stevedore.named.NamedExtensionManager.names',
+                        return_value=[]):
+            with mock.patch('stevedore.named.NamedExtensionManager.__init__'):
+                with mock.patch.object(managers.MechanismManager,
+                                       '_register_mechanisms'):
+                    self.manager = managers.MechanismManager()
+        self.journaled = mock.Mock()
+        self.journaled.name = 'journaled'
+        self.journaled.obj.journal_postcommit = True
+        self.journaled.obj.native_bulk_support = True
+        self.direct = mock.Mock()
+        self.direct.name = 'direct'
+        self.direct.obj.journal_postcommit = False
+        self.direct.obj.native_bulk_support = True
+        self.manager.ordered_mech_drivers = [self.journaled, self.direct]
+        with mock.patch.object(journal.Journal, 'start'):
+            self.manager.initialize()
+        self.initialized_journal = self.manager.journal
+        self.manager.journal = mock.Mock(drivers={'journaled':
+                                                  self.journaled})
+
+    def test_initialize_journals_opted_in_drivers(self):
+        self.assertEqual({'journaled': self.journaled},
+                         self.initialized_journal.drivers)
+
+    def test_precommit_records_postcommit(self):
+        self.manager.create_network_precommit(mock.sentinel.context)
+        self.journaled.obj.create_network_precommit.assert_called_once_with(
+            mock.sentinel.context)
+        self.manager.journal.record.assert_called_once_with(
+            mock.sentinel.context, 'create_network_postcommit')
+
+    def test_postcommit_skips_journaled_driver(self):
+        self.manager.create_network_postcommit(mock.sentinel.context)
+        self.assertFalse(self.journaled.obj.create_network_postcommit.called)
+        self.direct.obj.create_network_postcommit.assert_called_once_with(
+            mock.sentinel.context)
+        self.manager.journal.wake.assert_called_once_with()
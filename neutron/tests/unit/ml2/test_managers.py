@@ -0,0 +1,96 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import event
+import mock
+from oslo.config import cfg
+
+from neutron.plugins.ml2.common import exceptions as ml2_exc
+from neutron.plugins.ml2 import config  # noqa
+from neutron.plugins.ml2 import managers
+from neutron.tests import base
+
+
+class MechanismManagerParallelTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(MechanismManagerParallelTestCase, self).setUp()
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('postcommit_timeout', 1, group='ml2')
+        with mock.patch('stevedore.named.NamedExtensionManager.names',
+                        return_value=[]):
+            with mock.patch('stevedore.named.NamedExtensionManager.__init__'):
+                with mock.patch.object(managers.MechanismManager,
+                                       '_register_mechanisms'):
+                    self.manager = managers.MechanismManager()
+        self.first = self._driver('first', True)
+        self.second = self._driver('second', True)
+        self.serial = self._driver('serial', False)
+        self.manager.ordered_mech_drivers = [self.first, self.serial,
+                                             self.second]
+        self.manager.initialize()
+
+    def _driver(self, name, parallel):
+        driver = mock.Mock()
+        driver.name = name
+        driver.obj.journal_postcommit = False
+        driver.obj.parallel_postcommit = parallel
+        driver.obj.native_bulk_support = True
+        return driver
+
+    def test_initialize(self):
+        self.assertEqual(set(['first', 'second']),
+                         self.manager.parallel_drivers)
+
+    def test_parallel_drivers_run_concurrently(self):
+        done = event.Event()
+        self.first.obj.create_network_postcommit.side_effect = (
+            lambda context: done.wait())
+        self.second.obj.create_network_postcommit.side_effect = (
+            lambda context: done.send())
+        self.manager.create_network_postcommit(mock.sentinel.context)
+        self.serial.obj.create_network_postcommit.assert_called_once_with(
+            mock.sentinel.context)
+        self.assertEqual(1, self.manager.driver_stats['first']['calls'])
+        self.assertEqual(0, self.manager.driver_stats['first']['failures'])
+
+    def test_precommit_is_not_parallel(self):
+        with mock.patch.object(self.manager, '_call_postcommit') as call:
+            self.manager.create_network_precommit(mock.sentinel.context)
+        self.assertFalse(call.called)
+        self.first.obj.create_network_precommit.assert_called_once_with(
+            mock.sentinel.context)
+
+    def test_timeout(self):
+        cfg.CONF.set_override('postcommit_driver_timeouts', {'first': 0.01},
+                              group='ml2')
+        self.first.obj.update_network_postcommit.side_effect = (
+            lambda context: eventlet.sleep(1))
+        self.assertRaises(ml2_exc.MechanismDriverError,
+                          self.manager.update_network_postcommit,
+                          mock.sentinel.context)
+        self.assertEqual(1, self.manager.driver_stats['first']['failures'])
+        self.assertTrue(self.second.obj.update_network_postcommit.called)
+
+    def test_parallel_drivers_waited_for_after_failure(self):
+        self.serial.obj.create_network_postcommit.side_effect = Exception()
+        self.assertRaises(ml2_exc.MechanismDriverError,
+                          self.manager.create_network_postcommit,
+                          mock.sentinel.context)
+        self.assertTrue(self.first.obj.create_network_postcommit.called)
+        # The failure stops the drivers not yet started
+        self.assertFalse(self.second.obj.create_network_postcommit.called)
+        self.assertEqual(1, self.manager.driver_stats['serial']['failures'])
@@ -14,10 +14,15 @@
 #    under the License.
 # @author: Kyle Mestery, Cisco Systems, Inc.
 
+import copy
+
+import mock
+
 from neutron.plugins.common import constants
 from neutron.plugins.ml2 import config as config
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2.drivers import mechanism_odl
+from neutron.tests import base
 from neutron.tests.unit import test_db_plugin as test_plugin
 
 PLUGIN_NAME = 'neutron.plugins.ml2.plugin.Ml2Plugin'
@@ -77,3 +82,66 @@ class OpenDaylightMechanismTestSubnetsV2(test_plugin.TestSubnetsV2,
 class OpenDaylightMechanismTestPortsV2(test_plugin.TestPortsV2,
                                        OpenDaylightTestCase):
     pass
+
+
+class OpenDaylightSyncTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(OpenDaylightSyncTestCase, self).setUp()
+        self.addCleanup(config.cfg.CONF.reset)
+        config.cfg.CONF.set_override('sync_page_size', 2, 'ml2_odl')
+        self.mech = mechanism_odl.OpenDaylightMechanismDriver()
+        self.mech.initialize()
+        self.sendjson = mock.patch.object(self.mech, 'sendjson').start()
+        self.addCleanup(mock.patch.stopall)
+        self.remote = {mechanism_odl.ODL_NETWORKS: [],
+                       mechanism_odl.ODL_SUBNETS: [],
+                       mechanism_odl.ODL_PORTS: []}
+        self.sendjson.side_effect = self._sendjson
+        self.context = mock.Mock()
+        self.networks = [{'id': 'net%d' % i, 'name': 'net%d' % i,
+                          'status': 'ACTIVE', 'subnets': []}
+                         for i in range(3)]
+        self.context._plugin.get_networks.side_effect = (
+            lambda dbcontext: copy.deepcopy(self.networks))
+        self.context._plugin.get_subnets.return_value = []
+        self.context._plugin.get_ports.return_value = []
+
+    def _sendjson(self, method, urlpath, obj, ignorecodes=[]):
+        if method == 'get':
+            response = mock.Mock()
+            response.json.return_value = {urlpath: self.remote[urlpath]}
+            return response
+
+    def _sync_full(self):
+        self.sendjson.reset_mock()
+        self.mech.out_of_sync = True
+        self.mech.sync_full(self.context)
+        return [call[0][:3] for call in self.sendjson.call_args_list
+                if call[0][0] != 'get']
+
+    def test_sync_full_creates_missing_in_pages(self):
+        self.remote[mechanism_odl.ODL_NETWORKS] = [{'id': 'net0'}]
+        self.assertEqual([('post', 'networks',
+                           {'networks': [{'id': 'net1', 'name': 'net1'},
+                                         {'id': 'net2', 'name': 'net2'}]})],
+                         self._sync_full())
+        self.assertFalse(self.mech.out_of_sync)
+
+    def test_sync_full_pages(self):
+        calls = self._sync_full()
+        self.assertEqual(2, len(calls))
+        self.assertEqual(('post', 'networks',
+                          {'network': [{'id': 'net2', 'name': 'net2'}]}),
+                         calls[1])
+
+    def test_sync_full_only_sends_changes(self):
+        self._sync_full()
+        self.remote[mechanism_odl.ODL_NETWORKS] = [
+            {'id': network['id']} for network in self.networks]
+        self.assertEqual([], self._sync_full())
+        self.networks[1]['name'] = 'renamed'
+        self.assertEqual([('put', 'networks/net1',
+                           {'network': {'name': 'renamed'}})],
+                         self._sync_full())
+        self.assertEqual([], self._sync_full())
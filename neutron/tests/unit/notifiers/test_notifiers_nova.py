@@ -15,6 +15,7 @@
 
 
 import mock
+from novaclient import exceptions as nova_exceptions
 from sqlalchemy.orm import attributes as sql_attr
 
 from oslo.config import cfg
@@ -212,7 +213,7 @@ class TestNovaNotify(base.BaseTestCase):
             nclient_create.return_value = [{'code': 404,
                                             'name': 'network-changed',
                                             'server_uuid': 'uuid'}]
-            self.nova_notifier.pending_events.append(
+            self.nova_notifier.queue_event(
                 {'name': 'network-changed', 'server_uuid': 'uuid'})
             self.nova_notifier.send_events()
 
@@ -223,7 +224,7 @@ class TestNovaNotify(base.BaseTestCase):
             nclient_create.return_value = [{'code': 200,
                                             'name': 'network-changed',
                                             'server_uuid': 'uuid'}]
-            self.nova_notifier.pending_events.append(
+            self.nova_notifier.queue_event(
                 {'name': 'network-changed', 'server_uuid': 'uuid'})
             self.nova_notifier.send_events()
 
@@ -236,9 +237,122 @@ class TestNovaNotify(base.BaseTestCase):
                                             'server_uuid': 'uuid'},
                                            {'code': 200,
                                             'name': 'network-changed',
-                                            'server_uuid': 'uuid'}]
-            self.nova_notifier.pending_events.append(
-                {'name': 'network-changed', 'server_uuid': 'uuid'})
-            self.nova_notifier.pending_events.append(
+                                            'server_uuid': 'uuid2'}]
+            self.nova_notifier.queue_event(
                 {'name': 'network-changed', 'server_uuid': 'uuid'})
+            self.nova_notifier.queue_event(
+                {'name': 'network-changed', 'server_uuid': 'uuid2'})
+            self.nova_notifier.send_events()
+            self.assertEqual(1, nclient_create.call_count)
+            self.assertEqual(2, len(nclient_create.call_args[0][0]))
+
+    def _port_event(self, port_id, status='completed',
+                    name=nova.VIF_PLUGGED):
+        return {'server_uuid': 'device-uuid', 'tag': port_id,
+                'name': name, 'status': status}
+
+    def test_queue_event_keeps_latest_status(self):
+        self.nova_notifier.queue_event(self._port_event('port1'))
+        self.nova_notifier.queue_event(self._port_event('port2'))
+        self.nova_notifier.queue_event(self._port_event('port1', 'failed'))
+        with mock.patch.object(
+            self.nova_notifier.nclient.server_external_events,
+                'create') as nclient_create:
+            nclient_create.return_value = []
             self.nova_notifier.send_events()
+        nclient_create.assert_called_once_with(
+            [self._port_event('port2'), self._port_event('port1', 'failed')])
+        self.assertEqual({'queued': 3, 'sent': 2, 'dropped': 0},
+                         self.nova_notifier.counters)
+
+    def test_queue_event_drops_oldest(self):
+        self.nova_notifier.pending_events.max_size = 2
+        for port_id in ('port1', 'port2', 'port3'):
+            self.nova_notifier.queue_event(self._port_event(port_id))
+        self.assertEqual(1, self.nova_notifier.counters['dropped'])
+        self.assertEqual([self._port_event('port2'),
+                          self._port_event('port3')],
+                         [event for seq, event in
+                          self.nova_notifier.pending_events.pop(10)])
+
+    def test_send_events_in_batches(self):
+        cfg.CONF.set_override('send_events_batch_size', 2)
+        for port_id in ('port1', 'port2', 'port3'):
+            self.nova_notifier.queue_event(self._port_event(port_id))
+        with mock.patch.object(
+            self.nova_notifier.nclient.server_external_events,
+                'create') as nclient_create:
+            nclient_create.return_value = []
+            self.nova_notifier.send_events()
+        nclient_create.assert_has_calls([
+            mock.call([self._port_event('port1'), self._port_event('port2')]),
+            mock.call([self._port_event('port3')])])
+        self.assertEqual(3, self.nova_notifier.counters['sent'])
+
+    def test_send_events_failure_is_retried_with_backoff(self):
+        self.nova_notifier.queue_event(self._port_event('port1'))
+        with mock.patch.object(
+            self.nova_notifier.nclient.server_external_events,
+                'create') as nclient_create:
+            nclient_create.side_effect = nova_exceptions.ClientException(500)
+            with mock.patch.object(nova.time, 'time', return_value=100):
+                self.nova_notifier.send_events()
+            # a newer event supersedes the one which failed
+            self.nova_notifier.queue_event(
+                self._port_event('port1', 'failed'))
+            with mock.patch.object(nova.time, 'time', return_value=103):
+                self.nova_notifier.send_events()
+            self.assertEqual(1, nclient_create.call_count)
+
+            nclient_create.side_effect = None
+            nclient_create.return_value = []
+            with mock.patch.object(nova.time, 'time', return_value=104):
+                self.nova_notifier.send_events()
+        nclient_create.assert_called_with(
+            [self._port_event('port1', 'failed')])
+        self.assertEqual(0, self.nova_notifier.send_failures)
+        self.assertEqual(0, len(self.nova_notifier.pending_events))
+
+    def test_send_events_not_found_is_dropped(self):
+        self.nova_notifier.queue_event(self._port_event('port1'))
+        with mock.patch.object(
+            self.nova_notifier.nclient.server_external_events,
+                'create') as nclient_create:
+            nclient_create.side_effect = nova_exceptions.NotFound(404)
+            self.nova_notifier.send_events()
+            self.assertEqual(0, len(self.nova_notifier.pending_events))
+            self.assertEqual(0, self.nova_notifier.send_failures)
+
+            nclient_create.side_effect = None
+            nclient_create.return_value = []
+            self.nova_notifier.queue_event(self._port_event('port2'))
+            self.nova_notifier.send_events()
+        nclient_create.assert_called_with([self._port_event('port2')])
+        self.assertEqual(0, len(self.nova_notifier.pending_events))
+
+    def test_send_events_client_error_is_dropped(self):
+        self.nova_notifier.queue_event(self._port_event('port1'))
+        with mock.patch.object(
+            self.nova_notifier.nclient.server_external_events,
+                'create') as nclient_create:
+            nclient_create.side_effect = nova_exceptions.BadRequest(400)
+            self.nova_notifier.send_events()
+        self.assertEqual(0, len(self.nova_notifier.pending_events))
+        self.assertEqual(0, self.nova_notifier.retry_at)
+
+    def test_send_events_dropped_after_max_retries(self):
+        cfg.CONF.set_override('send_events_max_retries', 1)
+        self.nova_notifier.queue_event(self._port_event('port1'))
+        with mock.patch.object(
+            self.nova_notifier.nclient.server_external_events,
+                'create') as nclient_create:
+            nclient_create.side_effect = nova_exceptions.ConnectionRefused()
+            with mock.patch.object(nova.time, 'time', return_value=100):
+                self.nova_notifier.send_events()
+            self.assertEqual(1, len(self.nova_notifier.pending_events))
+            with mock.patch.object(nova.time, 'time', return_value=200):
+                self.nova_notifier.send_events()
+        self.assertEqual(2, nclient_create.call_count)
+        self.assertEqual(0, len(self.nova_notifier.pending_events))
+        self.assertEqual(1, self.nova_notifier.counters['dropped'])
+        self.assertEqual(0, self.nova_notifier.send_failures)
@@ -19,6 +19,11 @@ import mock
 def patch_fake_oflib_of():
     ryu_mod = mock.Mock()
     ryu_base_mod = ryu_mod.base
+    ryu_controller_mod = ryu_mod.controller
+    ryu_controller_handler = ryu_controller_mod.handler
+    ryu_controller_handler.set_ev_cls = lambda *args, **kwargs: (
+        lambda f: f)
+    ryu_controller_ofp_event = ryu_controller_mod.ofp_event
     ryu_lib_mod = ryu_mod.lib
     ryu_lib_hub = ryu_lib_mod.hub
     ryu_ofproto_mod = ryu_mod.ofproto
@@ -34,6 +39,10 @@ def patch_fake_oflib_of():
     return mock.patch.dict('sys.modules',
                            {'ryu': ryu_mod,
                             'ryu.base': ryu_base_mod,
+                            'ryu.controller': ryu_controller_mod,
+                            'ryu.controller.handler': ryu_controller_handler,
+                            'ryu.controller.ofp_event':
+                            ryu_controller_ofp_event,
                             'ryu.lib': ryu_lib_mod,
                             'ryu.lib.hub': ryu_lib_hub,
                             'ryu.ofproto': ryu_ofproto_mod,
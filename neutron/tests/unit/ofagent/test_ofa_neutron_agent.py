@@ -193,6 +193,62 @@ class TestOFANeutronAgentOVSBridge(OFAAgentTestCase):
             with testtools.ExpectedException(SystemExit):
                 self.ovs.setup_ofp()
 
+    def _setup_datapath(self):
+        self.ovs.datapath = mock.Mock()
+        self.ovs.ofparser = self.ovs.datapath.ofproto_parser
+        xids = iter(range(1, 100))
+
+        def set_xid(msg):
+            msg.xid = next(xids)
+        self.ovs.datapath.set_xid.side_effect = set_xid
+
+    def test_send_msg(self):
+        msg = mock.Mock()
+        with mock.patch.object(self.mod_agent.ryu_api,
+                               'send_msg') as send_msg:
+            self.ovs.send_msg(msg)
+        send_msg.assert_called_once_with(self.ryuapp, msg)
+
+    def test_flush_flows(self):
+        self._setup_datapath()
+        msgs = [mock.Mock(), mock.Mock()]
+        with mock.patch.object(self.mod_agent.ryu_api,
+                               'send_msg') as send_msg:
+            self.ovs.defer_flows()
+            for msg in msgs:
+                self.ovs.send_msg(msg)
+            self.assertFalse(send_msg.called)
+            self.assertEqual([], self.ovs.flush_flows())
+        self.ovs.datapath.send_msg.assert_has_calls(
+            [mock.call(msg) for msg in msgs])
+        send_msg.assert_called_once_with(
+            self.ryuapp, self.ovs.ofparser.OFPBarrierRequest.return_value,
+            reply_cls=self.ovs.ofparser.OFPBarrierReply)
+        self.assertIsNone(self.ovs.deferred_msgs)
+
+    def test_flush_flows_nothing_queued(self):
+        with mock.patch.object(self.mod_agent.ryu_api,
+                               'send_msg') as send_msg:
+            self.ovs.defer_flows()
+            self.assertEqual([], self.ovs.flush_flows())
+        self.assertFalse(send_msg.called)
+
+    def test_flush_flows_collects_errors(self):
+        self._setup_datapath()
+        msgs = [mock.Mock(), mock.Mock()]
+        error = mock.Mock(datapath=self.ovs.datapath, xid=2)
+        other_error = mock.Mock(datapath=mock.Mock(), xid=1)
+
+        def barrier(app, msg, reply_cls=None):
+            self.ovs.flow_error(other_error)
+            self.ovs.flow_error(error)
+        with mock.patch.object(self.mod_agent.ryu_api, 'send_msg',
+                               side_effect=barrier):
+            self.ovs.defer_flows()
+            for msg in msgs:
+                self.ovs.send_msg(msg)
+            self.assertEqual([(msgs[1], error)], self.ovs.flush_flows())
+
 
 class TestOFANeutronAgent(OFAAgentTestCase):
 
@@ -254,6 +310,64 @@ class TestOFANeutronAgent(OFAAgentTestCase):
                 self.agent.port_bound(port, net_uuid, 'local', None, None)
         self.assertEqual(ryu_send_msg_func.called, ofport != -1)
 
+    def test_deferred_flows(self):
+        br = self.agent.int_br
+        br.datapath = mock.Mock()
+        msg = mock.Mock()
+        msg.datapath = br.datapath
+        other_msg = mock.Mock()
+        with contextlib.nested(
+            mock.patch.object(br, 'flush_flows'),
+            mock.patch.object(self.mod_agent.ryu_api, 'send_msg')
+        ) as (flush_flows, send_msg):
+            with self.agent.deferred_flows():
+                with self.agent.deferred_flows():
+                    self.agent.ryu_send_msg(msg)
+                self.assertFalse(flush_flows.called)
+                self.agent.ryu_send_msg(other_msg)
+            self.assertEqual([msg], br.deferred_msgs)
+            flush_flows.assert_called_once_with()
+            send_msg.assert_called_once_with(self.ryuapp, other_msg)
+            self.assertEqual([], self.agent.deferred_bridges)
+
+    def test_deferred_flows_flushes_on_error(self):
+        with mock.patch.object(self.agent.int_br,
+                               'flush_flows') as flush_flows:
+            with testtools.ExpectedException(ValueError):
+                with self.agent.deferred_flows():
+                    raise ValueError()
+            flush_flows.assert_called_once_with()
+
+    def test_deferred_flows_failure_requests_resync(self):
+        br = self.agent.int_br
+        with mock.patch.object(br, 'flush_flows', return_value=[]):
+            with self.agent.deferred_flows():
+                pass
+        self.assertFalse(self.agent.flows_failed)
+        with mock.patch.object(br, 'flush_flows',
+                               return_value=[(mock.Mock(), mock.Mock())]):
+            with self.agent.deferred_flows():
+                pass
+        self.assertTrue(self.agent.flows_failed)
+        self.agent.flows_failed = False
+        with mock.patch.object(br, 'flush_flows', side_effect=ValueError):
+            with self.agent.deferred_flows():
+                pass
+        self.assertTrue(self.agent.flows_failed)
+
+    def test_treat_devices_added_batches_flows(self):
+        with contextlib.nested(
+            mock.patch.object(self.agent, '_get_bridges',
+                              return_value=[self.agent.int_br]),
+            mock.patch.object(self.agent.int_br, 'flush_flows'),
+            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+                              return_value={'device': 'dev'}),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
+                              return_value=None)
+        ) as (get_bridges, flush_flows, get_dev_fn, get_vif_func):
+            self.agent.treat_devices_added(['123', '456'])
+            flush_flows.assert_called_once_with()
+
     def test_port_bound_deletes_flows_for_valid_ofport(self):
         self._mock_port_bound(ofport=1)
 
@@ -569,6 +683,29 @@ class TestOFANeutronAgent(OFAAgentTestCase):
                                             constants.DEFAULT_OVSDBMON_RESPAWN)
         mock_loop.assert_called_once_with(polling_manager=fake_pm.__enter__())
 
+    def test_ovsdb_monitor_loop_resyncs_on_flow_errors(self):
+        class LoopDone(Exception):
+            pass
+
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 1:
+                # a batch of flows was rejected during the first iteration
+                self.agent.flows_failed = True
+            else:
+                raise LoopDone()
+
+        polling_manager = mock.Mock()
+        polling_manager.is_polling_required = False
+        with mock.patch.object(self.mod_agent.time, 'sleep',
+                               side_effect=sleep):
+            with testtools.ExpectedException(LoopDone):
+                self.agent.ovsdb_monitor_loop(polling_manager)
+        self.assertEqual(2, polling_manager.force_polling.call_count)
+        self.assertFalse(self.agent.flows_failed)
+
     def test_setup_tunnel_port_error_negative(self):
         with contextlib.nested(
             mock.patch.object(self.agent.tun_br, 'add_tunnel_port',
@@ -29,6 +29,7 @@ from neutron.agent import l3_agent
 from neutron.agent.linux import ip_lib
 from neutron.common import config as base_config
 from neutron import context
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.plugins.common import constants
 from neutron.services.firewall.agents.l3reference import firewall_l3_agent
 from neutron.tests import base
@@ -247,7 +248,7 @@ class TestFwaasL3AgentRpcCallback(base.BaseTestCase):
             mock_driver_update_firewall.return_value = True
             ctx = mock.sentinel.context
             mock_Context.return_value = ctx
-            mock_get_router_info_list_for_tenant.return_value = routers
+            mock_get_router_info_list_for_tenant.return_value = [ri]
             mock_get_firewalls_for_tenant.return_value = fake_firewall_list
 
             self.api._process_router_add(ri)
@@ -255,8 +256,8 @@ class TestFwaasL3AgentRpcCallback(base.BaseTestCase):
                 routers,
                 ri.router['tenant_id'])
             mock_get_firewalls_for_tenant.assert_called_once_with(ctx)
-            mock_driver_update_firewall.assert_called_once(
-                routers,
+            mock_driver_update_firewall.assert_called_once_with(
+                [ri],
                 fake_firewall_list[0])
 
             mock_set_firewall_status.assert_called_once_with(
@@ -307,6 +308,145 @@ class TestFwaasL3AgentRpcCallback(base.BaseTestCase):
                 ctx,
                 fake_firewall_list[0]['id'])
 
+    def _prepare_sync_data(self, fw_status=constants.ACTIVE):
+        fake_firewall = {'id': 0, 'tenant_id': 1,
+                         'status': fw_status,
+                         'admin_state_up': True,
+                         'firewall_rule_list': []}
+        ri = mock.Mock()
+        ri.router = {'id': 1111, 'tenant_id': 1}
+        self.api.router_info = {1111: ri}
+        self.api.fwaas_enabled = True
+        return fake_firewall, ri
+
+    def test_process_services_sync(self):
+        fake_firewall, ri = self._prepare_sync_data(constants.PENDING_UPDATE)
+        with contextlib.nested(
+            mock.patch.object(self.api, '_get_router_info_lists'),
+            mock.patch.object(self.api.fwplugin_rpc,
+                              'get_firewalls_for_tenants'),
+            mock.patch.object(self.api, '_invoke_driver_for_sync_from_plugin')
+        ) as (mock_get_router_info_lists,
+              mock_get_firewalls_for_tenants,
+              mock_invoke_driver):
+            mock_get_router_info_lists.return_value = {1: [ri]}
+            mock_get_firewalls_for_tenants.return_value = [fake_firewall]
+            ctx = mock.sentinel.context
+
+            self.api.services_sync = True
+            self.api.process_services_sync(ctx)
+
+            mock_get_router_info_lists.assert_called_once_with([ri.router])
+            mock_get_firewalls_for_tenants.assert_called_once_with(ctx, [1])
+            mock_invoke_driver.assert_called_once_with(
+                ctx, [ri], fake_firewall)
+            self.assertFalse(self.api.services_sync)
+
+    def test_process_services_sync_skips_applied_firewall(self):
+        fake_firewall, ri = self._prepare_sync_data()
+        with contextlib.nested(
+            mock.patch.object(self.api, '_get_router_info_lists'),
+            mock.patch.object(self.api.fwplugin_rpc,
+                              'get_firewalls_for_tenants'),
+            mock.patch.object(self.api.fwaas_driver, 'update_firewall'),
+            mock.patch.object(self.api.fwplugin_rpc, 'set_firewall_status')
+        ) as (mock_get_router_info_lists,
+              mock_get_firewalls_for_tenants,
+              mock_driver_update_firewall,
+              mock_set_firewall_status):
+            mock_get_router_info_lists.return_value = {1: [ri]}
+            mock_get_firewalls_for_tenants.return_value = [fake_firewall]
+            ctx = mock.sentinel.context
+
+            self.api.process_services_sync(ctx)
+            self.api.process_services_sync(ctx)
+            mock_driver_update_firewall.assert_called_once_with(
+                [ri], fake_firewall)
+
+            changed_firewall = dict(fake_firewall,
+                                    firewall_rule_list=[{'id': 'fwr1'}])
+            mock_get_firewalls_for_tenants.return_value = [changed_firewall]
+            self.api.process_services_sync(ctx)
+            self.assertEqual(2, mock_driver_update_firewall.call_count)
+            self.assertEqual(2, mock_set_firewall_status.call_count)
+
+    def test_process_services_sync_reapplies_on_readded_router(self):
+        fake_firewall, ri = self._prepare_sync_data()
+        new_ri = mock.Mock()
+        new_ri.router = ri.router
+        with contextlib.nested(
+            mock.patch.object(self.api, '_get_router_info_lists'),
+            mock.patch.object(self.api.fwplugin_rpc,
+                              'get_firewalls_for_tenants'),
+            mock.patch.object(self.api.fwplugin_rpc,
+                              'get_firewalls_for_tenant',
+                              side_effect=rpc_common.RemoteError('Exception')),
+            mock.patch.object(self.api.fwaas_driver, 'update_firewall'),
+            mock.patch.object(self.api.fwplugin_rpc, 'set_firewall_status')
+        ) as (mock_get_router_info_lists,
+              mock_get_firewalls_for_tenants,
+              mock_get_firewalls_for_tenant,
+              mock_driver_update_firewall,
+              mock_set_firewall_status):
+            mock_get_router_info_lists.return_value = {1: [ri]}
+            mock_get_firewalls_for_tenants.return_value = [fake_firewall]
+            ctx = mock.sentinel.context
+            self.api.process_services_sync(ctx)
+
+            # the router is removed and added back, and the fetch done
+            # on add fails so the firewall is left to the next sync
+            self.api.process_router_remove(ri)
+            self.api.router_info = {1111: new_ri}
+            with mock.patch.object(self.api,
+                                   '_get_router_info_list_for_tenant',
+                                   return_value=[new_ri]):
+                self.api.process_router_add(new_ri)
+            self.assertTrue(self.api.services_sync)
+
+            mock_get_router_info_lists.return_value = {1: [new_ri]}
+            self.api.process_services_sync(ctx)
+            mock_driver_update_firewall.assert_has_calls([
+                mock.call([ri], fake_firewall),
+                mock.call([new_ri], fake_firewall)])
+
+    def test_process_services_sync_no_routers(self):
+        self.api.router_info = {}
+        self.api.fwaas_enabled = True
+        with contextlib.nested(
+            mock.patch.object(self.api, '_get_router_info_lists',
+                              return_value={}),
+            mock.patch.object(self.api.fwplugin_rpc,
+                              'get_firewalls_for_tenants')
+        ) as (mock_get_router_info_lists, mock_get_firewalls_for_tenants):
+            self.api.process_services_sync(mock.sentinel.context)
+            self.assertFalse(mock_get_firewalls_for_tenants.called)
+
+    def test_process_services_sync_old_plugin(self):
+        self.api.fwaas_enabled = True
+        with contextlib.nested(
+            mock.patch.object(self.api, '_sync_firewalls'),
+            mock.patch.object(self.api, '_sync_firewalls_by_tenant')
+        ) as (mock_sync, mock_sync_by_tenant):
+            mock_sync.side_effect = rpc_common.RemoteError(
+                'UnsupportedRpcVersion')
+            ctx = mock.sentinel.context
+
+            self.api.process_services_sync(ctx)
+            self.api.process_services_sync(ctx)
+
+            mock_sync.assert_called_once_with(ctx)
+            self.assertEqual(2, mock_sync_by_tenant.call_count)
+            self.assertFalse(self.api.bulk_sync_supported)
+            self.assertFalse(self.api.services_sync)
+
+    def test_process_services_sync_failure(self):
+        self.api.fwaas_enabled = True
+        with mock.patch.object(self.api, '_sync_firewalls') as mock_sync:
+            mock_sync.side_effect = rpc_common.RemoteError('Exception')
+            self.api.process_services_sync(mock.sentinel.context)
+            self.assertTrue(self.api.bulk_sync_supported)
+            self.assertTrue(self.api.services_sync)
+
     def _prepare_router_data(self, use_namespaces):
         router = {'id': str(uuid.uuid4()), 'tenant_id': str(uuid.uuid4())}
         return l3_agent.RouterInfo(router['id'], self.conf.root_helper,
@@ -382,6 +522,24 @@ class TestFwaasL3AgentRpcCallback(base.BaseTestCase):
                 ri.router['tenant_id'])
             self.assertEqual(ri_expected, router_info_list)
 
+    def test_get_router_info_lists(self):
+        self.conf.set_override('use_namespaces', True)
+        ri1 = self._prepare_router_data(use_namespaces=True)
+        ri2 = self._prepare_router_data(use_namespaces=True)
+        ri3 = self._prepare_router_data(use_namespaces=True)
+        ri2.router['tenant_id'] = ri1.router['tenant_id']
+        self.api.router_info = dict((ri.router_id, ri)
+                                    for ri in (ri1, ri2, ri3))
+        with mock.patch.object(ip_lib.IPWrapper,
+                               'get_namespaces') as mock_get_namespaces:
+            mock_get_namespaces.return_value = [ri1.ns_name(), ri2.ns_name()]
+            router_info_lists = self.api._get_router_info_lists(
+                [ri1.router, ri2.router, ri3.router])
+            self.assertEqual({ri1.router['tenant_id']: [ri1, ri2]},
+                             router_info_lists)
+            mock_get_namespaces.assert_called_once_with(
+                self.conf.root_helper)
+
     def test_get_router_info_list_router_without_router_info(self):
         self._get_router_info_list_router_without_router_info_helper(
             rtr_with_ri=False)
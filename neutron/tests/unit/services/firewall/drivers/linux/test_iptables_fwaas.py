@@ -217,3 +217,75 @@ class IptablesFwaasTestCase(base.BaseTestCase):
                  call.add_chain('fwaas-default-policy'),
                  call.add_rule('fwaas-default-policy', '-j DROP')]
         apply_list[0].iptables_manager.ipv4['filter'].assert_has_calls(calls)
+
+    def _fake_rule(self, action='allow', protocol='tcp', dport=None,
+                   src=None, dst=None, ip_version=4, enabled=True):
+        return {'enabled': enabled,
+                'action': action,
+                'ip_version': ip_version,
+                'protocol': protocol,
+                'destination_port': dport,
+                'source_ip_address': src,
+                'destination_ip_address': dst}
+
+    def _compile(self, rules, ver=fwaas.IPV4):
+        return [self.firewall._convert_fwaas_to_iptables_rule(rule)
+                for rule in self.firewall._compile_rules(rules, ver)]
+
+    def test_compile_rules_folds_ports(self):
+        rules = [self._fake_rule(dport='80'),
+                 self._fake_rule(dport='443'),
+                 self._fake_rule(dport='8000:8080'),
+                 self._fake_rule(dport='81'),
+                 self._fake_rule(dport='22', protocol='udp')]
+        self.assertEqual(
+            ['-p tcp -m multiport --dports 80:81,443,8000:8080    -j ACCEPT',
+             '-p udp --dport 22    -j ACCEPT'],
+            self._compile(rules))
+
+    def test_compile_rules_limits_multiport(self):
+        rules = [self._fake_rule(dport=str(port))
+                 for port in range(1000, 1040, 2)]
+        compiled = self._compile(rules)
+        self.assertEqual(2, len(compiled))
+        self.assertIn('--dports %s ' % ','.join(
+            str(port) for port in range(1000, 1030, 2)), compiled[0])
+        self.assertIn('--dports %s ' % ','.join(
+            str(port) for port in range(1030, 1040, 2)), compiled[1])
+
+    def test_compile_rules_merges_addresses(self):
+        rules = [self._fake_rule(src='10.0.0.0/25'),
+                 self._fake_rule(src='10.0.0.128/25'),
+                 self._fake_rule(src='10.0.1.5'),
+                 self._fake_rule(src='10.0.0.0/25'),
+                 self._fake_rule(protocol='icmp', dst='20.0.0.1'),
+                 self._fake_rule(protocol='icmp')]
+        self.assertEqual(['-p tcp   -s 10.0.0.0/24  -j ACCEPT',
+                          '-p tcp   -s 10.0.1.5/32  -j ACCEPT',
+                          '-p icmp     -j ACCEPT'],
+                         self._compile(rules))
+
+    def test_compile_rules_keeps_action_order(self):
+        rules = [self._fake_rule(dport='80'),
+                 self._fake_rule(action='deny', dport='22'),
+                 self._fake_rule(dport='22'),
+                 self._fake_rule(dport='443'),
+                 self._fake_rule(dport='8080', enabled=False),
+                 self._fake_rule(dport='53', ip_version=6)]
+        self.assertEqual(['-p tcp --dport 80    -j ACCEPT',
+                          '-p tcp --dport 22    -j DROP',
+                          '-p tcp -m multiport --dports 22,443    -j ACCEPT'],
+                         self._compile(rules))
+        self.assertEqual(['-p tcp --dport 53    -j ACCEPT'],
+                         self._compile(rules, fwaas.IPV6))
+
+    def test_setup_firewall_applies_after_all_routers(self):
+        apply_list = self._fake_apply_list(router_count=2)
+        firewall = self._fake_firewall_no_rule()
+        apply_list[1].iptables_manager.ipv4['filter'].add_chain.side_effect = (
+            RuntimeError)
+        self.assertRaises(fwaas.fw_ext.FirewallInternalDriverError,
+                          self.firewall.update_firewall,
+                          apply_list, firewall)
+        for router_info in apply_list:
+            self.assertFalse(router_info.iptables_manager.apply.called)
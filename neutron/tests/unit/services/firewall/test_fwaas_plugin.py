@@ -131,6 +131,53 @@ class TestFirewallCallbacks(test_db_firewall.FirewallPluginDbTestCase):
                     self._compare_firewall_rule_lists(
                         fwp_id, fr, res[0]['firewall_rule_list'])
 
+    def test_get_firewalls_for_tenants(self):
+        tenant_id = 'test-tenant'
+        ctx = context.Context('', tenant_id)
+        with contextlib.nested(self.firewall_rule(name='fwr1',
+                                                  tenant_id=tenant_id),
+                               self.firewall_rule(name='fwr2',
+                                                  tenant_id=tenant_id)
+                               ) as fr:
+            with self.firewall_policy(tenant_id=tenant_id) as fwp:
+                fwp_id = fwp['firewall_policy']['id']
+                # reversed so the rule order differs from creation order
+                fw_rule_ids = [r['firewall_rule']['id'] for r in fr][::-1]
+                data = {'firewall_policy':
+                        {'firewall_rules': fw_rule_ids}}
+                req = self.new_update_request('firewall_policies', data,
+                                              fwp_id)
+                req.get_response(self.ext_api)
+                with self.firewall(firewall_policy_id=fwp_id,
+                                   tenant_id=tenant_id,
+                                   admin_state_up=
+                                   test_db_firewall.ADMIN_STATE_UP) as fw:
+                    fw_id = fw['firewall']['id']
+                    res = self.callbacks.get_firewalls_for_tenants(
+                        ctx, tenant_ids=[tenant_id, 'other-tenant'],
+                        host='dummy')
+                    fw_rules = (
+                        self.plugin._make_firewall_dict_with_rules(ctx,
+                                                                   fw_id)
+                    )
+                    self.assertEqual([fw_rules], res)
+                    self.assertEqual(
+                        fw_rule_ids,
+                        [r['id'] for r in res[0]['firewall_rule_list']])
+                    self.assertEqual(
+                        [], self.callbacks.get_firewalls_for_tenants(
+                            ctx, tenant_ids=['other-tenant'], host='dummy'))
+
+    def test_get_firewalls_for_tenants_without_policy(self):
+        tenant_id = 'test-tenant'
+        ctx = context.Context('', tenant_id)
+        with self.firewall(firewall_policy_id=None, tenant_id=tenant_id,
+                           admin_state_up=test_db_firewall.ADMIN_STATE_UP):
+            res = self.callbacks.get_firewalls_for_tenants(
+                ctx, tenant_ids=[tenant_id], host='dummy')
+            self.assertEqual(1, len(res))
+            self.assertEqual([], res[0]['firewall_rule_list'])
+
     def test_get_firewall_for_tenant_without_rules(self):
         tenant_id = 'test-tenant'
         ctx = context.Context('', tenant_id)
@@ -20,6 +20,7 @@ import contextlib
 
 import mock
 
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.plugins.common import constants
 from neutron.services.loadbalancer.agent import agent_manager as manager
 from neutron.tests import base
@@ -31,6 +32,8 @@ class TestManager(base.BaseTestCase):
 
         mock_conf = mock.Mock()
         mock_conf.device_driver = ['devdriver']
+        mock_conf.stats_workers = 4
+        mock_conf.resync_workers = 4
 
         self.mock_importer = mock.patch.object(manager, 'importutils').start()
 
@@ -67,11 +70,64 @@ class TestManager(base.BaseTestCase):
             self.assertFalse(sync.called)
 
     def test_collect_stats(self):
+        self.driver_mock.get_stats.side_effect = lambda pool_id: {
+            'bytes_in': pool_id, 'members': {'m1': {'status': 'ACTIVE'}}}
         self.mgr.collect_stats(mock.Mock())
+        self.rpc_mock.update_pools_stats.assert_called_once_with({
+            '1': {'bytes_in': '1', 'members': {'m1': {'status': 'ACTIVE'}}},
+            '2': {'bytes_in': '2', 'members': {'m1': {'status': 'ACTIVE'}}}
+        })
+        self.assertFalse(self.rpc_mock.update_pool_stats.called)
+
+    def test_collect_stats_sends_deltas(self):
+        stats = {'1': {'bytes_in': 1, 'bytes_out': 1,
+                       'members': {'m1': {'status': 'ACTIVE'},
+                                   'm2': {'status': 'ACTIVE'}}},
+                 '2': {'bytes_in': 2, 'bytes_out': 2}}
+        self.driver_mock.get_stats.side_effect = lambda pool_id: dict(
+            stats[pool_id])
+        self.mgr.collect_stats(mock.Mock())
+        self.rpc_mock.reset_mock()
+
+        self.mgr.collect_stats(mock.Mock())
+        self.assertFalse(self.rpc_mock.update_pools_stats.called)
+
+        stats['1'] = {'bytes_in': 5, 'bytes_out': 1,
+                      'members': {'m1': {'status': 'ACTIVE'},
+                                  'm2': {'status': 'INACTIVE'}}}
+        self.mgr.collect_stats(mock.Mock())
+        self.rpc_mock.update_pools_stats.assert_called_once_with(
+            {'1': {'bytes_in': 5, 'members': {'m2': {'status': 'INACTIVE'}}}})
+
+    def test_collect_stats_bulk_failure_resends(self):
+        self.driver_mock.get_stats.return_value = {'bytes_in': 1}
+        self.rpc_mock.update_pools_stats.side_effect = Exception
+        self.mgr.collect_stats(mock.Mock())
+        self.assertTrue(self.log.exception.called)
+        self.assertEqual({}, self.mgr.reported_stats)
+
+        self.rpc_mock.update_pools_stats.side_effect = None
+        self.mgr.collect_stats(mock.Mock())
+        self.assertEqual(2, self.rpc_mock.update_pools_stats.call_count)
+        self.assertEqual(['1', '2'], sorted(self.mgr.reported_stats))
+
+    def test_collect_stats_old_plugin(self):
+        self.driver_mock.get_stats.return_value = {'bytes_in': 1}
+        self.rpc_mock.update_pools_stats.side_effect = (
+            rpc_common.RemoteError('UnsupportedRpcVersion'))
+        self.mgr.collect_stats(mock.Mock())
+        self.assertFalse(self.mgr.bulk_stats_supported)
         self.rpc_mock.update_pool_stats.assert_has_calls([
-            mock.call('1', mock.ANY),
-            mock.call('2', mock.ANY)
-        ])
+            mock.call('1', {'bytes_in': 1}),
+            mock.call('2', {'bytes_in': 1})
+        ], any_order=True)
+
+    def test_collect_stats_forgets_removed_pools(self):
+        self.mgr.reported_stats = {'3': {'bytes_in': 1}}
+        self.driver_mock.get_stats.return_value = {}
+        self.mgr.collect_stats(mock.Mock())
+        self.assertEqual({}, self.mgr.reported_stats)
+        self.assertFalse(self.rpc_mock.update_pools_stats.called)
 
     def test_collect_stats_exception(self):
         self.driver_mock.get_stats.side_effect = Exception
@@ -89,13 +145,16 @@ class TestManager(base.BaseTestCase):
         ) as (reload, destroy):
 
             self.rpc_mock.get_ready_devices.return_value = ready
+            self.rpc_mock.get_logical_devices.return_value = dict(
+                (i, {'config': i}) for i in ready)
 
             self.mgr.sync_state()
 
             self.assertEqual(len(reloaded), len(reload.mock_calls))
             self.assertEqual(len(destroyed), len(destroy.mock_calls))
 
-            reload.assert_has_calls([mock.call(i) for i in reloaded])
+            reload.assert_has_calls([mock.call(i, {'config': i})
+                                     for i in reloaded], any_order=True)
             destroy.assert_has_calls([mock.call(i) for i in destroyed])
             self.assertFalse(self.mgr.needs_resync)
 
@@ -113,6 +172,37 @@ class TestManager(base.BaseTestCase):
         self.mgr.instance_mapping = {'1': 'devdriver'}
         self._sync_state_helper(['2'], ['2'], ['1'])
 
+    def test_sync_state_bulk_missing_pool(self):
+        with mock.patch.object(self.mgr, '_reload_pool') as reload:
+            self.rpc_mock.get_ready_devices.return_value = ['1', '2']
+            self.rpc_mock.get_logical_devices.return_value = {
+                '1': {'config': '1'}}
+
+            self.mgr.sync_state()
+
+            self.rpc_mock.get_logical_devices.assert_called_once_with(
+                mock.ANY)
+            self.assertEqual(
+                ['1', '2'],
+                sorted(self.rpc_mock.get_logical_devices.call_args[0][0]))
+            reload.assert_has_calls([mock.call('1', {'config': '1'}),
+                                     mock.call('2', None)], any_order=True)
+
+    def test_sync_state_old_plugin(self):
+        with mock.patch.object(self.mgr, '_reload_pool') as reload:
+            self.rpc_mock.get_ready_devices.return_value = ['1']
+            self.rpc_mock.get_logical_devices.side_effect = (
+                rpc_common.RemoteError('UnsupportedRpcVersion'))
+
+            self.mgr.sync_state()
+            self.mgr.sync_state()
+
+            self.assertFalse(self.mgr.bulk_devices_supported)
+            self.assertEqual(1, self.rpc_mock.get_logical_devices.call_count)
+            reload.assert_has_calls([mock.call('1', None),
+                                     mock.call('1', None)])
+            self.assertFalse(self.mgr.needs_resync)
+
     def test_sync_state_exception(self):
         self.rpc_mock.get_ready_devices.side_effect = Exception
 
@@ -133,6 +223,14 @@ class TestManager(base.BaseTestCase):
         self.assertIn(pool_id, self.mgr.instance_mapping)
         self.rpc_mock.pool_deployed.assert_called_once_with(pool_id)
 
+    def test_reload_pool_with_config(self):
+        config = {'driver': 'devdriver'}
+        self.mgr._reload_pool('new_id', config)
+
+        self.assertFalse(self.rpc_mock.get_logical_device.called)
+        self.driver_mock.deploy_instance.assert_called_once_with(config)
+        self.rpc_mock.pool_deployed.assert_called_once_with('new_id')
+
     def test_reload_pool_driver_not_found(self):
         config = {'driver': 'unknown_driver'}
         self.rpc_mock.get_logical_device.return_value = config
@@ -147,6 +147,41 @@ class TestApiCache(base.BaseTestCase):
             topic='topic'
         )
 
+    def test_get_logical_devices(self):
+        self.assertEqual(
+            self.api.get_logical_devices(['pool_id']),
+            self.mock_call.return_value
+        )
+
+        self.make_msg.assert_called_once_with(
+            'get_logical_devices',
+            pool_ids=['pool_id'])
+
+        self.mock_call.assert_called_once_with(
+            mock.sentinel.context,
+            self.make_msg.return_value,
+            topic='topic',
+            version='2.2'
+        )
+
+    def test_update_pools_stats(self):
+        self.assertEqual(
+            self.api.update_pools_stats({'pool_id': {'stat': 'stat'}}),
+            self.mock_call.return_value
+        )
+
+        self.make_msg.assert_called_once_with(
+            'update_pools_stats',
+            stats={'pool_id': {'stat': 'stat'}},
+            host='host')
+
+        self.mock_call.assert_called_once_with(
+            mock.sentinel.context,
+            self.make_msg.return_value,
+            topic='topic',
+            version='2.1'
+        )
+
     def test_update_pool_stats(self):
         self.assertEqual(
             self.api.update_pool_stats('pool_id', {'stat': 'stat'}),
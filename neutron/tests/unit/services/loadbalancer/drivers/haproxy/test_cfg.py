@@ -48,6 +48,31 @@ class TestHaproxyCfg(base.BaseTestCase):
             replace.assert_called_once_with('test_path',
                                             '\n'.join(test_config))
 
+    def test_build_config(self):
+        with contextlib.nested(
+                mock.patch('neutron.services.loadbalancer.'
+                           'drivers.haproxy.cfg._build_global'),
+                mock.patch('neutron.services.loadbalancer.'
+                           'drivers.haproxy.cfg._build_defaults'),
+                mock.patch('neutron.services.loadbalancer.'
+                           'drivers.haproxy.cfg._build_frontend'),
+                mock.patch('neutron.services.loadbalancer.'
+                           'drivers.haproxy.cfg._build_backend')
+        ) as (b_g, b_d, b_f, b_b):
+            b_g.return_value = ['globals']
+            b_d.return_value = ['defaults']
+            b_f.return_value = ['frontend']
+            b_b.return_value = ['backend']
+
+            test_config = mock.Mock()
+            self.assertEqual('globals\ndefaults\nfrontend\nbackend',
+                             cfg.build_config(test_config, 'sock', 'group',
+                                              True))
+            b_g.assert_called_once_with(test_config, socket_path='sock',
+                                        user_group='group',
+                                        admin_socket=True)
+            b_b.assert_called_once_with(test_config, keep_disabled=True)
+
     def test_build_global(self):
         expected_opts = ['global',
                          '\tdaemon',
@@ -59,6 +84,13 @@ class TestHaproxyCfg(base.BaseTestCase):
         opts = cfg._build_global(mock.Mock(), 'test_path', 'test_group')
         self.assertEqual(expected_opts, list(opts))
 
+        expected_opts[-1] = ('\tstats socket test_path mode 0600 uid 1000 '
+                             'level admin')
+        with mock.patch.object(cfg.os, 'getuid', return_value=1000):
+            opts = cfg._build_global(mock.Mock(), 'test_path', 'test_group',
+                                     admin_socket=True)
+            self.assertEqual(expected_opts, list(opts))
+
     def test_build_defaults(self):
         expected_opts = ['defaults',
                          '\tlog global',
@@ -138,6 +170,70 @@ class TestHaproxyCfg(base.BaseTestCase):
         opts = cfg._build_backend(test_config)
         self.assertEqual(expected_opts, list(opts))
 
+    def _get_member_config(self, members):
+        return {'pool': {'id': 'pool_id',
+                         'protocol': 'TCP',
+                         'lb_method': 'ROUND_ROBIN'},
+                'members': [{'status': 'ACTIVE',
+                             'admin_state_up': admin_state_up,
+                             'id': member_id,
+                             'address': '10.0.0.3',
+                             'protocol_port': 80,
+                             'weight': weight}
+                            for member_id, weight, admin_state_up in members],
+                'healthmonitors': [],
+                'vip': {'id': 'vip_id',
+                        'protocol': 'TCP',
+                        'port': {'fixed_ips': [{'ip_address': '10.0.0.2'}]},
+                        'protocol_port': 80,
+                        'connection_limit': -1}}
+
+    def test_build_backend_keep_disabled(self):
+        test_config = self._get_member_config([('member1_id', 1, True),
+                                               ('member2_id', 2, False)])
+        expected_opts = ['backend pool_id',
+                         '\tmode tcp',
+                         '\tbalance roundrobin',
+                         '\tserver member1_id 10.0.0.3:80 weight 1']
+        opts = cfg._build_backend(test_config)
+        self.assertEqual(expected_opts, list(opts))
+
+        expected_opts.append('\tserver member2_id 10.0.0.3:80 weight 2 '
+                             'disabled')
+        opts = cfg._build_backend(test_config, keep_disabled=True)
+        self.assertEqual(expected_opts, list(opts))
+
+    def test_get_structure(self):
+        old_config = self._get_member_config([('member1_id', 1, True),
+                                              ('member2_id', 2, True)])
+        new_config = self._get_member_config([('member1_id', 5, True),
+                                              ('member2_id', 2, False)])
+        self.assertEqual(cfg.get_structure(old_config),
+                         cfg.get_structure(new_config))
+        self.assertEqual(5, new_config['members'][0]['weight'])
+
+        new_config = self._get_member_config([('member1_id', 1, True)])
+        self.assertNotEqual(cfg.get_structure(old_config),
+                            cfg.get_structure(new_config))
+        new_config = self._get_member_config([('member1_id', 1, True),
+                                              ('member2_id', 2, True)])
+        new_config['vip']['connection_limit'] = 10
+        self.assertNotEqual(cfg.get_structure(old_config),
+                            cfg.get_structure(new_config))
+
+    def test_get_member_commands(self):
+        old_config = self._get_member_config([('member1_id', 1, True),
+                                              ('member2_id', 2, True),
+                                              ('member3_id', 3, False)])
+        new_config = self._get_member_config([('member1_id', 5, True),
+                                              ('member2_id', 2, False),
+                                              ('member3_id', 3, True)])
+        self.assertEqual(['set weight pool_id/member1_id 5',
+                          'disable server pool_id/member2_id',
+                          'enable server pool_id/member3_id'],
+                         cfg.get_member_commands(old_config, new_config))
+        self.assertEqual([], cfg.get_member_commands(new_config, new_config))
+
     def test_get_server_health_option(self):
         test_config = {'healthmonitors': [{'admin_state_up': False,
                                            'delay': 3,
@@ -35,6 +35,7 @@ class TestHaproxyNSDriver(base.BaseTestCase):
         conf.haproxy.loadbalancer_state_path = '/the/path'
         conf.interface_driver = 'intdriver'
         conf.haproxy.user_group = 'test_group'
+        conf.haproxy.runtime_member_updates = False
         conf.AGENT.root_helper = 'sudo_test'
         self.mock_importer = mock.patch.object(namespace_driver,
                                                'importutils').start()
@@ -90,12 +91,115 @@ class TestHaproxyNSDriver(base.BaseTestCase):
             self.driver._spawn(self.fake_config)
 
             mock_save.assert_called_once_with('conf', self.fake_config,
-                                              'sock', 'test_group')
+                                              'sock', 'test_group',
+                                              runtime_members=False)
             cmd = ['haproxy', '-f', 'conf', '-p', 'pid']
             ip_wrap.assert_has_calls([
                 mock.call('sudo_test', 'qlbaas-pool_id'),
                 mock.call().netns.execute(cmd)
             ])
+            self.assertEqual({}, self.driver.deployed_configs)
+
+    def test_spawn_runtime_member_updates(self):
+        self.driver.conf.haproxy.runtime_member_updates = True
+        with contextlib.nested(
+            mock.patch.object(namespace_driver.hacfg, 'save_config'),
+            mock.patch.object(self.driver, '_get_state_file_path'),
+            mock.patch('neutron.agent.linux.ip_lib.IPWrapper')
+        ) as (mock_save, gsp, ip_wrap):
+            gsp.side_effect = lambda x, y: y
+
+            self.driver._spawn(self.fake_config)
+
+            mock_save.assert_called_once_with('conf', self.fake_config,
+                                              'sock', 'test_group',
+                                              runtime_members=True)
+            self.assertEqual({'pool_id': self.fake_config},
+                             self.driver.deployed_configs)
+
+    def _test_update_runtime(self, same_structure=True, commands=['cmd'],
+                             sent=True):
+        self.driver.conf.haproxy.runtime_member_updates = True
+        self.driver.deployed_configs['pool_id'] = 'old_config'
+        structures = ['structure', same_structure and 'structure' or 'new']
+        with contextlib.nested(
+            mock.patch.object(namespace_driver.hacfg, 'get_structure',
+                              side_effect=structures),
+            mock.patch.object(namespace_driver.hacfg, 'get_member_commands',
+                              return_value=commands),
+            mock.patch.object(namespace_driver.hacfg, 'save_config'),
+            mock.patch.object(self.driver, '_send_socket_commands',
+                              return_value=sent),
+            mock.patch.object(self.driver, '_get_state_file_path'),
+            mock.patch.object(self.driver, '_spawn'),
+            mock.patch('__builtin__.open')
+        ) as (get_structure, get_commands, save, send, gsp, spawn, m_open):
+            gsp.side_effect = lambda x, y: y
+            m_open.return_value = ['5']
+
+            self.driver.update(self.fake_config)
+            return get_commands, save, send, spawn
+
+    def test_update_runtime_members(self):
+        get_commands, save, send, spawn = self._test_update_runtime()
+        get_commands.assert_called_once_with('old_config', self.fake_config)
+        save.assert_called_once_with('conf', self.fake_config, 'sock',
+                                     'test_group', runtime_members=True)
+        send.assert_called_once_with('sock', ['cmd'])
+        self.assertFalse(spawn.called)
+        self.assertEqual(self.fake_config,
+                         self.driver.deployed_configs['pool_id'])
+
+    def test_update_runtime_no_member_change(self):
+        get_commands, save, send, spawn = self._test_update_runtime(
+            commands=[])
+        self.assertTrue(save.called)
+        self.assertFalse(send.called)
+        self.assertFalse(spawn.called)
+
+    def test_update_runtime_structural_change(self):
+        get_commands, save, send, spawn = self._test_update_runtime(
+            same_structure=False)
+        self.assertFalse(get_commands.called)
+        self.assertFalse(send.called)
+        spawn.assert_called_once_with(self.fake_config, ['-sf', '5'])
+
+    def test_update_runtime_commands_rejected(self):
+        get_commands, save, send, spawn = self._test_update_runtime(
+            sent=False)
+        self.assertTrue(send.called)
+        spawn.assert_called_once_with(self.fake_config, ['-sf', '5'])
+
+    def test_update_runtime_not_deployed(self):
+        self.driver.conf.haproxy.runtime_member_updates = True
+        with contextlib.nested(
+            mock.patch.object(namespace_driver.hacfg, 'get_structure'),
+            mock.patch.object(self.driver, '_get_state_file_path'),
+            mock.patch.object(self.driver, '_spawn'),
+            mock.patch('__builtin__.open')
+        ) as (get_structure, gsp, spawn, mock_open):
+            mock_open.return_value = ['5']
+            self.driver.update(self.fake_config)
+            self.assertFalse(get_structure.called)
+            spawn.assert_called_once_with(self.fake_config, ['-sf', '5'])
+
+    def test_send_socket_commands(self):
+        with mock.patch('socket.socket') as socket:
+            sock = socket.return_value
+            sock.recv.side_effect = ['\n', '']
+            self.assertTrue(self.driver._send_socket_commands(
+                'sock', ['set weight a/b 2', 'disable server a/c']))
+            sock.connect.assert_called_once_with('sock')
+            sock.send.assert_called_once_with(
+                'set weight a/b 2;disable server a/c\n')
+
+            sock.recv.side_effect = ['No such server.\n', '']
+            self.assertFalse(self.driver._send_socket_commands(
+                'sock', ['disable server a/d']))
+
+            sock.connect.side_effect = namespace_driver.socket.error
+            self.assertFalse(self.driver._send_socket_commands(
+                'sock', ['disable server a/d']))
 
     def test_undeploy_instance(self):
         with contextlib.nested(
@@ -325,11 +429,49 @@ class TestHaproxyNSDriver(base.BaseTestCase):
             mkdir.assert_called_once_with('/the/path/pool_id', 0o755)
 
     def test_deploy_instance(self):
-        with mock.patch.object(self.driver, 'exists') as exists:
-            with mock.patch.object(self.driver, 'update') as update:
-                self.driver.deploy_instance(self.fake_config)
-                exists.assert_called_once_with(self.fake_config['pool']['id'])
-                update.assert_called_once_with(self.fake_config)
+        with contextlib.nested(
+            mock.patch.object(self.driver, 'exists'),
+            mock.patch.object(self.driver, '_is_config_current',
+                              return_value=False),
+            mock.patch.object(self.driver, 'update')
+        ) as (exists, is_current, update):
+            self.driver.deploy_instance(self.fake_config)
+            exists.assert_called_once_with(self.fake_config['pool']['id'])
+            is_current.assert_called_once_with(self.fake_config)
+            update.assert_called_once_with(self.fake_config)
+
+    def test_deploy_instance_unchanged(self):
+        with contextlib.nested(
+            mock.patch.object(self.driver, 'exists'),
+            mock.patch.object(self.driver, '_is_config_current',
+                              return_value=True),
+            mock.patch.object(self.driver, 'update')
+        ) as (exists, is_current, update):
+            self.driver.deploy_instance(self.fake_config)
+            self.assertFalse(update.called)
+            self.assertEqual({'pool_id': 'port_id'},
+                             self.driver.pool_to_port_id)
+
+    def test_is_config_current(self):
+        with contextlib.nested(
+            mock.patch.object(namespace_driver.hacfg, 'build_config',
+                              return_value='config'),
+            mock.patch.object(self.driver, '_get_state_file_path'),
+            mock.patch('__builtin__.open')
+        ) as (build, gsp, mock_open):
+            gsp.side_effect = lambda x, y: y
+            conf_file = mock_open.return_value.__enter__.return_value
+            conf_file.read.return_value = 'config'
+            self.assertTrue(self.driver._is_config_current(self.fake_config))
+            build.assert_called_once_with(self.fake_config, 'sock',
+                                          'test_group', False)
+            mock_open.assert_called_once_with('conf', 'r')
+
+            conf_file.read.return_value = 'old config'
+            self.assertFalse(self.driver._is_config_current(self.fake_config))
+
+            mock_open.side_effect = IOError
+            self.assertFalse(self.driver._is_config_current(self.fake_config))
 
     def test_deploy_instance_non_existing(self):
         with mock.patch.object(self.driver, 'exists') as exists:
@@ -236,6 +236,18 @@ class TestLoadBalancerCallbacks(TestLoadBalancerPluginBase):
 
                     self.assertEqual(logical_config, expected)
 
+    def test_get_logical_devices(self):
+        with contextlib.nested(self.pool(), self.pool()) as (pool1, pool2):
+            ctx = context.get_admin_context()
+            self.plugin_instance.update_status(
+                ctx, ldb.Pool, pool1['pool']['id'], 'ACTIVE')
+            devices = self.callbacks.get_logical_devices(
+                ctx, [pool1['pool']['id'], pool2['pool']['id'], 'unknown'])
+            self.assertEqual([pool1['pool']['id']], devices.keys())
+            self.assertEqual(
+                self.callbacks.get_logical_device(ctx, pool1['pool']['id']),
+                devices[pool1['pool']['id']])
+
     def test_get_logical_device_inactive_member(self):
         with self.pool() as pool:
             with self.vip(pool=pool) as vip:
@@ -385,6 +397,16 @@ class TestLoadBalancerCallbacks(TestLoadBalancerPluginBase):
                         ctx, member['member']['id'])
                     self.assertEqual('ACTIVE', m['status'])
 
+    def test_update_pools_stats(self):
+        with self.pool() as pool:
+            pool_id = pool['pool']['id']
+            ctx = context.get_admin_context()
+            self.callbacks.update_pools_stats(
+                ctx, stats={pool_id: {'bytes_in': 10}}, host='host')
+            stats = ctx.session.query(ldb.PoolStatistics).filter_by(
+                pool_id=pool_id).one()
+            self.assertEqual(10, stats.bytes_in)
+
     def test_update_status_pool(self):
         with self.pool() as pool:
             pool_id = pool['pool']['id']
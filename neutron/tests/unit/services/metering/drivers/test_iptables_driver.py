@@ -373,3 +373,31 @@ class IptablesDriverTestCase(base.BaseTestCase):
                                wrap=False, top=False)]
 
         self.v4filter_inst.assert_has_calls(calls)
+
+    def test_get_traffic_counters(self):
+        routers = [{'_metering_labels': [
+            {'id': 'c5df2fe5-c600-4a2a-b2f4-c0fb6df73c83',
+             'rules': []},
+            {'id': 'eeef45da-c600-4a2a-b2f4-c0fb6df73c83',
+             'rules': []}],
+            'admin_state_up': True,
+            'gw_port_id': '7d411f48-ecc7-45e0-9ece-3b5bdb54fcee',
+            'id': '473ec392-1711-44e3-b008-3251ccfc5099',
+            'name': 'router1',
+            'status': 'ACTIVE',
+            'tenant_id': '6c5f5d2a1fa2441e88e35422926f48e8'}]
+        self.metering.add_metering_label(None, routers)
+        self.iptables_inst.get_bulk_traffic_counters.return_value = {
+            'neutron-meter-l-c5df2fe5-c60': {'pkts': 1, 'bytes': 10},
+            'neutron-meter-l-eeef45da-c60': {'pkts': 2, 'bytes': 20}}
+
+        accs = self.metering.get_traffic_counters(None, routers)
+
+        self.assertEqual(accs, {
+            'c5df2fe5-c600-4a2a-b2f4-c0fb6df73c83': {'pkts': 1, 'bytes': 10},
+            'eeef45da-c600-4a2a-b2f4-c0fb6df73c83': {'pkts': 2, 'bytes': 20}})
+        self.assertEqual(
+            self.iptables_inst.get_bulk_traffic_counters.call_count, 1)
+        chains = self.iptables_inst.get_bulk_traffic_counters.call_args[0][0]
+        self.assertEqual(sorted(chains), ['neutron-meter-l-c5df2fe5-c60',
+                                          'neutron-meter-l-eeef45da-c60'])
@@ -16,6 +16,7 @@
 #    under the License.
 import copy
 import mock
+from oslo.config import cfg
 
 from neutron.openstack.common import uuidutils
 from neutron.plugins.common import constants
@@ -141,6 +142,7 @@ class TestIPsecDeviceDriver(base.BaseTestCase):
             process.vpnservice = FAKE_VPN_SERVICE
             process.connection_status = {}
             process.status = constants.ACTIVE
+            process.refresh_status.return_value = constants.ACTIVE
             process.updated_pending_status = True
             self.driver.processes[process_id] = process
         elif vpnservice:
@@ -190,3 +192,113 @@ class TestIPsecDeviceDriver(base.BaseTestCase):
         process_id = _uuid()
         self.driver.sync(context, [{'id': process_id}])
         self.assertNotIn(process_id, self.driver.processes)
+
+    def _active_vpn_service(self):
+        vpnservice = copy.deepcopy(FAKE_VPN_SERVICE)
+        vpnservice['status'] = constants.ACTIVE
+        return vpnservice
+
+    def test_sync_skips_unchanged_vpnservice(self):
+        with mock.patch.object(self.driver,
+                               'ensure_process') as ensure_process:
+            ensure_process.side_effect = self.fake_ensure_process
+            context = mock.Mock()
+            self.driver.agent_rpc.get_vpn_services_on_host.return_value = [
+                self._active_vpn_service()]
+            self.driver.sync(context, [])
+            self.driver.sync(context, [])
+            process = self.driver.processes[FAKE_ROUTER_ID]
+            process.update.assert_called_once_with()
+            self.assertEqual(1, ensure_process.call_count)
+
+    def test_sync_reapplies_pending_vpnservice(self):
+        with mock.patch.object(self.driver,
+                               'ensure_process') as ensure_process:
+            ensure_process.side_effect = self.fake_ensure_process
+            context = mock.Mock()
+            self.driver.agent_rpc.get_vpn_services_on_host.return_value = [
+                FAKE_VPN_SERVICE]
+            self.driver.sync(context, [])
+            self.driver.sync(context, [])
+            process = self.driver.processes[FAKE_ROUTER_ID]
+            self.assertEqual(2, process.update.call_count)
+
+    def test_sync_reapplies_down_process(self):
+        with mock.patch.object(self.driver,
+                               'ensure_process') as ensure_process:
+            ensure_process.side_effect = self.fake_ensure_process
+            context = mock.Mock()
+            self.driver.agent_rpc.get_vpn_services_on_host.return_value = [
+                self._active_vpn_service()]
+            self.driver.sync(context, [])
+            process = self.driver.processes[FAKE_ROUTER_ID]
+            # the cached status is still active when the process dies
+            process.refresh_status.return_value = constants.DOWN
+            self.driver.sync(context, [])
+            self.assertEqual(2, process.update.call_count)
+
+    def test_sync_does_not_refresh_status(self):
+        context = mock.Mock()
+        process = mock.Mock()
+        process.vpnservice = FAKE_VPN_SERVICE
+        process.connection_status = {}
+        self.driver.processes = {FAKE_ROUTER_ID: process}
+        self.driver.agent_rpc.get_vpn_services_on_host.return_value = [
+            FAKE_VPN_SERVICE]
+        self.driver.sync(context, [])
+        self.assertFalse(process.refresh_status.called)
+
+    def test_report_status_refreshes_processes(self):
+        context = mock.Mock()
+        process = mock.Mock()
+        process.vpnservice = FAKE_VPN_SERVICE
+        process.connection_status = {}
+        process.status = constants.ACTIVE
+        process.updated_pending_status = False
+        self.driver.processes = {FAKE_ROUTER_ID: process}
+        changed = self.driver.report_status(context)
+        process.refresh_status.assert_called_once_with()
+        self.assertEqual(1, len(changed))
+        self.assertEqual([], self.driver.report_status(context))
+
+    def test_report_status_periodic_backoff(self):
+        cfg.CONF.set_override('ipsec_status_check_interval', 10, 'ipsec')
+        cfg.CONF.set_override('ipsec_status_check_max_interval', 35,
+                              'ipsec')
+        self.driver.conf = cfg.CONF
+        self.driver.status_check_interval = 10
+        with mock.patch.object(self.driver, 'report_status') as report:
+            report.return_value = []
+            intervals = [self.driver._report_status_periodic(mock.Mock())
+                         for i in range(3)]
+            self.assertEqual([20, 35, 35], intervals)
+            report.return_value = [{'id': 'fake'}]
+            self.assertEqual(
+                10, self.driver._report_status_periodic(mock.Mock()))
+            report.side_effect = Exception
+            self.assertEqual(
+                10, self.driver._report_status_periodic(mock.Mock()))
+
+
+class TestOpenSwanProcess(base.BaseTestCase):
+    def setUp(self):
+        super(TestOpenSwanProcess, self).setUp()
+        self.execute = mock.patch(
+            'neutron.agent.linux.utils.execute').start()
+        self.process = ipsec_driver.OpenSwanProcess(
+            cfg.CONF, 'sudo', FAKE_ROUTER_ID,
+            None, 'qrouter-' + FAKE_ROUTER_ID)
+
+    def test_status_is_cached(self):
+        self.execute.return_value = ''
+        self.assertEqual(constants.ACTIVE, self.process.status)
+        self.assertEqual(constants.ACTIVE, self.process.status)
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_refresh_status(self):
+        self.execute.return_value = ''
+        self.process.refresh_status()
+        self.execute.side_effect = RuntimeError
+        self.assertEqual(constants.DOWN, self.process.refresh_status())
+        self.assertEqual(constants.DOWN, self.process.status)
+        self.assertEqual(2, self.execute.call_count)
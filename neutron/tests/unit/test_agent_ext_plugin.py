@@ -15,9 +15,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
+import datetime
 import time
 
+import mock
 from oslo.config import cfg
 from webob import exc
 
@@ -235,6 +238,115 @@ class AgentDBTestCase(AgentDBTestMixIn,
             query_string='binary=neutron-l3-agent&host=' + L3_HOSTB)
         self.assertFalse(agents['agents'][0]['alive'])
 
+    def _get_agent_db(self, agent_type, host):
+        return self.adminContext.session.query(agents_db.Agent).filter_by(
+            agent_type=agent_type, host=host).one()
+
+    def test_report_state_write_behind(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        dhcp_host = self._register_one_dhcp_agent()[0]
+        callback = agents_db.AgentExtRpcCallback()
+        # the first report received by this server is written immediately
+        callback.report_state(self.adminContext,
+                              agent_state={'agent_state': dhcp_host},
+                              time=timeutils.strtime())
+        heartbeat = self._get_agent_db(constants.AGENT_TYPE_DHCP,
+                                       DHCP_HOST1).heartbeat_timestamp
+        next_heartbeat = heartbeat + datetime.timedelta(seconds=30)
+        dhcp_host['configurations']['networks'] = 10
+        with contextlib.nested(
+            mock.patch('neutron.openstack.common.loopingcall.'
+                       'FixedIntervalLoopingCall'),
+            mock.patch.object(timeutils, 'utcnow',
+                              return_value=next_heartbeat)):
+            callback.report_state(self.adminContext,
+                                  agent_state={'agent_state': dhcp_host},
+                                  time=timeutils.strtime())
+        self.assertEqual(1, len(callback.heartbeats.pending))
+        self.assertNotIn('networks', self._list('agents')['agents'][0][
+            'configurations'])
+
+        callback.heartbeats.flush()
+
+        self.assertEqual({}, callback.heartbeats.pending)
+        self.adminContext.session.expire_all()
+        agent_db = self._get_agent_db(constants.AGENT_TYPE_DHCP, DHCP_HOST1)
+        self.assertEqual(next_heartbeat, agent_db.heartbeat_timestamp)
+        self.assertEqual(10, self._list('agents')['agents'][0][
+            'configurations']['networks'])
+
+    def test_heartbeat_flush_skips_unchanged_configurations(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        dhcp_host = self._register_one_dhcp_agent()[0]
+        aggregator = agents_db.AgentHeartbeatAggregator(mock.Mock(), 60)
+        aggregator.report(self.adminContext, dhcp_host)
+        with mock.patch('neutron.openstack.common.loopingcall.'
+                        'FixedIntervalLoopingCall') as looping_call:
+            aggregator.report(self.adminContext, dhcp_host)
+            aggregator.report(self.adminContext, dhcp_host)
+        looping_call.return_value.start.assert_called_once_with(interval=60)
+
+        with mock.patch.object(self.adminContext.session,
+                               'execute') as execute:
+            with mock.patch.object(agents_db.n_context, 'get_admin_context',
+                                   return_value=self.adminContext):
+                execute.return_value.rowcount = 1
+                aggregator.flush()
+        self.assertEqual(1, execute.call_count)
+        update = str(execute.call_args[0][0])
+        self.assertNotIn('configurations', update.split('WHERE')[0])
+
+    def test_heartbeat_flush_configurations_written_by_other_server(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        dhcp_host = self._register_one_dhcp_agent()[0]
+        server_a = agents_db.AgentExtRpcCallback()
+        server_b = agents_db.AgentExtRpcCallback()
+        server_a.report_state(self.adminContext,
+                              agent_state={'agent_state': dhcp_host},
+                              time=timeutils.strtime())
+        other_host = copy.deepcopy(dhcp_host)
+        other_host['configurations']['networks'] = 10
+        server_b.report_state(self.adminContext,
+                              agent_state={'agent_state': other_host},
+                              time=timeutils.strtime())
+        with mock.patch('neutron.openstack.common.loopingcall.'
+                        'FixedIntervalLoopingCall'):
+            server_a.report_state(self.adminContext,
+                                  agent_state={'agent_state': dhcp_host},
+                                  time=timeutils.strtime())
+
+        server_a.heartbeats.flush()
+
+        self.adminContext.session.expire_all()
+        self.assertNotIn('networks', self._list('agents')['agents'][0][
+            'configurations'])
+
+    def test_heartbeat_flush_deleted_agent(self):
+        dhcp_host = self._register_one_dhcp_agent()[0]
+        plugin = mock.Mock()
+        aggregator = agents_db.AgentHeartbeatAggregator(plugin, 60)
+        aggregator.report(self.adminContext, dhcp_host)
+        with mock.patch('neutron.openstack.common.loopingcall.'
+                        'FixedIntervalLoopingCall'):
+            aggregator.report(self.adminContext, dhcp_host)
+        self.adminContext.session.delete(
+            self._get_agent_db(constants.AGENT_TYPE_DHCP, DHCP_HOST1))
+        self.adminContext.session.flush()
+        aggregator.flush()
+
+        # the agent is created again by its next report
+        aggregator.report(self.adminContext, dhcp_host)
+        self.assertEqual(2, plugin.create_or_update_agent.call_count)
+
+    def test_dead_agent_with_heartbeat_flush_interval(self):
+        cfg.CONF.set_override('agent_down_time', 1)
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 2)
+        self._register_agent_states()
+        time.sleep(1.5)
+        agents = self._list_agents(
+            query_string='binary=neutron-l3-agent&host=' + L3_HOSTB)
+        self.assertTrue(agents['agents'][0]['alive'])
+
 
 class AgentDBTestCaseXML(AgentDBTestCase):
     fmt = 'xml'
@@ -989,6 +989,25 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
                                id=uuidutils.generate_uuid(),
                                fmt=self.fmt))
 
+    def test_read_only_getters_served_from_reader(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = []
+        instance.get_network.return_value = {'tenant_id': 'tenant_id',
+                                             'shared': False}
+        instance.get_network.read_only = True
+        with mock.patch.object(v2_base.db_api, 'reader') as reader:
+            self.api.get(_get_path('networks', fmt=self.fmt))
+            self.assertFalse(reader.called)
+            self.api.get(_get_path('networks',
+                                   id=uuidutils.generate_uuid(),
+                                   fmt=self.fmt))
+            self.assertEqual(1, reader.call_count)
+            # the getter also runs before a write, from the main database
+            self.api.delete(_get_path('networks',
+                                      id=uuidutils.generate_uuid(),
+                                      fmt=self.fmt))
+            self.assertEqual(1, reader.call_count)
+
     def _test_delete(self, req_tenant_id, real_tenant_id, expected_code,
                      expect_errors=False):
         env = {}
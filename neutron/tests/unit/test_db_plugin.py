@@ -21,6 +21,7 @@ import os
 
 import mock
 from oslo.config import cfg
+from sqlalchemy import event
 from testtools import matchers
 import webob.exc
 
@@ -39,6 +40,7 @@ from neutron.db import api as db
 from neutron.db import db_base_plugin_v2
 from neutron.db import models_v2
 from neutron.manager import NeutronManager
+from neutron.openstack.common.db.sqlalchemy import session
 from neutron.openstack.common import importutils
 from neutron.tests import base
 from neutron.tests.unit import test_extensions
@@ -3703,6 +3705,55 @@ class TestSubnetsV2(NeutronDbPluginV2TestCase):
             n_exc.HostRoutesExhausted)
 
 
+@contextlib.contextmanager
+def count_queries():
+    """Collect the statements sent to the database within the block."""
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, parameters,
+                               context, executemany):
+        statements.append(statement)
+
+    engine = session.get_engine()
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+class TestListQueryCount(NeutronDbPluginV2TestCase):
+    """Listing must not issue a query per returned resource."""
+
+    def _create_network_with_subnet(self, cidr):
+        network = self._make_network(self.fmt, 'net', True)
+        subnet = self._make_subnet(self.fmt, network, None, cidr,
+                                   dns_nameservers=['8.8.8.8'],
+                                   host_routes=[{'destination': '1.1.1.0/24',
+                                                 'nexthop': '1.1.1.1'}])
+        self._make_port(self.fmt, network['network']['id'])
+        return subnet
+
+    def _assert_list_query_count_constant(self, resource):
+        self._create_network_with_subnet('10.0.0.0/24')
+        with count_queries() as first:
+            self._list(resource)
+        for i in range(1, 4):
+            self._create_network_with_subnet('10.0.%d.0/24' % i)
+        with count_queries() as second:
+            self.assertEqual(4, len(self._list(resource)[resource]))
+        self.assertEqual(len(first), len(second))
+
+    def test_list_networks_query_count(self):
+        self._assert_list_query_count_constant('networks')
+
+    def test_list_subnets_query_count(self):
+        self._assert_list_query_count_constant('subnets')
+
+    def test_list_ports_query_count(self):
+        self._assert_list_query_count_constant('ports')
+
+
 class DbModelTestCase(base.BaseTestCase):
     """DB model tests."""
     def test_repr(self):
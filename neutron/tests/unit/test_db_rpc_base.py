@@ -38,7 +38,8 @@ class TestDhcpRpcCallbackMixin(base.BaseTestCase):
         plugin_retval = [dict(id='a'), dict(id='b')]
         self.plugin.get_networks.return_value = plugin_retval
 
-        networks = self.callbacks.get_active_networks(mock.Mock(), host='host')
+        networks = self.callbacks.get_active_networks(mock.MagicMock(),
+                                                      host='host')
 
         self.assertEqual(networks, ['a', 'b'])
         self.plugin.assert_has_calls(
@@ -112,7 +113,8 @@ class TestDhcpRpcCallbackMixin(base.BaseTestCase):
 
     def test_get_network_info_return_none_on_not_found(self):
         self.plugin.get_network.side_effect = n_exc.NetworkNotFound(net_id='a')
-        retval = self.callbacks.get_network_info(mock.Mock(), network_id='a')
+        retval = self.callbacks.get_network_info(mock.MagicMock(),
+                                                 network_id='a')
         self.assertIsNone(retval)
 
     def test_get_network_info(self):
@@ -125,7 +127,8 @@ class TestDhcpRpcCallbackMixin(base.BaseTestCase):
         self.plugin.get_subnets.return_value = subnet_retval
         self.plugin.get_ports.return_value = port_retval
 
-        retval = self.callbacks.get_network_info(mock.Mock(), network_id='a')
+        retval = self.callbacks.get_network_info(mock.MagicMock(),
+                                                 network_id='a')
         self.assertEqual(retval, network_retval)
         self.assertEqual(retval['subnets'], subnet_retval)
         self.assertEqual(retval['ports'], port_retval)
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 import os
 import sys
@@ -460,6 +461,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                               'neutron.agent.linux.interface.NullDriver')
         config.register_root_helper(cfg.CONF)
         cfg.CONF.register_opts(dhcp_agent.DhcpAgent.OPTS)
+        cfg.CONF.set_override('event_coalesce_interval', 0)
 
         self.plugin_p = mock.patch(DHCP_PLUGIN)
         plugin_cls = self.plugin_p.start()
@@ -686,18 +688,21 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
 
         with mock.patch.object(self.dhcp, 'enable_dhcp_helper') as enable:
             self.dhcp.network_create_end(None, payload)
+            self.dhcp.event_queue.waitall()
             enable.assertCalledOnceWith(fake_network.id)
 
     def test_network_update_end_admin_state_up(self):
         payload = dict(network=dict(id=fake_network.id, admin_state_up=True))
         with mock.patch.object(self.dhcp, 'enable_dhcp_helper') as enable:
             self.dhcp.network_update_end(None, payload)
+            self.dhcp.event_queue.waitall()
             enable.assertCalledOnceWith(fake_network.id)
 
     def test_network_update_end_admin_state_down(self):
         payload = dict(network=dict(id=fake_network.id, admin_state_up=False))
         with mock.patch.object(self.dhcp, 'disable_dhcp_helper') as disable:
             self.dhcp.network_update_end(None, payload)
+            self.dhcp.event_queue.waitall()
             disable.assertCalledOnceWith(fake_network.id)
 
     def test_network_delete_end(self):
@@ -705,6 +710,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
 
         with mock.patch.object(self.dhcp, 'disable_dhcp_helper') as disable:
             self.dhcp.network_delete_end(None, payload)
+            self.dhcp.event_queue.waitall()
             disable.assertCalledOnceWith(fake_network.id)
 
     def test_refresh_dhcp_helper_no_dhcp_enabled_networks(self):
@@ -747,6 +753,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = fake_network
 
         self.dhcp.subnet_update_end(None, payload)
+        self.dhcp.event_queue.waitall()
 
         self.cache.assert_has_calls([mock.call.put(fake_network)])
         self.call_driver.assert_called_once_with('reload_allocations',
@@ -764,6 +771,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = new_state
 
         self.dhcp.subnet_update_end(None, payload)
+        self.dhcp.event_queue.waitall()
 
         self.cache.assert_has_calls([mock.call.put(new_state)])
         self.call_driver.assert_called_once_with('restart',
@@ -782,6 +790,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = fake_network
 
         self.dhcp.subnet_delete_end(None, payload)
+        self.dhcp.event_queue.waitall()
 
         self.cache.assert_has_calls([
             mock.call.get_network_by_subnet_id(
@@ -796,6 +805,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.get_network_by_id.return_value = fake_network
         self.cache.get_port_by_id.return_value = fake_port2
         self.dhcp.port_update_end(None, payload)
+        self.dhcp.event_queue.waitall()
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port2.network_id),
              mock.call.put_port(mock.ANY)])
@@ -809,6 +819,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         updated_fake_port1.fixed_ips[0].ip_address = '172.9.9.99'
         self.cache.get_port_by_id.return_value = updated_fake_port1
         self.dhcp.port_update_end(None, payload)
+        self.dhcp.event_queue.waitall()
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port1.network_id),
              mock.call.put_port(mock.ANY)])
@@ -821,6 +832,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.get_port_by_id.return_value = fake_port2
 
         self.dhcp.port_delete_end(None, payload)
+        self.dhcp.event_queue.waitall()
         self.cache.assert_has_calls(
             [mock.call.get_port_by_id(fake_port2.id),
              mock.call.get_network_by_id(fake_network.id),
@@ -833,10 +845,37 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.get_port_by_id.return_value = None
 
         self.dhcp.port_delete_end(None, payload)
+        self.dhcp.event_queue.waitall()
 
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_port_update_end_burst_is_coalesced(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        for port in (fake_port1, fake_port2, fake_port1):
+            self.dhcp.port_update_end(None, dict(port=vars(port)))
+        self.dhcp.event_queue.waitall()
+
+        self.assertEqual(self.cache.put_port.call_count, 3)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_events_for_network_are_processed_in_order(self):
+        net_id = fake_network.id
+        calls = []
+        with contextlib.nested(
+            mock.patch.object(self.dhcp, 'enable_dhcp_helper',
+                              side_effect=lambda n: calls.append('enable')),
+            mock.patch.object(self.dhcp, 'disable_dhcp_helper',
+                              side_effect=lambda n: calls.append('disable'))
+        ):
+            self.dhcp.network_create_end(None, dict(network=dict(id=net_id)))
+            self.dhcp.network_delete_end(None, dict(network_id=net_id))
+            self.dhcp.network_create_end(None, dict(network=dict(id=net_id)))
+            self.dhcp.event_queue.waitall()
+
+        self.assertEqual(calls, ['enable', 'disable', 'enable'])
+
 
 class TestDhcpPluginApiProxy(base.BaseTestCase):
     def setUp(self):
@@ -1051,6 +1090,70 @@ class TestNetworkCache(base.BaseTestCase):
         self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
 
 
+class TestNetworkEventQueue(base.BaseTestCase):
+    def setUp(self):
+        super(TestNetworkEventQueue, self).setUp()
+        self.queue = dhcp_agent.NetworkEventQueue(2, 0)
+
+    def test_add_coalesces_identical_pending_events(self):
+        func = mock.Mock()
+        self.queue.add('net1', func, 'net1')
+        self.queue.add('net1', func, 'net1')
+        self.queue.add('net2', func, 'net2')
+        self.assertEqual(self.queue.get_state()['event_queue_depth'], 2)
+        self.queue.waitall()
+
+        self.assertEqual(func.mock_calls,
+                         [mock.call('net1'), mock.call('net2')])
+        self.assertEqual(self.queue.pending, {})
+
+    def test_event_failure_does_not_stop_processing(self):
+        func = mock.Mock(side_effect=[Exception, None])
+        with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
+            self.queue.add('net1', func, 'a')
+            self.queue.add('net1', func, 'b')
+            self.queue.waitall()
+
+        self.assertEqual(func.call_count, 2)
+        self.assertTrue(log.called)
+
+    def test_get_state(self):
+        func = mock.Mock()
+        self.queue.add('net1', func)
+        self.queue.add('net1', func)
+        self.queue.add('net2', func)
+        state = self.queue.get_state()
+        self.assertEqual(state['event_queue_depth'], 2)
+        self.assertEqual(state['event_queue_networks'], 2)
+        self.assertEqual(state['event_coalesced'], 1)
+        self.assertEqual(state['event_processed'], 0)
+        self.assertEqual(state['event_slowest_networks'], [])
+
+        self.queue.waitall()
+        state = self.queue.get_state()
+        self.assertEqual(state['event_queue_depth'], 0)
+        self.assertEqual(state['event_coalesced'], 0)
+        self.assertEqual(state['event_processed'], 2)
+        self.assertEqual(sorted(net_id for net_id, latency
+                                in state['event_slowest_networks']),
+                         ['net1', 'net2'])
+        state = self.queue.get_state()
+        self.assertEqual(state['event_processed'], 0)
+        self.assertEqual(state['event_latency_max'], 0)
+        self.assertEqual(state['event_slowest_networks'], [])
+
+    def test_get_state_is_bounded(self):
+        for i, latency in enumerate([0.5, 3.0, 1.0, 2.0, 0.1] * 40):
+            self.queue._record_latency('net%d' % i, latency)
+        state = self.queue.get_state()
+        self.assertEqual(state['event_processed'], 200)
+        self.assertEqual(state['event_latency_avg'], 1.32)
+        self.assertEqual(state['event_latency_max'], 3.0)
+        self.assertEqual([latency for net_id, latency
+                          in state['event_slowest_networks']],
+                         [3.0, 3.0, 3.0])
+
+
 class FakePort1:
     id = 'eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee'
 
@@ -607,6 +607,87 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
+    def _get_bulk_traffic_counters_calls(self, filter_dump, nat_dump):
+        return [
+            (mock.call(['ip6tables-save', '-t', 'filter', '-c'],
+                       root_helper=self.root_helper),
+             ''),
+            (mock.call(['iptables-save', '-t', 'filter', '-c'],
+                       root_helper=self.root_helper),
+             filter_dump),
+            (mock.call(['iptables-save', '-t', 'nat', '-c'],
+                       root_helper=self.root_helper),
+             nat_dump),
+        ]
+
+    def test_get_bulk_traffic_counters(self):
+        filter_dump = (
+            '*filter\n'
+            ':OUTPUT ACCEPT [0:0]\n'
+            ':%(bn)s-OUTPUT - [0:0]\n'
+            '[400:65901] -A OUTPUT -j %(bn)s-OUTPUT\n'
+            '[100:2000] -A %(bn)s-OUTPUT -j chain1\n'
+            '[5:300] -A %(bn)s-OUTPUT -s 10.0.0.0/24\n'
+            '[7:500] -A chain1\n'
+            'COMMIT\n' % {'bn': self.iptables.wrap_name})
+        nat_dump = ('*nat\n'
+                    '[10:100] -A %s-OUTPUT -j ACCEPT\n'
+                    'COMMIT\n' % self.iptables.wrap_name)
+        expected_calls_and_values = self._get_bulk_traffic_counters_calls(
+            filter_dump, nat_dump)
+        tools.setup_mock_calls(self.execute, expected_calls_and_values)
+
+        accs = self.iptables.get_bulk_traffic_counters(['OUTPUT'])
+        self.assertEqual(accs, {'OUTPUT': {'pkts': 115, 'bytes': 2400}})
+
+        tools.verify_mock_calls(self.execute, expected_calls_and_values)
+
+    def test_get_bulk_traffic_counters_unwrapped(self):
+        self.iptables.ipv4['filter'].add_chain('chain1', wrap=False)
+        self.iptables.ipv4['filter'].add_chain('chain2', wrap=False)
+        self.execute.return_value = (
+            '*filter\n'
+            ':chain1 - [0:0]\n'
+            ':chain2 - [0:0]\n'
+            '[5:300] -A chain1 -s 10.0.0.0/24\n'
+            '[7:500] -A chain1\n'
+            'COMMIT\n')
+
+        accs = self.iptables.get_bulk_traffic_counters(['chain1', 'chain2'],
+                                                       wrap=False)
+        self.assertEqual(accs, {'chain1': {'pkts': 12, 'bytes': 800},
+                                'chain2': {'pkts': 0, 'bytes': 0}})
+        self.execute.assert_called_once_with(
+            ['iptables-save', '-t', 'filter', '-c'],
+            root_helper=self.root_helper)
+
+    def test_get_bulk_traffic_counters_chain_notexists(self):
+        with mock.patch.object(iptables_manager, "LOG") as log:
+            accs = self.iptables.get_bulk_traffic_counters(['chain1'])
+            self.assertEqual(accs, {})
+        self.assertEqual(0, self.execute.call_count)
+        log.warn.assert_called_once_with(
+            'Attempted to get traffic counters of chain %s which '
+            'does not exist', 'chain1')
+
+    def test_get_bulk_traffic_counters_with_zero(self):
+        self.iptables.ipv4['filter'].add_chain('chain1', wrap=False)
+        self.execute.return_value = '[5:300] -A chain1\n'
+        accs = self.iptables.get_bulk_traffic_counters(
+            ['chain1'], wrap=False, zero=True)
+        self.assertEqual(accs, {'chain1': {'pkts': 5, 'bytes': 300}})
+
+        self.execute.return_value = '[8:500] -A chain1\n'
+        accs = self.iptables.get_bulk_traffic_counters(
+            ['chain1'], wrap=False, zero=True)
+        self.assertEqual(accs, {'chain1': {'pkts': 3, 'bytes': 200}})
+
+        # the chain has been recreated, its counters restarted from zero
+        self.execute.return_value = '[2:100] -A chain1\n'
+        accs = self.iptables.get_bulk_traffic_counters(
+            ['chain1'], wrap=False, zero=True)
+        self.assertEqual(accs, {'chain1': {'pkts': 2, 'bytes': 100}})
+
 
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
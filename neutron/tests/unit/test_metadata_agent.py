@@ -41,6 +41,9 @@ class FakeConf(object):
     nova_metadata_ip = '9.9.9.9'
     nova_metadata_port = 8775
     metadata_proxy_shared_secret = 'secret'
+    metadata_cache_ttl = 5
+    metadata_cache_size = 1000
+    nova_metadata_pool_size = 4
 
 
 class TestMetadataProxyHandler(base.BaseTestCase):
@@ -195,6 +198,37 @@ class TestMetadataProxyHandler(base.BaseTestCase):
             (None, None)
         )
 
+    def test_get_instance_id_cached(self):
+        headers = {'X-Neutron-Network-ID': 'the_id',
+                   'X-Forwarded-For': '192.168.1.1'}
+        req = mock.Mock(headers=headers)
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.return_value = {
+            'ports': [{'device_id': 'device_id', 'tenant_id': 'tenant_id'}]}
+
+        for i in range(3):
+            self.assertEqual(
+                self.handler._get_instance_and_tenant_id(req),
+                ('device_id', 'tenant_id'))
+        self.assertEqual(1, list_ports.call_count)
+        self.assertEqual(2, self.handler.cache.hits)
+        self.assertEqual(1, self.handler.cache.misses)
+
+        # another requester is looked up
+        headers['X-Forwarded-For'] = '192.168.1.2'
+        self.handler._get_instance_and_tenant_id(req)
+        self.assertEqual(2, list_ports.call_count)
+
+    def test_get_instance_id_no_match_not_cached(self):
+        req = mock.Mock(headers={'X-Neutron-Network-ID': 'the_id',
+                                 'X-Forwarded-For': '192.168.1.1'})
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.return_value = {'ports': []}
+
+        self.handler._get_instance_and_tenant_id(req)
+        self.handler._get_instance_and_tenant_id(req)
+        self.assertEqual(2, list_ports.call_count)
+
     def _proxy_request_test_helper(self, response_code=200, method='GET'):
         hdrs = {'X-Forwarded-For': '8.8.8.8'}
         body = 'body'
@@ -257,6 +291,18 @@ class TestMetadataProxyHandler(base.BaseTestCase):
         with testtools.ExpectedException(Exception):
             self._proxy_request_test_helper(302)
 
+    def test_proxy_request_reuses_connection(self):
+        req = mock.Mock(path_info='/the_path', query_string='',
+                        headers={'X-Forwarded-For': '8.8.8.8'},
+                        method='GET', body='')
+        resp = mock.MagicMock(status=200)
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (resp, 'content')
+            self.handler._proxy_request('the_id', 'tenant_id', req)
+            self.handler._proxy_request('the_id', 'tenant_id', req)
+        self.assertEqual(1, mock_http.call_count)
+        self.assertEqual(2, mock_http.return_value.request.call_count)
+
     def test_sign_instance_id(self):
         self.assertEqual(
             self.handler._sign_instance_id('foo'),
@@ -264,6 +310,47 @@ class TestMetadataProxyHandler(base.BaseTestCase):
         )
 
 
+class TestLookupCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestLookupCache, self).setUp()
+        self.time = mock.patch.object(agent.time, 'time',
+                                      return_value=100).start()
+        self.cache = agent.LookupCache(2, 5)
+
+    def test_get_expired(self):
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.time.return_value = 105
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual({}, self.cache.entries)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_set_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_set_evicts_expired_first(self):
+        self.cache.set('a', 1)
+        self.time.return_value = 103
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.time.return_value = 105
+        self.cache.set('c', 3)
+        self.assertEqual(2, self.cache.get('b'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_disabled(self):
+        cache = agent.LookupCache(2, 0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
 class TestUnixDomainHttpProtocol(base.BaseTestCase):
     def test_init_empty_client(self):
         u = agent.UnixDomainHttpProtocol(mock.Mock(), '', mock.Mock())
@@ -17,6 +17,7 @@ import mock
 from testtools import matchers
 
 from neutron import context
+from neutron.db import api as db
 from neutron.openstack.common import local
 from neutron.tests import base
 
@@ -135,3 +136,79 @@ class TestNeutronContext(base.BaseTestCase):
         ctx_admin = context.get_admin_context()
         self.assertEqual(req_id_before, local.store.context.request_id)
         self.assertNotEqual(req_id_before, ctx_admin.request_id)
+
+
+class TestNeutronContextReader(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNeutronContextReader, self).setUp()
+        self.sessions = {}
+
+        def get_session(slave_session=False):
+            session = mock.Mock(transaction=None, info={})
+            self.sessions[slave_session] = session
+            return session
+
+        mock.patch('neutron.db.api.get_session',
+                   side_effect=get_session).start()
+        self.has_slave = mock.patch('neutron.db.api.has_slave_connection',
+                                    return_value=True).start()
+        mock.patch('neutron.context.event').start()
+        self.addCleanup(mock.patch.stopall)
+        self.ctx = context.Context('user_id', 'tenant_id')
+
+    def test_session_outside_reader(self):
+        session = self.ctx.session
+        self.assertIs(self.sessions[False], session)
+        self.assertNotIn(True, self.sessions)
+
+    def test_reader_uses_slave_session(self):
+        with self.ctx.reader():
+            session = self.ctx.session
+        self.assertIs(self.sessions[True], session)
+        session = self.ctx.session
+        self.assertIs(self.sessions[False], session)
+
+    def test_reader_without_slave_connection(self):
+        self.has_slave.return_value = False
+        with self.ctx.reader():
+            self.ctx.session
+        self.assertEqual([False], self.sessions.keys())
+
+    def test_reader_after_write_uses_main_session(self):
+        session = self.ctx.session
+        session.info['written'] = True
+        with self.ctx.reader():
+            self.assertIs(session, self.ctx.session)
+
+    def test_reader_in_transaction_uses_main_session(self):
+        session = self.ctx.session
+        session.transaction = mock.Mock()
+        with self.ctx.reader():
+            self.assertIs(session, self.ctx.session)
+
+    def test_read_only_decorator(self):
+        class Callback(object):
+            @db.read_only
+            def get_thing(self, context, **kwargs):
+                return context.session
+
+        session = Callback().get_thing(self.ctx)
+        self.assertIs(self.sessions[True], session)
+        self.assertEqual(0, self.ctx._read_only)
+
+    def test_read_only_getter_keeps_session(self):
+        class Plugin(object):
+            @db.read_only_getter
+            def get_thing(self, context):
+                return context.session
+
+        plugin = Plugin()
+        self.assertTrue(plugin.get_thing.read_only)
+        session = plugin.get_thing(self.ctx)
+        self.assertIs(self.sessions[False], session)
+        self.assertNotIn(True, self.sessions)
+
+    def test_reader_without_context_reader(self):
+        with db.reader(object()):
+            pass
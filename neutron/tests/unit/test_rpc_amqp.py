@@ -0,0 +1,113 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import fixtures
+import mock
+from oslo.config import cfg
+
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common.rpc import amqp
+from neutron.tests import base
+
+
+class TestRpcMetrics(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRpcMetrics, self).setUp()
+        self.metrics = amqp.RpcMetrics()
+
+    def test_histogram_buckets(self):
+        histogram = amqp._Histogram()
+        for value in (0.001, 0.02, 0.02, 100):
+            histogram.add(value)
+        result = histogram.to_dict()
+        self.assertEqual(4, result['count'])
+        self.assertEqual(100, result['max'])
+        self.assertEqual(1, result['buckets']['le_0.005'])
+        self.assertEqual(2, result['buckets']['le_0.05'])
+        self.assertEqual(1, result['buckets']['le_inf'])
+
+    def test_snapshot(self):
+        pool = mock.Mock(current_size=3, free_items=[mock.Mock()],
+                         max_size=5)
+        pool.waiting.return_value = 1
+        pool.reply_proxy.num_call_waiters = 2
+        self.metrics.register_pool(pool)
+        self.metrics.record_acquire(0.5, blocked=True)
+        self.metrics.record_call('q-plugin', 'get_ports', 0.2)
+        self.metrics.record_dispatch('port_update', 0.01)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual([{'size': 3, 'in_use': 2, 'waiting': 1,
+                           'max_size': 5}], snapshot['pools'])
+        self.assertEqual(2, snapshot['in_flight_calls'])
+        self.assertEqual(1, snapshot['acquire_waits'])
+        self.assertEqual(1, snapshot['calls']['q-plugin.get_ports']['count'])
+        self.assertEqual(1, snapshot['dispatches']['port_update']['count'])
+
+    def test_report_writes_file(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'rpc_stats.json')
+        conf = mock.Mock(rpc_metrics_file=path)
+        self.metrics.record_call('q-plugin', 'get_ports', 0.2)
+        self.metrics.report(conf)
+        with open(path) as f:
+            stats = jsonutils.loads(f.read())
+        self.assertIn('q-plugin.get_ports', stats['calls'])
+
+
+class TestPool(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestPool, self).setUp()
+        cfg.CONF.set_override('rpc_conn_pool_size', 1)
+        cfg.CONF.set_override('rpc_conn_pool_max_overflow', 1)
+        self.addCleanup(cfg.CONF.reset)
+        self.connection_cls = mock.Mock()
+        self.connection_cls.side_effect = lambda conf: mock.Mock()
+        self.pool = amqp.Pool(cfg.CONF, self.connection_cls)
+        self.addCleanup(amqp.METRICS.unregister_pool, self.pool)
+
+    def test_overflow_connection_is_closed_on_put(self):
+        first = self.pool.get()
+        second = self.pool.get()
+        self.assertEqual(2, self.connection_cls.call_count)
+        self.pool.put(second)
+        second.close.assert_called_once_with()
+        self.pool.put(first)
+        self.assertFalse(first.close.called)
+        self.assertEqual(1, self.pool.current_size)
+        self.assertIs(first, self.pool.get())
+
+    def test_pool_registered_for_metrics(self):
+        self.assertIn(self.pool, amqp.METRICS.pools)
+        self.pool.empty()
+        self.assertNotIn(self.pool, amqp.METRICS.pools)
+
+
+class TestMulticallProxyWaiter(base.BaseTestCase):
+
+    def test_done_records_call_latency(self):
+        connection_pool = mock.Mock()
+        with mock.patch.object(amqp.METRICS, 'record_call') as record_call:
+            waiter = amqp.MulticallProxyWaiter(
+                cfg.CONF, 'msg-id', 10, connection_pool,
+                topic='q-plugin', method='get_ports')
+            waiter.done()
+            waiter.done()
+        record_call.assert_called_once_with('q-plugin', 'get_ports',
+                                            mock.ANY)
+        connection_pool.reply_proxy.del_call_waiter.assert_called_once_with(
+            'msg-id')
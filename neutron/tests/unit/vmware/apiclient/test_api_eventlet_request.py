@@ -22,8 +22,10 @@ from eventlet.green import urllib2
 from mock import Mock
 from mock import patch
 
+from neutron.plugins.vmware.api_client import client as nsx_client
 from neutron.plugins.vmware.api_client import eventlet_client as client
 from neutron.plugins.vmware.api_client import eventlet_request as request
+from neutron.plugins.vmware.api_client import exception as api_exc
 from neutron.tests import base
 from neutron.tests.unit.vmware import CLIENT_NAME
 
@@ -330,3 +332,127 @@ class ApiRequestEventletTest(base.BaseTestCase):
         r.successful = Mock(return_value=True)
         LOG.info('%s' % r.api_providers())
         self.assertIsNotNone(r.api_providers())
+
+    def test_issue_request_records_latency(self):
+        (mysock, myresponse, myconn) = self.prep_issue_request()
+        myresponse.status = httplib.OK
+        self.req._url = '/ws.v1/lswitch/%s/lport?fields=uuid' % (
+            '9f6a5c1e-1b2c-4d3e-8f90-0123456789ab')
+        self.req._issue_request()
+        stats = self.client.get_latency_stats()
+        self.assertEqual(['GET /ws.v1/lswitch/*/lport'], stats.keys())
+        self.assertEqual(1, stats['GET /ws.v1/lswitch/*/lport']['count'])
+
+    def test_issue_request_unauthorized_keeps_new_cookie(self):
+        (mysock, myresponse, myconn) = self.prep_issue_request()
+        myresponse.status = httplib.UNAUTHORIZED
+        myresponse.getheader.return_value = None
+        provider = ("127.0.0.1", 4401, True)
+        myconn.__class__ = httplib.HTTPSConnection
+        self.client._conn_params = Mock(return_value=provider)
+        self.client.set_auth_cookie(provider, 'old')
+
+        def relogin(*args, **kwargs):
+            # Another request logs in while this one is in flight
+            self.client.set_auth_cookie(provider, 'new')
+            return myresponse
+
+        myconn.getresponse.side_effect = relogin
+        self.req._issue_request()
+        self.assertEqual('new', self.client.auth_cookie(provider))
+        myconn.getresponse.side_effect = None
+        self.req._issue_request()
+        self.assertIsNone(self.client.auth_cookie(provider))
+
+    def test_release_redirect_overflow_connection_closes_it(self):
+        provider = ("127.0.0.1", 4401, True)
+        conn = self.client._create_connection(*provider)
+        conn.no_release = True
+        conn.close = Mock()
+        qsize = self.client._conn_pool.qsize()
+        self.client.release_connection(conn)
+        conn.close.assert_called_once_with()
+        self.assertEqual(qsize, self.client._conn_pool.qsize())
+
+
+class NsxApiClientTest(base.BaseTestCase):
+
+    def setUp(self):
+        super(NsxApiClientTest, self).setUp()
+        self.client = nsx_client.NsxApiClient(
+            [("127.0.0.1", 4401, True)], "admin", "admin")
+        self.event = eventlet.event.Event()
+        self.response = Mock(status=httplib.OK, body='body', headers=[])
+        self.requests = []
+
+        def fake_issue_request(method, url, body, content_type):
+            self.requests.append((method, url))
+            if method == "GET":
+                self.event.wait()
+            return self.response
+
+        self.client._issue_request = fake_issue_request
+
+    def test_concurrent_gets_are_coalesced(self):
+        threads = [eventlet.spawn(self.client.request, "GET", "/ws.v1/lswitch")
+                   for i in range(3)]
+        eventlet.sleep(0)
+        self.event.send()
+        self.assertEqual(['body'] * 3, [thread.wait() for thread in threads])
+        self.assertEqual([("GET", "/ws.v1/lswitch")], self.requests)
+        self.assertEqual({}, self.client._pending_gets)
+
+    def test_get_after_write_is_not_coalesced(self):
+        first = eventlet.spawn(self.client.request, "GET", "/ws.v1/lswitch")
+        eventlet.sleep(0)
+        self.client.request("POST", "/ws.v1/lswitch")
+        second = eventlet.spawn(self.client.request, "GET", "/ws.v1/lswitch")
+        eventlet.sleep(0)
+        self.event.send()
+        first.wait()
+        second.wait()
+        self.assertEqual([("GET", "/ws.v1/lswitch"),
+                          ("POST", "/ws.v1/lswitch"),
+                          ("GET", "/ws.v1/lswitch")], self.requests)
+
+    def test_get_during_write_is_not_reused_after_write(self):
+        write_done = eventlet.event.Event()
+
+        def fake_issue_request(method, url, body, content_type):
+            self.requests.append((method, url))
+            if method == "GET":
+                self.event.wait()
+            else:
+                write_done.wait()
+            return self.response
+
+        def write_then_get():
+            self.client.request("PUT", "/ws.v1/lswitch")
+            return self.client.request("GET", "/ws.v1/lswitch")
+
+        self.client._issue_request = fake_issue_request
+        writer = eventlet.spawn(write_then_get)
+        eventlet.sleep(0)
+        reader = eventlet.spawn(self.client.request, "GET", "/ws.v1/lswitch")
+        eventlet.sleep(0)
+        write_done.send()
+        eventlet.sleep(0)
+        self.event.send()
+        reader.wait()
+        writer.wait()
+        self.assertEqual([("PUT", "/ws.v1/lswitch"),
+                          ("GET", "/ws.v1/lswitch"),
+                          ("GET", "/ws.v1/lswitch")], self.requests)
+
+    def test_coalesced_get_failure_is_raised_to_all(self):
+        def fake_issue_request(method, url, body, content_type):
+            self.event.wait()
+            raise api_exc.RequestTimeout()
+
+        self.client._issue_request = fake_issue_request
+        threads = [eventlet.spawn(self.client.request, "GET", "/ws.v1/lswitch")
+                   for i in range(2)]
+        eventlet.sleep(0)
+        self.event.send()
+        for thread in threads:
+            self.assertRaises(api_exc.RequestTimeout, thread.wait)
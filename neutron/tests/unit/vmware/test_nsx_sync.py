@@ -26,6 +26,7 @@ from neutron.common import constants
 from neutron import context
 from neutron.openstack.common import jsonutils as json
 from neutron.openstack.common import log
+from neutron.openstack.common import timeutils
 from neutron.plugins.vmware.api_client import client
 from neutron.plugins.vmware.api_client import exception as api_exc
 from neutron.plugins.vmware.api_client import version
@@ -502,43 +503,121 @@ class SyncTestCase(base.BaseTestCase):
                 self.fc.handle_get('/ws.v1/lrouter'))['results']
             fake_lswitchports = json.loads(
                 self.fc.handle_get('/ws.v1/lswitch/*/lport'))['results']
-            return_values = [
-                # Chunk 0 - lswitches
-                (fake_lswitches, None, 4),
-                # Chunk 0 - lrouters
-                (fake_lrouters[:2], 'xxx', 4),
-                # Chunk 0 - lports (size only)
-                ([], 'start', 4),
-                # Chunk 1 - lrouters (2 more) (lswitches are skipped)
-                (fake_lrouters[2:], None, None),
-                # Chunk 1 - lports
-                (fake_lswitchports, None, 4)]
-
-            def fake_fetch_data(*args, **kwargs):
-                return return_values.pop(0)
-
-            # 2 Chunks, with 6 resources each.
-            # 1st chunk lswitches and lrouters
-            # 2nd chunk lrouters and lports
+            synchronizer = self._plugin._synchronizer
+            return_values = {
+                synchronizer.LS_URI: [
+                    # Chunk 0 - all lswitches
+                    (fake_lswitches, None, 4)],
+                synchronizer.LR_URI: [
+                    # Chunk 0 - 2 lrouters
+                    (fake_lrouters[:2], 'xxx', 4),
+                    # Chunk 1 - 2 more lrouters
+                    (fake_lrouters[2:], None, None)],
+                synchronizer.LP_URI: [
+                    # Chunk 0 - 1 lport
+                    (fake_lswitchports[:1], 'yyy', 4),
+                    # Chunk 1 - 3 more lports
+                    (fake_lswitchports[1:], None, None)]}
+
+            def fake_fetch_data(uri, cursor, page_size):
+                return return_values[uri].pop(0)
+
             # Mock _fetch_data
             with mock.patch.object(
-                self._plugin._synchronizer, '_fetch_data',
-                side_effect=fake_fetch_data):
+                synchronizer, '_fetch_data',
+                side_effect=fake_fetch_data) as mock_fetch_data:
                 sp = sync.SyncParameters(6)
 
                 def do_chunk(chunk_idx, ls_cursor, lr_cursor, lp_cursor):
-                    self._plugin._synchronizer._synchronize_state(sp)
+                    synchronizer._synchronize_state(sp)
                     self.assertEqual(chunk_idx, sp.current_chunk)
                     self.assertEqual(ls_cursor, sp.ls_cursor)
                     self.assertEqual(lr_cursor, sp.lr_cursor)
                     self.assertEqual(lp_cursor, sp.lp_cursor)
 
+                timeutils.set_time_override()
+                self.addCleanup(timeutils.clear_time_override)
                 # check 1st chunk
-                do_chunk(1, None, 'xxx', 'start')
+                do_chunk(1, None, 'xxx', 'yyy')
                 # check 2nd chunk
                 do_chunk(0, None, None, None)
                 # Chunk size should have stayed the same
                 self.assertEqual(sp.chunk_size, 6)
+                # The 2nd chunk is shared in proportion to the resources
+                # left to fetch
+                self.assertEqual(
+                    [mock.call(synchronizer.LR_URI, 'xxx', 2),
+                     mock.call(synchronizer.LP_URI, 'yyy', 3)],
+                    sorted(mock_fetch_data.call_args_list[3:]))
+            self.assertEqual([], return_values[synchronizer.LR_URI])
+            self.assertEqual([], return_values[synchronizer.LP_URI])
+
+    def test_sync_nsx_failure_keeps_cursors(self):
+        synchronizer = self._plugin._synchronizer
+        sp = sync.SyncParameters(6)
+        sp.current_chunk = 1
+        sp.ls_cursor = 'xxx'
+        sp.lr_cursor = 'yyy'
+
+        def fake_fetch_data(uri, cursor, page_size):
+            if uri == synchronizer.LR_URI:
+                raise api_exc.RequestTimeout()
+            return [], None, None
+
+        with mock.patch.object(synchronizer, '_fetch_data',
+                               side_effect=fake_fetch_data):
+            self.assertRaises(api_exc.RequestTimeout,
+                              synchronizer._fetch_nsx_data_chunk, sp)
+        self.assertEqual('xxx', sp.ls_cursor)
+        self.assertEqual('yyy', sp.lr_cursor)
+
+    def test_sync_bulk_status_update(self):
+        ctx = context.get_admin_context()
+        with self._populate_data(ctx, net_size=3, port_size=2):
+            for lport in self.fc._fake_lswitch_lport_dict.values():
+                lport['status'] = 'false'
+            with mock.patch.object(sync, 'UPDATE_BATCH_SIZE', 4):
+                self._plugin._synchronizer._synchronize_state(
+                    sync.SyncParameters(100))
+            self.assertEqual(
+                set([constants.PORT_STATUS_DOWN]),
+                set(port['status'] for port in self._plugin.get_ports(ctx)))
+
+    def test_get_chunk_size(self):
+        synchronizer = self._plugin._synchronizer
+        synchronizer._sync_interval = 10
+        synchronizer._req_delay = 1
+        sp = sync.SyncParameters(100)
+        sp.total_size = 5000
+        # No throughput measure yet, size to complete within the interval
+        self.assertEqual(500, synchronizer._get_chunk_size(sp))
+        sp.throughput = 2000
+        self.assertEqual(2000, synchronizer._get_chunk_size(sp))
+        sp.throughput = 10 ** 6
+        self.assertEqual(sync.MAX_PAGE_SIZE, synchronizer._get_chunk_size(sp))
+        sp.total_size = 10
+        sp.throughput = 1
+        self.assertEqual(100, synchronizer._get_chunk_size(sp))
+
+    def test_fetch_nsx_data_chunk_measures_throughput(self):
+        synchronizer = self._plugin._synchronizer
+        synchronizer._sync_interval = 10
+        synchronizer._req_delay = 1
+        sp = sync.SyncParameters(10)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+
+        def fake_fetch_data(uri, cursor, page_size):
+            if uri == synchronizer.LP_URI:
+                timeutils.advance_time_seconds(2)
+            return range(100), 'xxx', 1000
+
+        with mock.patch.object(synchronizer, '_fetch_data',
+                               side_effect=fake_fetch_data):
+            synchronizer._fetch_nsx_data_chunk(sp)
+        self.assertEqual(3000, sp.total_size)
+        self.assertEqual(150, sp.throughput)
+        self.assertEqual(300, sp.chunk_size)
 
     def test_synchronize_network(self):
         ctx = context.get_admin_context()
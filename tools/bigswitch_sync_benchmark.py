@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the BigSwitch topology sync with and without streaming.
+
+Builds the body of the topology PUT from a synthetic topology held by fake
+plugin getters, without a database or a controller, and reports the time
+taken and the growth of the peak memory of the process for each mode. Each
+mode runs in its own forked process so their peaks are measured apart.
+
+    python tools/bigswitch_sync_benchmark.py --networks 1000 --ports 100
+"""
+
+import json
+import optparse
+import os
+import resource
+import sys
+import time
+
+from neutron.plugins.bigswitch import config as pl_config
+from neutron.plugins.bigswitch import plugin
+from neutron.plugins.bigswitch import servermanager
+
+
+def _page(resources, sorts=None, limit=None, marker=None, **kwargs):
+    if marker:
+        resources = [r for r in resources if r['id'] > marker]
+    return resources[:limit] if limit else resources
+
+
+class SyntheticTopology(object):
+
+    def __init__(self, networks, ports, routers):
+        self.networks = networks
+        self.ports = ports
+        self.routers = routers
+
+    def get_networks(self, context, filters=None, **kwargs):
+        networks = [{'id': 'net-%06d' % i, 'name': 'net-%06d' % i,
+                     'tenant_id': 'tenant-%04d' % (i % 100),
+                     'admin_state_up': True, 'status': 'ACTIVE',
+                     'shared': False, 'subnets': []}
+                    for i in range(self.networks)]
+        return _page(networks, **kwargs)
+
+    def get_ports(self, context, filters=None, **kwargs):
+        if 'device_owner' in (filters or {}):
+            # router interfaces
+            return []
+        net_id = filters['network_id'][0]
+        ports = [{'id': '%s-port-%06d' % (net_id, i), 'network_id': net_id,
+                  'name': '', 'tenant_id': 'tenant', 'admin_state_up': True,
+                  'status': 'ACTIVE', 'device_owner': 'compute:nova',
+                  'device_id': 'instance-%06d' % i,
+                  'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+                      i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff),
+                  'fixed_ips': [{'subnet_id': 'subnet',
+                                 'ip_address': '10.%d.%d.%d' % (
+                                     i >> 16 & 0xff, i >> 8 & 0xff,
+                                     i & 0xff)}],
+                  'security_groups': ['default']}
+                 for i in range(self.ports)]
+        return _page(ports, **kwargs)
+
+    def get_routers(self, context, filters=None, **kwargs):
+        routers = [{'id': 'router-%06d' % i, 'name': 'router-%06d' % i,
+                    'tenant_id': 'tenant', 'admin_state_up': True,
+                    'status': 'ACTIVE', 'external_gateway_info': None}
+                   for i in range(self.routers)]
+        return _page(routers, **kwargs)
+
+
+def make_plugin(topology):
+    # Only the methods reading the topology are used, the database and the
+    # controller connections are never set up.
+    obj = object.__new__(plugin.NeutronRestProxyV2Base)
+    obj.get_networks = topology.get_networks
+    obj.get_ports = topology.get_ports
+    obj._get_ports_page = topology.get_ports
+    obj.get_routers = topology.get_routers
+    obj.get_floatingips = lambda context, filters=None: []
+    obj._get_all_subnets_json_for_network = lambda net_id, context=None: []
+    obj._network_is_external = lambda context, net_id: False
+    obj._extend_port_dict_binding = lambda context, port: port
+    return obj
+
+
+def run(mode, topology):
+    obj = make_plugin(topology)
+    start = time.time()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = 0
+    if mode == 'stream':
+        for chunk in obj._get_all_data_stream():
+            size += len(chunk)
+    else:
+        size = len(json.dumps(obj._get_all_data()))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    print('%-6s  %8.2fs  %10d KiB peak growth  %12d bytes sent' %
+          (mode, time.time() - start, peak, size))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--networks', type='int', default=1000)
+    parser.add_option('--ports', type='int', default=100,
+                      help='ports per network')
+    parser.add_option('--routers', type='int', default=100)
+    parser.add_option('--page-size', type='int', default=500)
+    options, args = parser.parse_args()
+
+    pl_config.register_config()
+    pl_config.cfg.CONF([], project='neutron')
+    pl_config.cfg.CONF.set_override('sync_page_size', options.page_size,
+                                    'RESTPROXY')
+    topology = SyntheticTopology(options.networks, options.ports,
+                                 options.routers)
+    print('%d networks, %d ports, %d routers, chunks of %d bytes' %
+          (options.networks, options.networks * options.ports,
+           options.routers, servermanager.CHUNK_SIZE))
+    for mode in ('dict', 'stream'):
+        pid = os.fork()
+        if not pid:
+            run(mode, topology)
+            sys.stdout.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+
+if __name__ == '__main__':
+    main()